@@ -10,6 +10,15 @@ _global_options = {}
 _global_options['global_cache_size'] = 1e8 # 100 MB
 _global_options['dask_chunk_size'] = 100000
 _global_options['paint_chunk_size'] = 1024 * 1024 * 8
+_global_options['paint_memory_budget'] = None
+_global_options['paint_threads'] = None
+_global_options['paint_prefetch'] = False
+_global_options['paint_layout_cache_size'] = 0
+_global_options['paint_cache_size'] = 0
+_global_options['paint_cache_dir'] = None
+_global_options['projection_plan_cache_size'] = 0
+_global_options['randoms_cache_size'] = 0
+_global_options['randoms_cache_dir'] = None
 
 class CurrentMPIComm(object):
     """
@@ -113,6 +122,47 @@ class set_options(object):
     paint_chunk_size : int
         the number of objects to paint at the same time. This is independent
         from dask chunksize.
+    paint_memory_budget : float, None
+        if not ``None``, the memory in bytes that each rank may use to hold
+        the objects painted at once; the number of objects painted at once
+        is then derived from this budget (and the available memory), rather
+        than set by ``paint_chunk_size``
+    paint_threads : int, None
+        the number of threads used by each rank to paint particles to a
+        mesh; if ``None`` (default), paint serially. With an integer, the
+        particles are sorted by x-slab and painted in fixed-size blocks into
+        per-thread buffers spanning the slabs of each block, which are summed
+        in block order, such that the result is the same for any integer
+        number of threads. It differs from the serial result by round-off.
+    paint_prefetch : bool
+        if ``True``, read the next chunk of ``paint_chunk_size`` objects in a
+        background thread, while painting the current one; default is ``False``
+    paint_layout_cache_size : float
+        the maximum size in bytes of the cache of domain decomposition
+        layouts used when painting; default is 0 (no caching). See
+        :func:`~nbodykit.base.catalogmesh.CatalogMesh.clear_layout_cache`.
+    paint_cache_size : float
+        the maximum size in bytes of the cache of fields returned by
+        :func:`~nbodykit.base.mesh.MeshSource.paint`, on each rank;
+        default is 0 (no caching). See
+        :func:`~nbodykit.base.mesh.MeshSource.clear_field_cache`.
+    paint_cache_dir : str, None
+        if set, fields evicted from the cache of painted fields are written
+        to this (local scratch) directory, rather than discarded
+    projection_plan_cache_size : int
+        the number of binning plans to keep in memory for
+        :func:`~nbodykit.algorithms.fftpower.project_to_basis`; default
+        is 0 (no caching). See
+        :class:`~nbodykit.algorithms.fftpower.ProjectionPlan`.
+    randoms_cache_size : float
+        the maximum size in bytes of the cache of randoms fields painted by
+        :class:`~nbodykit.source.catalogmesh.fkp.FKPCatalogMesh`, on each
+        rank; default is 0 (no caching). See
+        :func:`~nbodykit.source.catalogmesh.fkp.FKPCatalogMesh.paint_randoms`.
+    randoms_cache_dir : str, None
+        if set, randoms fields painted by
+        :class:`~nbodykit.source.catalogmesh.fkp.FKPCatalogMesh` are written
+        to (and read back from) this directory, as BigFile files
     """
     def __init__(self, **kwargs):
         self.old = _global_options.copy()
@@ -1,7 +1,7 @@
 # FFT-based
-from .fftpower import FFTPower, ProjectedFFTPower
+from .fftpower import FFTPower, FFTPowerMatrix, SubvolumeFFTPower, ProjectedFFTPower
 from .fftcorr import FFTCorr
-from .convpower import ConvolvedFFTPower
+from .convpower import ConvolvedFFTPower, ConvolvedFFTPowerMatrix, FFTWindowMultipoles
 
 # grouping
 from .fof import FOF
@@ -18,9 +18,13 @@ from .kdtree import KDDensity
 from .zhist import RedshiftHistogram
 
 __all__ = ['FFTPower',
+           'FFTPowerMatrix',
+           'SubvolumeFFTPower',
            'ProjectedFFTPower',
            'FFTCorr',
            'ConvolvedFFTPower',
+           'ConvolvedFFTPowerMatrix',
+           'FFTWindowMultipoles',
            'FOF',
            'FiberCollisions',
            'CylindricalGroups',
@@ -1,5 +1,6 @@
 import numpy
 import logging
+import os
 import time
 import warnings
 
@@ -7,7 +8,7 @@ from nbodykit import CurrentMPIComm
 from nbodykit.utils import timer
 from nbodykit.binned_statistic import BinnedStatistic
 from .fftpower import project_to_basis
-from pmesh.pm import ComplexField
+from pmesh.pm import ComplexField, RealField
 
 def get_real_Ylm(l, m):
     """
@@ -72,6 +73,130 @@ def get_real_Ylm(l, m):
 
     return Ylm
 
+class _RealYlmGrid(object):
+    r"""
+    Internal class to evaluate the real spherical harmonics of degrees
+    ``ells`` on a mesh of unit vectors, slab by slab.
+
+    The harmonic of order (l,m) is evaluated as
+    :math:`N_{\ell m} Q_\ell^{|m|}(\hat{z}) \phi_m(\hat{x}, \hat{y})`,
+    where :math:`Q_\ell^{m}` is the m-th derivative of the Legendre polynomial
+    and :math:`\phi_m` the real (m >= 0) or imaginary (m < 0) part
+    of :math:`(\hat{x} + i\hat{y})^{|m|}`. Both factors are computed with
+    recursion formulae in preallocated buffers, which gives the same
+    harmonics as :func:`get_real_Ylm` without sympy and numexpr.
+
+    The harmonics are evaluated as homogeneous polynomials of degree l
+    in the coordinates, such that they vanish on the zero vector
+    (i.e., the :math:`k = 0` mode) for all l > 0.
+
+    Parameters
+    ----------
+    ells : list of int
+        the degrees of the harmonics to evaluate
+    """
+    def __init__(self, ells):
+        from math import factorial
+
+        self.ells = sorted(set(int(ell) for ell in ells))
+
+        # the normalization factors
+        self.amp = {}
+        for ell in self.ells:
+            for m in range(-ell, ell+1):
+                if m == 0:
+                    amp = (2*ell+1) / (4*numpy.pi)
+                else:
+                    amp = 2*(2*ell+1) / (4*numpy.pi) * factorial(ell-abs(m)) / factorial(ell+abs(m))
+                self.amp[ell, m] = numpy.sqrt(amp)
+
+        self._buffers = {}
+
+    def harmonics(self, ell):
+        """
+        The orders (l,m) of the harmonics of degree ``ell``.
+        """
+        return [(ell, m) for m in range(-ell, ell+1)]
+
+    def _get_buffers(self, shape):
+        """
+        Return the work buffers for a slab of shape ``shape``; the buffers
+        are re-used across slabs and harmonics.
+        """
+        if shape not in self._buffers:
+            self._buffers[shape] = numpy.empty((7,) + shape, dtype='f8')
+        return self._buffers[shape]
+
+    def __call__(self, l, m, xhat, yhat, zhat, out=None):
+        """
+        Evaluate the real spherical harmonic of order (l,m) on a slab.
+
+        Parameters
+        ----------
+        l, m : int
+            the order of the harmonic
+        xhat, yhat, zhat : array_like
+            the unit-normalized Cartesian coordinates of the slab
+        out : array_like, optional
+            the array to store the result in; if not provided, an internal
+            buffer is used, which is overwritten by the next call
+
+        Returns
+        -------
+        out : array_like
+            the harmonic evaluated on the slab
+        """
+        if (l, m) not in self.amp:
+            raise ValueError("harmonic (l=%d, m=%d) not supported; ells = %s" %(l, m, self.ells))
+
+        shape = numpy.broadcast(xhat, yhat, zhat).shape
+        a, b, tmp, q0, q1, r2, buf = self._get_buffers(shape)
+        if out is None:
+            out = buf
+
+        # the azimuthal part: real and imaginary parts of (xhat + i yhat)^|m|
+        am = abs(m)
+        if am > 0:
+            a[...] = xhat; b[...] = yhat
+            for i in range(am-1):
+                numpy.multiply(a, yhat, out=tmp)
+                a *= xhat
+                numpy.multiply(b, yhat, out=out)
+                a -= out
+                b *= xhat
+                b += tmp
+        phi = a if m > 0 else b
+
+        # the polar part: Q_l^|m| (times r^(l-|m|), with r = 1 for unit vectors),
+        # with Q_|m|^|m| = (2|m|-1)!! and Q_{|m|+1}^|m| = (2|m|+1) zhat Q_|m|^|m|
+        c = self.amp[l, m] * numpy.prod(numpy.arange(2*am-1, 0, -2, dtype='f8'))
+        if l == am:
+            if am > 0:
+                numpy.multiply(phi, c, out=out)
+            else:
+                out[...] = c
+            return out
+
+        q0[...] = c
+        numpy.multiply(zhat, (2*am+1)*c, out=q1)
+        if l > am + 1:
+            numpy.multiply(xhat, xhat, out=r2)
+            r2 += numpy.multiply(yhat, yhat, out=tmp)
+            r2 += numpy.multiply(zhat, zhat, out=tmp)
+        for n in range(am+2, l+1):
+            numpy.multiply(zhat, q1, out=tmp)
+            tmp *= (2.*n - 1.) / (n - am)
+            q0 *= r2
+            q0 *= -(n + am - 1.) / (n - am)
+            q0 += tmp
+            q0, q1 = q1, q0
+
+        if am > 0:
+            numpy.multiply(q1, phi, out=out)
+        else:
+            out[...] = q1
+        return out
+
 class ConvolvedFFTPower(object):
     """
     Algorithm to compute power spectrum multipoles using FFTs
@@ -126,6 +251,19 @@ class ConvolvedFFTPower(object):
     P0_FKP : float, optional
         the value of ``P0`` to use when computing FKP weights; must not be
         ``None`` if ``use_fkp_weights=True``
+    low_memory : bool, optional
+        if ``True``, compute the unit vectors of the real-space and Fourier-space
+        meshes slab by slab, rather than holding them in memory, and do not
+        copy the painted density field; this saves about 4 real-space and
+        4 Fourier-space mesh-sized arrays, at the expense of re-computing
+        the unit vectors for each spherical harmonic
+    checkpoint_dir : str, optional
+        if provided, the painted density field, the :math:`A_0` fields and
+        the sum of the :math:`A_\ell` terms are written (in parallel, as
+        BigFile datasets) to this directory shared by all ranks after each
+        :math:`(\ell, m)` term, along with the progress; a run with the same
+        inputs then resumes from the last completed term. The checkpoint
+        is not removed once the run completes
 
     References
     ----------
@@ -142,7 +280,9 @@ class ConvolvedFFTPower(object):
                     kmin=0.,
                     dk=None,
                     use_fkp_weights=False,
-                    P0_FKP=None):
+                    P0_FKP=None,
+                    low_memory=False,
+                    checkpoint_dir=None):
 
         first = _cast_source(first, Nmesh=Nmesh)
         if second is not None:
@@ -166,23 +306,34 @@ class ConvolvedFFTPower(object):
         # check for comm mismatch
         assert second.comm is first.comm, "communicator mismatch between input sources"
 
-        # make a box big enough for both catalogs if they are not equal
-        # NOTE: both first/second must have the same BoxCenter to recenter Position
-        if not numpy.array_equal(first.attrs['BoxSize'], second.attrs['BoxSize']):
+        # make a box big enough for both catalogs, add FKP weights and store meta-data
+        self._setup([first, second], poles, kmin, dk, use_fkp_weights, P0_FKP, low_memory)
 
-            # stack box coordinates together
-            joint = {}
-            for name in ['BoxSize', 'BoxCenter']:
-                joint[name] = numpy.vstack([first.attrs[name], second.attrs[name]])
+        self.checkpoint_dir = checkpoint_dir
 
-            # determine max box length along each dimension
-            argmax = numpy.argmax(joint['BoxSize'], axis=0)
-            joint['BoxSize'] = joint['BoxSize'][argmax, [0,1,2]]
-            joint['BoxCenter'] = joint['BoxCenter'][argmax, [0,1,2]]
+        # and run
+        self.run()
 
-            # re-center the box
-            first.recenter_box(joint['BoxSize'], joint['BoxCenter'])
-            second.recenter_box(joint['BoxSize'], joint['BoxCenter'])
+    def _setup(self, sources, poles, kmin, dk, use_fkp_weights, P0_FKP, low_memory):
+        """
+        Re-center the boxes of ``sources`` on a box enclosing all of them,
+        add the FKP weights if ``use_fkp_weights`` is ``True``, and store
+        the meta-data in :attr:`attrs`.
+        """
+        # make a box big enough for all catalogs if they are not equal
+        # NOTE: the catalogs can have different footprints, so the joint box
+        # is the union of the boxes
+        first = sources[0]
+        if any(not numpy.array_equal(source.attrs['BoxSize'], first.attrs['BoxSize']) or
+               not numpy.array_equal(source.attrs['BoxCenter'], first.attrs['BoxCenter'])
+               for source in sources[1:]):
+
+            lo = numpy.min([source.attrs['BoxCenter'] - 0.5*source.attrs['BoxSize'] for source in sources], axis=0)
+            hi = numpy.max([source.attrs['BoxCenter'] + 0.5*source.attrs['BoxSize'] for source in sources], axis=0)
+
+            # re-center the boxes
+            for source in sources:
+                source.recenter_box(hi - lo, 0.5 * (lo + hi))
 
         # make a list of multipole numbers
         if numpy.isscalar(poles):
@@ -192,24 +343,29 @@ class ConvolvedFFTPower(object):
             raise ValueError(("please set the 'P0_FKP' keyword if you wish to automatically "
                               "use FKP weights with 'use_fkp_weights=True'"))
 
-        # add FKP weights
+        # add FKP weights, once per FKPCatalog and weight column
         if use_fkp_weights:
-            for source in [self.first, self.second]:
+            done = []
+            for source in sources:
+                if any(base is source.base and col == source.fkp_weight for base, col in done):
+                    continue
+                done.append((source.base, source.fkp_weight))
+
                 if self.comm.rank == 0:
                     args = (source.fkp_weight, P0_FKP)
                     self.logger.info("adding FKP weights as the '%s' column, using P0 = %.4e" %args)
 
-            for name in ['data', 'randoms']:
+                for name in ['data', 'randoms']:
 
-                # print a warning if we are overwriting a non-default column
-                old_fkp_weights = source[name][source.fkp_weight]
-                if source.compute(old_fkp_weights.sum()) != len(old_fkp_weights):
-                    warn = "it appears that we are overwriting FKP weights for the '%s' " %name
-                    warn += "source in FKPCatalog when using 'use_fkp_weights=True' in ConvolvedFFTPower"
-                    warnings.warn(warn)
+                    # print a warning if we are overwriting a non-default column
+                    old_fkp_weights = source[name][source.fkp_weight]
+                    if source.compute(old_fkp_weights.sum()) != len(old_fkp_weights):
+                        warn = "it appears that we are overwriting FKP weights for the '%s' " %name
+                        warn += "source in FKPCatalog when using 'use_fkp_weights=True' in %s" %self.logger.name
+                        warnings.warn(warn)
 
-                nbar = source[name][source.nbar]
-                source[name][source.fkp_weight] = 1.0 / (1. + P0_FKP * nbar)
+                    nbar = source[name][source.nbar]
+                    source[name][source.fkp_weight] = 1.0 / (1. + P0_FKP * nbar)
 
         # store meta-data
         self.attrs = {}
@@ -218,19 +374,17 @@ class ConvolvedFFTPower(object):
         self.attrs['kmin'] = kmin
         self.attrs['use_fkp_weights'] = use_fkp_weights
         self.attrs['P0_FKP'] = P0_FKP
+        self.attrs['low_memory'] = low_memory
 
         # store BoxSize and BoxCenter from source
-        self.attrs['Nmesh'] = self.first.attrs['Nmesh'].copy()
-        self.attrs['BoxSize'] = self.first.attrs['BoxSize']
-        self.attrs['BoxPad'] = self.first.attrs['BoxPad']
-        self.attrs['BoxCenter'] = self.first.attrs['BoxCenter']
+        self.attrs['Nmesh'] = first.attrs['Nmesh'].copy()
+        self.attrs['BoxSize'] = first.attrs['BoxSize']
+        self.attrs['BoxPad'] = first.attrs['BoxPad']
+        self.attrs['BoxCenter'] = first.attrs['BoxCenter']
 
         # grab some mesh attrs, too
-        self.attrs['mesh.window'] = self.first.attrs['window']
-        self.attrs['mesh.interlaced'] = self.first.attrs['interlaced']
-
-        # and run
-        self.run()
+        self.attrs['mesh.window'] = first.attrs['window']
+        self.attrs['mesh.interlaced'] = first.attrs['interlaced']
 
     def run(self):
         """
@@ -458,80 +612,130 @@ class ConvolvedFFTPower(object):
         assert poles[0] == 0
 
         # spherical harmonic kernels (for ell > 0)
-        Ylms = [[get_real_Ylm(l,m) for m in range(-l, l+1)] for l in poles[1:]]
-
-        # paint the 1st FKP density field to the mesh (paints: data - alpha*randoms, essentially)
-        rfield1 = self.first.paint(Nmesh=self.attrs['Nmesh'])
-        meta1 = rfield1.attrs.copy()
-        if rank == 0:
-            self.logger.info("%s painting of 'first' done" %self.first.window)
+        Ylm = _RealYlmGrid(poles[1:])
 
-        # store alpha: ratio of data to randoms
-        self.attrs['alpha'] = meta1['alpha']
+        # resume from the checkpoint, if any
+        checkpoint = None
+        if self.checkpoint_dir is not None:
+            digest = self._checkpoint_hash()
+            checkpoint = self._read_checkpoint(digest)
 
-        # FFT 1st density field and apply the paintbrush window transfer kernel
-        cfield = rfield1.r2c()
-        if compensation['first'] is not None:
-            cfield.apply(out=Ellipsis, **compensation['first'])
-        if rank == 0: self.logger.info('ell = 0 done; 1 r2c completed')
-
-        # monopole A0 is just the FFT of the FKP density field
-        # NOTE: this holds FFT of density field #1
         volume = pm.BoxSize.prod()
-        A0_1 = ComplexField(pm)
-        A0_1[:] = cfield[:] * volume # normalize with a factor of volume
-
-        # paint second mesh too?
-        if self.first is not self.second:
-
-            # paint the second field
-            rfield2 = self.second.paint(Nmesh=self.attrs['Nmesh'])
-            meta2 = rfield2.attrs.copy()
-            if rank == 0: self.logger.info("%s painting of 'second' done" %self.second.window)
+        if checkpoint is None:
 
-            # need monopole of second field
-            if 0 in self.attrs['poles']:
-
-                # FFT density field and apply the paintbrush window transfer kernel
-                A0_2 = rfield2.r2c()
-                A0_2[:] *= volume
-                if compensation['second'] is not None:
-                    A0_2.apply(out=Ellipsis, **compensation['second'])
+            # paint the 1st FKP density field to the mesh (paints: data - alpha*randoms, essentially)
+            rfield1 = self.first.paint(Nmesh=self.attrs['Nmesh'])
+            meta1 = rfield1.attrs.copy()
+            if rank == 0:
+                self.logger.info("%s painting of 'first' done" %self.first.window)
+
+            # store alpha: ratio of data to randoms
+            self.attrs['alpha'] = meta1['alpha']
+
+            # FFT 1st density field and apply the paintbrush window transfer kernel
+            cfield = rfield1.r2c()
+            if compensation['first'] is not None:
+                cfield.apply(out=Ellipsis, **compensation['first'])
+            if rank == 0: self.logger.info('ell = 0 done; 1 r2c completed')
+
+            # monopole A0 is just the FFT of the FKP density field
+            # NOTE: this holds FFT of density field #1
+            A0_1 = ComplexField(pm)
+            A0_1[:] = cfield[:] * volume # normalize with a factor of volume
+
+            # paint second mesh too?
+            if self.first is not self.second:
+
+                # paint the second field
+                rfield2 = self.second.paint(Nmesh=self.attrs['Nmesh'])
+                meta2 = rfield2.attrs.copy()
+                if rank == 0: self.logger.info("%s painting of 'second' done" %self.second.window)
+
+                # need monopole of second field
+                if 0 in self.attrs['poles']:
+
+                    # FFT density field and apply the paintbrush window transfer kernel
+                    A0_2 = rfield2.r2c()
+                    A0_2[:] *= volume
+                    if compensation['second'] is not None:
+                        A0_2.apply(out=Ellipsis, **compensation['second'])
+            else:
+                rfield2 = rfield1
+                meta2 = meta1
+
+                # monopole of second field is first field
+                if 0 in self.attrs['poles']:
+                    A0_2 = A0_1
+
+            # save the painted density field #2 and the A0 fields
+            if self.checkpoint_dir is not None:
+                progress = dict(hash=digest, done=[], ell=None, terms=0, Aell=None,
+                                meta1=meta1, meta2=meta2, result=result)
+                fields = {'density2': rfield2, 'A0_1': A0_1}
+                if self.first is not self.second and 0 in self.attrs['poles']:
+                    fields['A0_2'] = A0_2
+                self._write_checkpoint(progress, fields)
         else:
-            rfield2 = rfield1
-            meta2 = meta1
-
-            # monopole of second field is first field
+            progress, fields = checkpoint
+            meta1, meta2 = progress['meta1'], progress['meta2']
+            self.attrs['alpha'] = meta1['alpha']
+
+            # the painted density field #2 replaces both painted fields
+            rfield1 = rfield2 = fields['density2']
+            cfield = ComplexField(pm)
+            A0_1 = fields['A0_1']
             if 0 in self.attrs['poles']:
-                A0_2 = A0_1
+                A0_2 = fields.get('A0_2', A0_1)
+
+            # the multipoles already computed
+            for ell in progress['done']:
+                result['power_%d' %ell][:] = progress['result']['power_%d' %ell]
+            for name in ['k', 'modes']:
+                result[name][:] = progress['result'][name]
 
         # ensure alpha from first mesh is equal to alpha from second mesh
         # NOTE: this is mostly just a sanity check, and should always be true if
         # we made it this far already
-        if not numpy.allclose(rfield1.attrs['alpha'], rfield2.attrs['alpha'], rtol=1e-3):
+        if not numpy.allclose(meta1['alpha'], meta2['alpha'], rtol=1e-3):
             msg = ("ConvolvedFFTPower cross-correlations currently require the same"
                    " FKPCatalog (data/randoms), such that only the weight column can vary;"
                    " different ``alpha`` values found for first/second meshes")
             raise ValueError(msg)
 
-        # save the painted density field #2 for later
-        density2 = rfield2.copy()
+        low_memory = self.attrs['low_memory']
+        grids = None
+        if low_memory:
+
+            # the memory of the coordinate grids and of the copy of density #2
+            saved = 5 * rfield2.value.nbytes + 2 * cfield.value.nbytes
+
+            # keep the painted density field #2 as is, and apply the Ylm
+            # in a scratch field, re-using density field #1 if possible
+            density2 = rfield2
+            if rfield1 is not density2:
+                rfield2 = rfield1
+            elif len(poles) > 1:
+                rfield2 = RealField(pm)
+                saved -= rfield2.value.nbytes
+            del rfield1
+
+            saved = self.comm.allreduce(saved)
+            if rank == 0:
+                args = (saved / 1024.**3, saved / 1024.**3 / self.comm.size)
+                self.logger.info("low-memory mode: saved %.3f GB in total (%.3f GB per rank)" %args)
+        else:
+
+            # save the painted density field #2 for later
+            density2 = rfield2.copy()
+
+            # the real-space and Fourier-space grids of unit vectors
+            grids = _get_unit_grids(density2, cfield, offset)
 
         # initialize the memory holding the Aell terms for
         # higher multipoles (this holds sum of m for fixed ell)
         # NOTE: this will hold FFTs of density field #2
         Aell = ComplexField(pm)
 
-        # the real-space grid
-        xgrid = [xx.astype('f8') + offset[ii] for ii, xx in enumerate(density2.slabs.optx)]
-        xnorm = numpy.sqrt(sum(xx**2 for xx in xgrid))
-        xgrid = [x/xnorm for x in xgrid]
-
-        # the Fourier-space grid
-        kgrid = [kk.astype('f8') for kk in cfield.slabs.optx]
-        knorm = numpy.sqrt(sum(kk**2 for kk in kgrid)); knorm[knorm==0.] = numpy.inf
-        kgrid = [k/knorm for k in kgrid]
-
         # proper normalization: same as equation 49 of Scoccimarro et al. 2015
         for name in ['data', 'randoms']:
             self.attrs[name+'.norm'] = self.normalization(name, self.attrs['alpha'])
@@ -540,53 +744,39 @@ class ConvolvedFFTPower(object):
         # check normalization
         Adata = self.attrs['data.norm']
         Aran = self.attrs['randoms.norm']
-        if not numpy.allclose(Adata, Aran, rtol=0.05):
-            msg = "normalization in ConvolvedFFTPower different by more than 5%; "
-            msg += ",algorithm requires they must be similar\n"
-            msg += "\trandoms.norm = %.6f, data.norm = %.6f\n" % (Aran, Adata)
-            msg += "\tpossible discrepancies could be related to normalization "
-            msg += "of n(z) column ('%s')\n" % self.first.nbar
-            msg += "\tor the consistency of the FKP weight column for 'data' "
-            msg += "and 'randoms';\n"
-            msg += "\tn(z) columns for 'data' and 'randoms' should be "
-            msg += "normalized to represent n(z) of the data catalog"
-            raise ValueError(msg)
+        _check_normalization(Adata, Aran, self.first.nbar)
 
         if rank == 0:
             self.logger.info("normalized power spectrum with `randoms.norm = %.6f`" % Aran)
 
         # loop over the higher order multipoles (ell > 0)
         start = time.time()
-        for iell, ell in enumerate(poles[1:]):
-
-            # clear 2D workspace
-            Aell[:] = 0.
-
-            # iterate from m=-l to m=l and apply Ylm
-            substart = time.time()
-            for Ylm in Ylms[iell]:
-
-                # reset the real-space mesh to the original density #2
-                rfield2[:] = density2[:]
-
-                # apply the config-space Ylm
-                for islab, slab in enumerate(rfield2.slabs):
-                    slab[:] *= Ylm(xgrid[0][islab], xgrid[1][islab], xgrid[2][islab])
-
-                # real to complex of field #2
-                rfield2.r2c(out=cfield)
-
-                # apply the Fourier-space Ylm
-                for islab, slab in enumerate(cfield.slabs):
-                    slab[:] *= Ylm(kgrid[0][islab], kgrid[1][islab], kgrid[2][islab])
-
-                # add to the total sum
-                Aell[:] += cfield[:]
-
-                # and this contribution to the total sum
-                substop = time.time()
-                if rank == 0:
-                    self.logger.debug("done term for Y(l=%d, m=%d) in %s" %(Ylm.l, Ylm.m, timer(substart, substop)))
+        proj_result = None
+        for ell in poles[1:]:
+
+            # skip the multipoles restored from the checkpoint
+            save_term = None
+            start_term = 0
+            if self.checkpoint_dir is not None:
+                if ell in progress['done']:
+                    continue
+
+                # restore the sum over the terms already computed
+                if progress['ell'] == ell and progress['terms'] > 0:
+                    start_term = progress['terms']
+                    _read_field(self._checkpoint_path(), progress['Aell'], Aell)
+                    if rank == 0:
+                        self.logger.info("ell = %d: resuming after %d terms" %(ell, start_term))
+
+                # save the sum after each term, alternating between two datasets
+                # such that the last complete one is never overwritten
+                def save_term(terms, ell=ell):
+                    progress.update(ell=ell, terms=terms, Aell='Aell-%d' %(terms % 2))
+                    self._write_checkpoint(progress, {progress['Aell']: Aell})
+
+            # sum the Ylm-weighted FFTs of density #2 over m
+            self._compute_Aell(Aell, ell, Ylm, density2, rfield2, cfield, grids, offset,
+                               start=start_term, checkpoint=save_term)
 
             # apply the compensation transfer function
             if compensation['second'] is not None:
@@ -597,7 +787,7 @@ class ConvolvedFFTPower(object):
 
             # log the total number of FFTs computed for each ell
             if rank == 0:
-                args = (ell, len(Ylms[iell]))
+                args = (ell, 2*ell+1)
                 self.logger.info('ell = %d done; %s r2c completed' %args)
 
             # calculate the power spectrum multipoles, slab-by-slab to save memory
@@ -609,6 +799,14 @@ class ConvolvedFFTPower(object):
             proj_result, _ = project_to_basis(Aell, edges)
             result['power_%d' %ell][:] = numpy.squeeze(proj_result[2])
 
+            # save the multipole, along with the modes
+            if self.checkpoint_dir is not None:
+                result['k'][:] = numpy.squeeze(proj_result[0])
+                result['modes'][:] = numpy.squeeze(proj_result[-1])
+                progress['done'].append(ell)
+                progress.update(ell=None, terms=0, Aell=None, result=result)
+                self._write_checkpoint(progress)
+
         # summarize how long it took
         stop = time.time()
         if rank == 0:
@@ -626,8 +824,10 @@ class ConvolvedFFTPower(object):
             result['power_0'][:] = numpy.squeeze(proj_result[2])
 
         # save the number of modes and k
-        result['k'][:] = numpy.squeeze(proj_result[0])
-        result['modes'][:] = numpy.squeeze(proj_result[-1])
+        # NOTE: restored from the checkpoint if all multipoles were
+        if proj_result is not None:
+            result['k'][:] = numpy.squeeze(proj_result[0])
+            result['modes'][:] = numpy.squeeze(proj_result[-1])
 
         # compute shot noise
         self.attrs['shotnoise'] = self.shotnoise(self.attrs['alpha'])
@@ -641,6 +841,170 @@ class ConvolvedFFTPower(object):
 
         return result
 
+    def _compute_Aell(self, Aell, ell, Ylm, density, rfield, cfield, grids, offset,
+                        start=0, checkpoint=None):
+        r"""
+        Compute the sum over ``m`` of the FFTs of ``density`` weighted by
+        the real-space :math:`Y_{\ell m}`, weighted by the Fourier-space
+        :math:`Y_{\ell m}`, storing the result in ``Aell``.
+
+        ``rfield`` and ``cfield`` are scratch fields. ``grids`` holds the
+        real-space and Fourier-space unit vectors (see :func:`_get_unit_grids`);
+        if ``None``, they are computed slab by slab, with the real-space
+        coordinates shifted by ``offset``.
+
+        If ``start`` is non-zero, ``Aell`` already holds the sum of the first
+        ``start`` terms. If provided, ``checkpoint`` is called with the number
+        of terms summed after each term.
+        """
+        rank = self.comm.rank
+
+        # clear 2D workspace
+        if start == 0:
+            Aell[:] = 0.
+
+        # iterate from m=-l to m=l and apply Ylm
+        substart = time.time()
+        for iterm, (l, m) in enumerate(Ylm.harmonics(ell)):
+
+            # skip the terms already summed
+            if iterm < start:
+                continue
+
+            if grids is None:
+
+                # apply the config-space Ylm to the density, computing the unit vectors per slab
+                for x, slab, dslab in zip(rfield.slabs.x, rfield.slabs, density.slabs):
+                    slab[...] = dslab[...] * Ylm(l, m, *_unit_vectors(x, offset))
+            else:
+                xgrid, kgrid = grids
+
+                # reset the real-space mesh to the original density
+                rfield[:] = density[:]
+
+                # apply the config-space Ylm
+                for islab, slab in enumerate(rfield.slabs):
+                    slab[:] *= Ylm(l, m, xgrid[0][islab], xgrid[1][islab], xgrid[2][islab])
+
+            # real to complex
+            rfield.r2c(out=cfield)
+
+            # apply the Fourier-space Ylm
+            if grids is None:
+                for k, slab in zip(cfield.slabs.x, cfield.slabs):
+                    slab[...] *= Ylm(l, m, *_unit_vectors(k))
+            else:
+                for islab, slab in enumerate(cfield.slabs):
+                    slab[:] *= Ylm(l, m, kgrid[0][islab], kgrid[1][islab], kgrid[2][islab])
+
+            # add to the total sum
+            Aell[:] += cfield[:]
+
+            # and this contribution to the total sum
+            substop = time.time()
+            if rank == 0:
+                self.logger.debug("done term for Y(l=%d, m=%d) in %s" %(l, m, timer(substart, substop)))
+
+            if checkpoint is not None:
+                checkpoint(iterm + 1)
+
+    def _checkpoint_path(self):
+        """
+        The BigFile holding the fields of the checkpoint.
+        """
+        return os.path.join(self.checkpoint_dir, 'fields')
+
+    def _checkpoint_hash(self):
+        """
+        Return a hash of the parameters and of the inputs, computed from the
+        sums over the ``data`` and ``randoms`` (see :func:`weighted_sums`
+        of :class:`~nbodykit.source.catalogmesh.fkp.FKPCatalogMesh`), and
+        from a hash of the content of their columns, which does not depend
+        on the number of ranks; a checkpoint is only used by runs with the
+        same hash.
+        """
+        import hashlib
+
+        # the results do not depend on the memory mode
+        items = [(key, numpy.asarray(self.attrs[key]).tolist())
+                 for key in sorted(self.attrs) if key != 'low_memory']
+
+        for mesh in [self.first, self.second]:
+            columns = [mesh._uncentered_position, mesh.selection, mesh.comp_weight,
+                       mesh.fkp_weight, mesh.nbar, mesh.value]
+            items.append(tuple(columns))
+            for name in ['data', 'randoms']:
+                sums = mesh.weighted_sums(name, fkp_weight2=self.second.fkp_weight)
+                # NOTE: the sums are rounded such that they do not depend on the number of ranks
+                items.append(tuple('%.10e' %sums[key] for key in ['N', 'W', 'norm', 'shotnoise']))
+                items.append(mesh._content_hash(name, columns))
+
+        return hashlib.sha1(repr(items).encode()).hexdigest()
+
+    def _read_checkpoint(self, digest):
+        """
+        Read the checkpoint from :attr:`checkpoint_dir`, returning the progress
+        and the fields, or ``None`` if there is no checkpoint, or if it was
+        written for different inputs (with a hash different from ``digest``).
+        """
+        import json
+        from nbodykit.utils import JSONDecoder
+
+        filename = os.path.join(self.checkpoint_dir, 'progress.json')
+        if self.comm.rank == 0 and os.path.exists(filename):
+            with open(filename, 'r') as ff:
+                progress = json.load(ff, cls=JSONDecoder)
+        else:
+            progress = None
+        progress = self.comm.bcast(progress)
+
+        if progress is None:
+            return None
+
+        if progress['hash'] != digest:
+            if self.comm.rank == 0:
+                self.logger.warning("checkpoint in %s written for different inputs; ignoring" %self.checkpoint_dir)
+            return None
+
+        pm = self.first.pm
+        path = self._checkpoint_path()
+        fields = {}
+        fields['density2'] = _read_field(path, 'density2', RealField(pm))
+        fields['A0_1'] = _read_field(path, 'A0_1', ComplexField(pm))
+        if self.first is not self.second and 0 in self.attrs['poles']:
+            fields['A0_2'] = _read_field(path, 'A0_2', ComplexField(pm))
+
+        if self.comm.rank == 0:
+            self.logger.info("resuming from checkpoint in %s; ells done: %s"
+                             %(self.checkpoint_dir, str(progress['done'])))
+        return progress, fields
+
+    def _write_checkpoint(self, progress, fields={}):
+        """
+        Write the ``fields`` to the checkpoint in :attr:`checkpoint_dir`, and
+        then the ``progress``, such that the progress always refers to
+        fields completely written.
+        """
+        import json
+        from nbodykit.utils import JSONEncoder
+
+        if self.comm.rank == 0 and not os.path.exists(self.checkpoint_dir):
+            os.makedirs(self.checkpoint_dir)
+        self.comm.barrier()
+
+        path = self._checkpoint_path()
+        for dataset in sorted(fields):
+            _write_field(path, dataset, fields[dataset])
+        self.comm.barrier()
+
+        # the progress is replaced atomically by the master rank
+        if self.comm.rank == 0:
+            filename = os.path.join(self.checkpoint_dir, 'progress.json')
+            with open(filename + '.tmp', 'w') as ff:
+                json.dump(progress, ff, cls=JSONEncoder)
+            os.rename(filename + '.tmp', filename)
+        self.comm.barrier()
+
     def normalization(self, name, alpha):
         r"""
         Compute the power spectrum normalization, using either the
@@ -669,29 +1033,15 @@ class ConvolvedFFTPower(object):
 
         if name+'.norm' not in self.attrs:
 
-            # the selection (same for first/second)
-            sel = self.first.compute(self.first[name][self.first.selection])
-
-            # selected first/second meshes for "name" (data or randoms)
-            first = self.first[name][sel]
-            second = self.second[name][sel]
-
-            # these are assumed the same b/w first and second meshes
-            comp_weight = first[self.first.comp_weight]
-            nbar = second[self.second.nbar]
+            # the sums over the selected objects, computed in a single pass
+            # NOTE: the selection, completeness weights and n(z) are the same for
+            # first/second; different FKP weights are allowed for first and second mesh
+            sums = self.first.weighted_sums(name, fkp_weight2=self.second.fkp_weight)
 
-            # different weights allowed for first and second mesh
-            fkp_weight1 = first[self.first.fkp_weight]
-            if self.second is self.first:
-                fkp_weight2 = fkp_weight1
-            else:
-                fkp_weight2 = second[self.second.fkp_weight]
-
-            A  = nbar*comp_weight*fkp_weight1*fkp_weight2
+            A = sums['norm']
             if name == 'randoms':
                 A *= alpha
-            A = self.first.compute(A.sum())
-            self.attrs[name+'.norm'] = self.comm.allreduce(A)
+            self.attrs[name+'.norm'] = A
 
         return self.attrs[name+'.norm']
 
@@ -717,33 +1067,628 @@ class ConvolvedFFTPower(object):
             Pshot = 0
             for name in ['data', 'randoms']:
 
-                # the selection (same for first/second)
-                sel = self.first.compute(self.first[name][self.first.selection])
+                # the sums are cached when computing the normalization
+                S = self.first.weighted_sums(name, fkp_weight2=self.second.fkp_weight)['shotnoise']
+                if name == 'randoms':
+                    S *= alpha**2
+                Pshot += S # add to total
+
+            # divide by normalization from randoms
+            self.attrs['shotnoise'] = Pshot / self.normalization('randoms', alpha)
 
-                # selected first/second meshes for "name" (data or randoms)
-                first = self.first[name][sel]
-                second = self.second[name][sel]
+        return self.attrs['shotnoise']
 
-                # completeness weights (assumed same for first/second)
-                comp_weight = first[self.first.comp_weight]
+class ConvolvedFFTPowerMatrix(ConvolvedFFTPower):
+    r"""
+    Algorithm to compute all the auto and cross power spectrum multipoles
+    of a list of tracers with non-trivial survey geometries, each with its
+    own data and randoms catalogs.
 
-                # different weights allowed for first and second mesh
-                fkp_weight1 = first[self.first.fkp_weight]
-                if self.first is self.second:
-                    fkp_weight2 = fkp_weight1
+    The :math:`A_0` and :math:`A_\ell` fields (see :class:`ConvolvedFFTPower`)
+    of each tracer are computed only once, such that
+    :math:`N (1 + \sum_{\ell > 0} (2\ell+1))` FFTs are required for :math:`N`
+    tracers, rather than this number of FFTs for each pair of tracers. The
+    multipoles of each pair of tracers ``(i, j)``, with ``i <= j``, are
+    computed from :math:`A_0` of tracer ``i`` and :math:`A_\ell` of tracer
+    ``j``, i.e. as ``ConvolvedFFTPower(first=i, second=j)``.
+
+    The normalization and shot noise of the pairs of tracers sharing the
+    same FKPCatalog (data/randoms) are computed as in :class:`ConvolvedFFTPower`.
+    For tracers with different catalogs, the normalization is the geometric
+    mean of the normalizations of the two auto power spectra, which is exact
+    if their weighted mean densities have the same shape on the sky and in
+    redshift; the shot noise is zero.
+
+    Results are computed when the object is inititalized. See the documenation
+    of :func:`~ConvolvedFFTPowerMatrix.run` for the attributes storing the results.
+
+    Parameters
+    ----------
+    sources : list of FKPCatalog, FKPCatalogMesh
+        the tracers; all are painted on a box large enough to hold all of them
+    poles : list of int
+        a list of integer multipole numbers ``ell`` to compute
+    Nmesh : int, 3-vector, optional
+        the number of cells per mesh size
+    kmin : float, optional
+        the edge of the first wavenumber bin; default is 0
+    dk : float, optional
+        the spacing in wavenumber to use; if not provided; the fundamental mode
+        of the box is used
+    use_fkp_weights : bool, optional
+        if ``True``, FKP weights will be added using ``P0_FKP`` such that the
+        fkp weight is given by ``1 / (1 + P0*NZ)`` where ``NZ`` is the number
+        density of each tracer
+    P0_FKP : float, optional
+        the value of ``P0`` to use when computing FKP weights; must not be
+        ``None`` if ``use_fkp_weights=True``
+    low_memory : bool, optional
+        if ``True``, the unit vector grids are computed slab by slab, rather
+        than kept in memory; see :class:`ConvolvedFFTPower`
+    spill_dir : str, optional
+        if provided, the :math:`A_0` and :math:`A_\ell` fields of all but the
+        first tracer are written to this (local scratch) directory once
+        computed, and read back slab by slab, rather than kept in memory
+    """
+    logger = logging.getLogger('ConvolvedFFTPowerMatrix')
+
+    def __init__(self, sources,
+                    poles,
+                    Nmesh=None,
+                    kmin=0.,
+                    dk=None,
+                    use_fkp_weights=False,
+                    P0_FKP=None,
+                    low_memory=False,
+                    spill_dir=None):
+
+        if len(sources) < 1:
+            raise ValueError("at least one source is required in ConvolvedFFTPowerMatrix")
+
+        self.sources = [_cast_source(source, Nmesh=Nmesh) for source in sources]
+        self.first = self.second = self.sources[0]
+
+        # grab comm from first source
+        self.comm = self.first.comm
+
+        # check for comm mismatch
+        for source in self.sources[1:]:
+            assert source.comm is self.comm, "communicator mismatch between input sources"
+            if any(source.attrs['Nmesh'] != self.first.attrs['Nmesh']):
+                raise ValueError("'Nmesh' mismatch between sources in ConvolvedFFTPowerMatrix")
+
+        # make a box big enough for all catalogs, add FKP weights and store meta-data
+        self._setup(self.sources, poles, kmin, dk, use_fkp_weights, P0_FKP, low_memory)
+        self.attrs['nsources'] = len(self.sources)
+
+        self.spill_dir = spill_dir
+
+        # and run
+        self.run()
+
+    @property
+    def pairs(self):
+        """
+        The list of pairs of source indices ``(i, j)``, with ``i <= j``.
+        """
+        N = self.attrs['nsources']
+        return [(i, j) for i in range(N) for j in range(i, N)]
+
+    def run(self):
+        """
+        Compute the power spectrum multipoles of all pairs of tracers. This
+        function does not return anything, but adds several attributes
+        (see below).
+
+        Attributes
+        ----------
+        edges : array_like
+            the edges of the wavenumber bins
+        poles : :class:`~nbodykit.binned_statistic.BinnedStatistic`
+            a BinnedStatistic object holding the multipoles of each pair of
+            tracers ``(i, j)`` as the ``power_i_j_ell`` columns, as well as the
+            number of modes (``modes``) and average wavenumbers values in
+            each bin (``k``)
+        attrs : dict
+            dictionary holding input parameters and several important quantites
+            computed during execution:
+
+            #. source_i.data.N, source_i.randoms.W, ... :
+                the painting meta-data of each tracer, as in
+                :class:`ConvolvedFFTPower`
+            #. alpha_i :
+                the ratio of the weighted number of data and randoms objects
+                of each tracer
+            #. norm_i_j :
+                the normalization of the power spectra of each pair of tracers
+            #. shotnoise_i_j :
+                the shot noise of the power spectra of each pair of tracers;
+                this should be subtracted from the monopole
+        """
+        ConvolvedFFTPower.run(self)
+
+    def _compute_multipoles(self):
+        r"""
+        Compute the :math:`A_0` and :math:`A_\ell` fields of each tracer,
+        and the window-convolved power spectrum multipoles of each pair
+        of tracers.
+        """
+        rank = self.comm.rank
+        pm   = self.first.pm
+
+        # setup the 1D-binning
+        muedges = numpy.linspace(0, 1, 2, endpoint=True)
+        edges = [self.edges, muedges]
+
+        # make a structured array to hold the results
+        poles = sorted(self.attrs['poles'])
+        cols, dtype = ['k'], ['f8']
+        for (i, j) in self.pairs:
+            cols += ['power_%d_%d_%d' %(i, j, ell) for ell in poles]
+            dtype += ['c8']*len(poles)
+        cols.append('modes'); dtype.append('i8')
+        dtype  = numpy.dtype(list(zip(cols, dtype)))
+        result = numpy.empty(len(self.edges)-1, dtype=dtype)
+
+        # offset the box coordinate mesh ([-BoxSize/2, BoxSize]) back to
+        # the original (x,y,z) coords
+        offset = self.attrs['BoxCenter'] + 0.5*pm.BoxSize / pm.Nmesh
+
+        # spherical harmonic kernels (for ell > 0)
+        ells = [ell for ell in poles if ell > 0]
+        Ylm = _RealYlmGrid(ells)
+
+        # compute the A0 and Aell fields of each tracer
+        start = time.time()
+        fields = self._compute_fields(ells, Ylm, offset)
+        stop = time.time()
+        if rank == 0:
+            self.logger.info("A_ell fields of %d tracers computed in elapsed time %s"
+                             %(len(self.sources), timer(start, stop)))
+
+        # the normalizations and shot noises of each pair
+        self._store_matrix_attrs()
+
+        # calculate the power spectrum multipoles of each pair, slab-by-slab to save memory
+        # NOTE: this computes (A0 of tracer i) * (Aell of tracer j).conj()
+        y3d = ComplexField(pm)
+        for (i, j) in self.pairs:
+            norm = 1.0 / self.attrs['norm_%d_%d' %(i, j)]
+            for ell in poles:
+                A0, Aell = fields[i][0], fields[j][ell]
+                for islab in range(y3d.shape[0]):
+                    y3d[islab,...] = norm * A0[islab] * Aell[islab].conj()
+
+                # project on to 1d k-basis (averaging over mu=[0,1])
+                proj_result, _ = project_to_basis(y3d, edges)
+                result['power_%d_%d_%d' %(i, j, ell)][:] = numpy.squeeze(proj_result[2])
+
+        # save the number of modes and k
+        result['k'][:] = numpy.squeeze(proj_result[0])
+        result['modes'][:] = numpy.squeeze(proj_result[-1])
+
+        return result
+
+    def _compute_fields(self, ells, Ylm, offset):
+        r"""
+        Paint each tracer, and compute its :math:`A_0` and :math:`A_\ell`
+        fields for each ``ell`` in ``ells``. If :attr:`spill_dir` is set, the
+        values of the fields of all but the first tracer are written to disk,
+        and memory-mapped.
+        """
+        rank = self.comm.rank
+        pm = self.first.pm
+        volume = pm.BoxSize.prod()
+
+        fields = []
+        self._field_attrs = []
+        rfield = cfield = grids = None
+        for isource, source in enumerate(self.sources):
+
+            # clear compensation from the actions
+            source.actions[:] = []; source.compensated = False
+            compensation = get_compensation(source)
+            if rank == 0:
+                if compensation is not None:
+                    args = (compensation['func'].__name__, isource)
+                    self.logger.info("using compensation function %s for source %d" % args)
                 else:
-                    fkp_weight2 = second[self.second.fkp_weight]
+                    self.logger.warning("no compensation applied for source %d" % isource)
 
-                S = (comp_weight**2*fkp_weight1*fkp_weight2).sum()
-                if name == 'randoms':
-                    S *= alpha**2
-                Pshot += S # add to total
+            # paint the FKP density field to the mesh
+            density = source.paint(Nmesh=self.attrs['Nmesh'])
+            self._field_attrs.append(density.attrs.copy())
+            if rank == 0:
+                self.logger.info("%s painting of source %d of %d done"
+                                 %(source.window, isource + 1, len(self.sources)))
+
+            # monopole A0 is just the FFT of the FKP density field
+            A = {}
+            A[0] = density.r2c()
+            if compensation is not None:
+                A[0].apply(out=Ellipsis, **compensation)
+            A[0][:] *= volume
+
+            # the scratch fields and unit vector grids are shared by all tracers
+            if ells and cfield is None:
+                rfield, cfield = RealField(pm), ComplexField(pm)
+                if not self.attrs['low_memory']:
+                    grids = _get_unit_grids(density, cfield, offset)
+
+            for ell in ells:
+
+                # sum the Ylm-weighted FFTs of the density over m
+                A[ell] = ComplexField(pm)
+                self._compute_Aell(A[ell], ell, Ylm, density, rfield, cfield, grids, offset)
+
+                # apply the compensation transfer function
+                if compensation is not None:
+                    A[ell].apply(out=Ellipsis, **compensation)
+
+                # factor of 4*pi from spherical harmonic addition theorem + volume factor
+                A[ell][:] *= 4*numpy.pi*volume
+                if rank == 0:
+                    self.logger.info('ell = %d done for source %d; %s r2c completed' %(ell, isource, 2*ell+1))
+            del density
+
+            if isource > 0 and self.spill_dir is not None:
+                for ell in list(A):
+                    filename = os.path.join(self.spill_dir, 'ConvolvedFFTPowerMatrix-%d-%d-%d-%d.npy'
+                                            % (id(self), isource, ell, self.comm.rank))
+                    numpy.save(filename, A[ell].value)
+                    A[ell] = numpy.load(filename, mmap_mode='r')
+                    # the data is read through the memory map
+                    os.remove(filename)
+
+            fields.append(A)
+
+        return fields
+
+    def _store_matrix_attrs(self):
+        """
+        Store the painting meta-data of each tracer, and the normalization
+        and shot noise of each pair of tracers in :attr:`attrs`.
+        """
+        for i, meta in enumerate(self._field_attrs):
+            self.attrs['alpha_%d' %i] = meta['alpha']
+            copy_meta(self.attrs, meta, prefix='source_%d' %i)
+
+        # NOTE: the auto pairs go first, as needed by the geometric means
+        for (i, j) in sorted(self.pairs, key=lambda pair: pair[0] != pair[1]):
+            first, second = self.sources[i], self.sources[j]
+            alpha = self.attrs['alpha_%d' %i]
+
+            if is_valid_crosscorr(first, second):
+
+                # same data/randoms: proper normalization, as in ConvolvedFFTPower
+                sums = {}
+                for name in ['data', 'randoms']:
+                    sums[name] = first.weighted_sums(name, fkp_weight2=second.fkp_weight)
+                norm = sums['randoms']['norm'] * alpha
+
+                # check normalization
+                if i == j:
+                    _check_normalization(sums['data']['norm'], norm, first.nbar)
+
+                Pshot = (sums['data']['shotnoise'] + alpha**2 * sums['randoms']['shotnoise']) / norm
+            else:
+                # geometric mean of the normalizations of the auto power spectra
+                norm = (self.attrs['norm_%d_%d' %(i, i)] * self.attrs['norm_%d_%d' %(j, j)])**0.5
+                Pshot = 0.
+
+            self.attrs['norm_%d_%d' %(i, j)] = norm
+            self.attrs['shotnoise_%d_%d' %(i, j)] = Pshot
+
+class FFTWindowMultipoles(object):
+    r"""
+    Algorithm to compute the multipoles of the window function of a survey,
+    :math:`Q_\ell(s)`, from the randoms of a FKP source, using FFTs.
+
+    The window function multipoles are given by:
+
+    .. math::
+
+        Q_\ell(s) = (2\ell+1) \int \frac{d\Omega_s}{4\pi} \int d^3x
+                        F_r(\vec{x}) F_r(\vec{x}+\vec{s})
+                        \mathcal{L}_\ell(\hat{s} \cdot \hat{x}),
+
+    where :math:`F_r = \alpha w_\mathrm{fkp} w_\mathrm{comp} n_\mathrm{randoms}`
+    is the randoms-only FKP density field. As in :class:`ConvolvedFFTPower`,
+    the spherical harmonic addition theorem is used, such that :math:`2\ell+1`
+    pairs of FFTs are required per multipole:
+
+    .. math::
+
+        Q_\ell(s) = 4\pi \sum_{m=-\ell}^{\ell} \int \frac{d\Omega_s}{4\pi}
+                        Y_{\ell m}(\hat{s}) \int d^3x F_r(\vec{x}) Y_{\ell m}(\hat{x})
+                        F_r(\vec{x}+\vec{s}).
+
+    The multipoles are divided by the power spectrum normalization
+    ``randoms.norm`` of :class:`ConvolvedFFTPower`, such that they can be
+    used to convolve models consistently with its measurements
+    (see Wilson et al. 2017).
+
+    In a periodic box of size :math:`L`, the pairs of objects of a survey
+    of size :math:`D` are aliased for separations :math:`s \geq L - D`. To
+    cover a wide range of separations at a fixed ``Nmesh``, the randoms are
+    painted in boxes of several sizes; each separation bin is measured in
+    the smallest box (with the smallest cells) free of aliasing, i.e. small
+    boxes for small separations, and large boxes for large separations.
+
+    Results are computed when the object is inititalized. See the documenation
+    of :func:`~FFTWindowMultipoles.run` for the attributes storing the results.
+
+    Parameters
+    ----------
+    source : FKPCatalog, FKPCatalogMesh
+        the source holding the randoms; the FKP weights of the source are used
+    poles : list of int
+        a list of integer multipole numbers ``ell`` to compute
+    edges : array_like
+        the edges of the separation bins
+    BoxSizes : list of float, 3-vector, optional
+        the sizes of the boxes to paint the randoms in; each box must be
+        larger than the box of ``source``; default is a single box twice
+        as large as the box of ``source``
+    Nmesh : int, 3-vector, optional
+        the number of cells per mesh size, the same for all boxes
+
+    References
+    ----------
+    * Wilson, Michael J. et al., `Rapid modelling of the redshift-space power
+      spectrum multipoles for a masked density field`, MNRAS, 2017
+    """
+    logger = logging.getLogger('FFTWindowMultipoles')
+
+    def __init__(self, source, poles, edges, BoxSizes=None, Nmesh=None):
+
+        self.source = _cast_source(source, Nmesh=Nmesh)
+        self.comm = self.source.comm
+
+        # make a list of multipole numbers
+        if numpy.isscalar(poles):
+            poles = [poles]
+
+        # the boxes, sorted by increasing size
+        extent = numpy.asarray(self.source.attrs['BoxSize'], dtype='f8')
+        if BoxSizes is None:
+            BoxSizes = [2 * extent]
+        BoxSizes = [numpy.ones(3) * L if numpy.isscalar(L) else numpy.asarray(L, dtype='f8')
+                    for L in BoxSizes]
+        BoxSizes = sorted(BoxSizes, key=lambda L: L.prod())
+
+        # maximum separations free of aliasing, resolved in all directions
+        smax = [min((L - extent).min(), 0.5 * L.min()) for L in BoxSizes]
+        if any(s <= 0 for s in smax):
+            raise ValueError("'BoxSizes' must be larger than the BoxSize of the source, %s" %str(extent))
+
+        edges = numpy.asarray(edges, dtype='f8')
+        if edges[-1] > max(smax):
+            raise ValueError(("the largest box in 'BoxSizes' only covers separations up to "
+                              "%.4f; at least BoxSize %s is required to reach %.4f"
+                              %(max(smax), str(extent + edges[-1]), edges[-1])))
+
+        # store meta-data
+        self.attrs = {}
+        self.attrs['poles'] = poles
+        self.attrs['BoxSizes'] = BoxSizes
+        self.attrs['smax'] = smax
+        self.attrs['Nmesh'] = self.source.attrs['Nmesh'].copy()
+        self.attrs['BoxSize'] = self.source.attrs['BoxSize']
+        self.attrs['BoxCenter'] = self.source.attrs['BoxCenter']
+
+        # grab some mesh attrs, too
+        self.attrs['mesh.window'] = self.source.attrs['window']
+        self.attrs['mesh.interlaced'] = self.source.attrs['interlaced']
+
+        self.edges = edges
+
+        # and run
+        self.run()
+
+    def run(self):
+        """
+        Compute the window function multipoles. This function does not return
+        anything, but adds several attributes (see below).
+
+        Attributes
+        ----------
+        edges : array_like
+            the edges of the separation bins
+        poles : :class:`~nbodykit.binned_statistic.BinnedStatistic`
+            a BinnedStatistic object holding the window function multipoles
+            as the ``corr_ell`` columns, as well as the number of modes
+            (``modes``) and average separation values in each bin (``s``)
+        attrs : dict
+            dictionary holding input parameters and several important quantites
+            computed during execution:
+
+            #. alpha :
+                the ratio of ``data.W`` to ``randoms.W``
+            #. randoms.norm :
+                the normalization of the window function multipoles, equal
+                to that of the power spectrum in :class:`ConvolvedFFTPower`
+            #. BoxSizes, smax :
+                the sizes of the boxes, and the maximum separation measured
+                in each of them
+        """
+        source = self.source
+        poles = sorted(self.attrs['poles'])
+        ells = [ell for ell in poles if ell > 0]
+        Ylm = _RealYlmGrid(ells)
+
+        # alpha and normalization do not depend on the box
+        alpha = source.weighted_total('data') / source.weighted_total('randoms')
+        self.attrs['alpha'] = alpha
+        self.attrs['randoms.norm'] = source.weighted_sums('randoms')['norm'] * alpha
+
+        # make a structured array to hold the results
+        cols   = ['s'] + ['corr_%d' %l for l in poles] + ['modes']
+        dtype  = ['f8'] + ['f8']*len(poles) + ['i8']
+        dtype  = numpy.dtype(list(zip(cols, dtype)))
+        result = numpy.zeros(len(self.edges)-1, dtype=dtype)
+
+        # each bin is measured in the smallest box free of aliasing
+        done = numpy.zeros(len(result), dtype='?')
+        for BoxSize, smax in zip(self.attrs['BoxSizes'], self.attrs['smax']):
+
+            mask = ~done & (self.edges[1:] <= smax)
+            if not mask.any():
+                continue
+
+            if self.comm.rank == 0:
+                self.logger.info("measuring separations up to %.4f in box of size %s" %(smax, str(BoxSize)))
+
+            box_result = self._compute_box(BoxSize, ells, Ylm)
+            for col in cols:
+                result[col][mask] = box_result[col][mask]
+            done |= mask
+
+        self.poles = BinnedStatistic(['s'], [self.edges], result, fields_to_sum=['modes'], **self.attrs)
+
+    def _compute_box(self, BoxSize, ells, Ylm):
+        """
+        Paint the randoms in the box of size ``BoxSize``, and compute the
+        window function multipoles in all separation bins.
+        """
+        rank = self.comm.rank
+        source = self.source
+
+        # the randoms on the mesh of this box
+        mesh = source.base.to_mesh(Nmesh=self.attrs['Nmesh'], BoxSize=BoxSize,
+                                   dtype=source.dtype, interlaced=source.interlaced,
+                                   compensated=False, window=source.window,
+                                   fkp_weight=source.fkp_weight, comp_weight=source.comp_weight,
+                                   nbar=source.nbar, selection=source.selection,
+                                   position=source._uncentered_position)
+        compensation = get_compensation(mesh)
+
+        pm = mesh.pm
+        volume = pm.BoxSize.prod()
+        edges = [self.edges, numpy.linspace(0, 1, 2, endpoint=True)]
+
+        # offset the box coordinate mesh back to the original (x,y,z) coords
+        offset = mesh.attrs['BoxCenter'] + 0.5*pm.BoxSize / pm.Nmesh
 
-        # reduce sum across all ranks
-        Pshot = self.comm.allreduce(first.compute(Pshot))
+        # paint the randoms-only FKP density field
+        density = mesh.paint_randoms()[0]
+        density[:] *= self.attrs['alpha'] / (pm.BoxSize/pm.Nmesh).prod()
+        if rank == 0:
+            self.logger.info("%s painting of randoms done" %mesh.window)
+
+        # FFT density field and apply the paintbrush window transfer kernel
+        B0 = density.r2c()
+        if compensation is not None:
+            B0.apply(out=Ellipsis, **compensation)
+
+        # the monopole is the auto-correlation of the density field
+        # NOTE: 4*pi*Y00**2 = 1
+        cfield = ComplexField(pm)
+        cfield[:] = B0[:] * B0[:].conj() * volume
+        Q = cfield.c2r()
+        proj_result, _ = project_to_basis(Q, edges)
+
+        result = {}
+        result['s'] = numpy.squeeze(proj_result[0])
+        result['modes'] = numpy.squeeze(proj_result[-1])
+        result['corr_0'] = numpy.squeeze(proj_result[2].real)
+
+        rfield = RealField(pm)
+        for ell in ells:
+
+            # sum over m of the Ylm-weighted cross-correlations
+            start = time.time()
+            Q[:] = 0.
+            for l, m in Ylm.harmonics(ell):
+
+                # apply the config-space Ylm to the density
+                for x, slab, dslab in zip(rfield.slabs.x, rfield.slabs, density.slabs):
+                    slab[...] = dslab[...] * Ylm(l, m, *_unit_vectors(x, offset))
+
+                # cross-correlate with the density
+                rfield.r2c(out=cfield)
+                if compensation is not None:
+                    cfield.apply(out=Ellipsis, **compensation)
+                cfield[:] = cfield[:].conj() * B0[:] * volume
+                cfield.c2r(out=rfield)
+
+                # apply the Ylm of the separation vector
+                for s, slab, qslab in zip(rfield.slabs.x, rfield.slabs, Q.slabs):
+                    qslab[...] += slab[...] * Ylm(l, m, *_unit_vectors(s))
+
+            # factor of 4*pi from spherical harmonic addition theorem
+            Q[:] *= 4*numpy.pi
+
+            # average over the separation shells
+            proj_result, _ = project_to_basis(Q, edges)
+            result['corr_%d' %ell] = numpy.squeeze(proj_result[2].real)
+
+            stop = time.time()
+            if rank == 0:
+                args = (ell, 2*ell+1, timer(start, stop))
+                self.logger.info('ell = %d done; %d r2c and c2r completed in %s' %args)
 
-        # divide by normalization from randoms
-        return Pshot / self.attrs['randoms.norm']
+        # normalize as the power spectrum
+        norm = 1.0 / self.attrs['randoms.norm']
+        for ell in [0] + ells:
+            result['corr_%d' %ell] *= norm
+
+        return result
+
+    def __getstate__(self):
+        state = dict(edges=self.edges,
+                     poles=self.poles.data,
+                     attrs=self.attrs)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.poles = BinnedStatistic(['s'], [self.edges], self.poles, fields_to_sum=['modes'])
+
+    def save(self, output):
+        """
+        Save the FFTWindowMultipoles result to disk.
+
+        The format is currently json.
+
+        Parameters
+        ----------
+        output : str
+            the name of the file to dump the JSON results to
+        """
+        import json
+        from nbodykit.utils import JSONEncoder
+
+        # only the master rank writes
+        if self.comm.rank == 0:
+            self.logger.info('saving FFTWindowMultipoles result to %s' %output)
+
+            with open(output, 'w') as ff:
+                json.dump(self.__getstate__(), ff, cls=JSONEncoder)
+
+    @classmethod
+    @CurrentMPIComm.enable
+    def load(cls, output, comm=None):
+        """
+        Load a saved FFTWindowMultipoles result, which has been saved to
+        disk with :func:`FFTWindowMultipoles.save`.
+
+        The current MPI communicator is automatically used
+        if the ``comm`` keyword is ``None``
+        """
+        import json
+        from nbodykit.utils import JSONDecoder
+
+        if comm.rank == 0:
+            with open(output, 'r') as ff:
+                state = json.load(ff, cls=JSONDecoder)
+        else:
+            state = None
+        state = comm.bcast(state)
+        self = object.__new__(cls)
+        self.__setstate__(state)
+        self.comm = comm
+        return self
 
 def _cast_source(source, Nmesh):
     """
@@ -766,6 +1711,77 @@ def _cast_source(source, Nmesh):
 
     return source
 
+def _write_field(path, dataset, field):
+    """
+    Write the values of ``field`` to the ``dataset`` of the BigFile ``path``,
+    in the global order of the mesh.
+    """
+    import bigfile
+
+    with bigfile.BigFileMPI(field.pm.comm, path, create=True) as ff:
+        data = numpy.empty(shape=field.size, dtype=field.dtype)
+        field.ravel(out=data)
+        with ff.create_from_array(dataset, data):
+            pass
+
+def _read_field(path, dataset, field):
+    """
+    Read the values of ``field`` from the ``dataset`` of the BigFile ``path``,
+    written by :func:`_write_field`, returning ``field``.
+    """
+    import bigfile
+
+    comm = field.pm.comm
+    with bigfile.BigFileMPI(comm, path)[dataset] as ds:
+        start = sum(comm.allgather(field.size)[:comm.rank])
+        field.unsort(ds[start:start + field.size])
+    return field
+
+def _get_unit_grids(rfield, cfield, offset):
+    """
+    Return the unit vectors of the real-space mesh of ``rfield``, shifted
+    by ``offset``, and of the Fourier-space mesh of ``cfield``.
+    """
+    # the real-space grid
+    xgrid = [xx.astype('f8') + offset[ii] for ii, xx in enumerate(rfield.slabs.optx)]
+    xnorm = numpy.sqrt(sum(xx**2 for xx in xgrid))
+    xgrid = [x/xnorm for x in xgrid]
+
+    # the Fourier-space grid
+    kgrid = [kk.astype('f8') for kk in cfield.slabs.optx]
+    knorm = numpy.sqrt(sum(kk**2 for kk in kgrid)); knorm[knorm==0.] = numpy.inf
+    kgrid = [k/knorm for k in kgrid]
+
+    return xgrid, kgrid
+
+def _unit_vectors(x, offset=None):
+    """
+    Return the unit vectors along the coordinates ``x`` of a slab, shifted
+    by ``offset`` if provided; zero vectors are returned as is.
+    """
+    x = [xx.astype('f8') for xx in x]
+    if offset is not None:
+        x = [xx + offset[ii] for ii, xx in enumerate(x)]
+    norm = numpy.sqrt(sum(xx**2 for xx in x)); norm[norm==0.] = numpy.inf
+    return [xx/norm for xx in x]
+
+def _check_normalization(Adata, Aran, nbar):
+    """
+    Check that the normalizations computed from the data and randoms
+    are within 5%.
+    """
+    if not numpy.allclose(Adata, Aran, rtol=0.05):
+        msg = "normalization in ConvolvedFFTPower different by more than 5%; "
+        msg += ",algorithm requires they must be similar\n"
+        msg += "\trandoms.norm = %.6f, data.norm = %.6f\n" % (Aran, Adata)
+        msg += "\tpossible discrepancies could be related to normalization "
+        msg += "of n(z) column ('%s')\n" % nbar
+        msg += "\tor the consistency of the FKP weight column for 'data' "
+        msg += "and 'randoms';\n"
+        msg += "\tn(z) columns for 'data' and 'randoms' should be "
+        msg += "normalized to represent n(z) of the data catalog"
+        raise ValueError(msg)
+
 def get_compensation(mesh):
     toret = None
     try:
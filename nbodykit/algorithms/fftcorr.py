@@ -54,11 +54,16 @@ class FFTCorr(FFTBase):
     poles : list of int, optional
         a list of multipole numbers ``ell`` to compute :math:`\xi_\ell(r)`
         from :math:`\xi(r,\mu)`
+    y3d : ComplexField, optional
+        the 3D power of the sources, if already computed (e.g., the
+        :attr:`~nbodykit.algorithms.fftpower.FFTPower.y3d` attribute of
+        FFTPower), with the same Nmesh and BoxSize; the sources are then
+        not painted again
     """
     logger = logging.getLogger('FFTCorr')
 
     def __init__(self, first, mode, Nmesh=None, BoxSize=None, second=None,
-                    los=[0, 0, 1], Nmu=5, dr=None, rmin=0., poles=[]):
+                    los=[0, 0, 1], Nmu=5, dr=None, rmin=0., poles=[], y3d=None):
 
         # mode is either '1d' or '2d'
         if mode not in ['1d', '2d']:
@@ -87,9 +92,14 @@ class FFTCorr(FFTBase):
         self.attrs['dr'] = dr
         self.attrs['rmin'] = rmin
 
-        self.run()
+        if y3d is not None and not numpy.array_equal(y3d.Nmesh, self.attrs['Nmesh']):
+            raise ValueError("mismatched Nmesh between the 3D power ``y3d`` and the sources")
+        if y3d is not None and not numpy.allclose(y3d.pm.BoxSize, self.attrs['BoxSize']):
+            raise ValueError("mismatched BoxSize between the 3D power ``y3d`` and the sources")
 
-    def run(self):
+        self.run(y3d=y3d)
+
+    def run(self, y3d=None):
         r"""
         Compute the correlation function in a periodic box, using FFTs. This
         function returns nothing, but attaches several attributes
@@ -99,6 +109,12 @@ class FFTCorr(FFTBase):
         - :attr:`corr`
         - :attr:`poles`
 
+        Parameters
+        ----------
+        y3d : ComplexField, optional
+            the 3D power of the sources, if already computed; it is
+            transformed to the 3D correlation out-of-place
+
         Attributes
         ----------
         edges : array_like
@@ -148,11 +164,18 @@ class FFTCorr(FFTBase):
         # only need one mu bin if 1d case is requested
         if self.attrs['mode'] == "1d": self.attrs['Nmu'] = 1
 
-        # measure the 3D power (y3d is a ComplexField)
-        y3d = self._compute_3d_power()
+        if y3d is None:
+            # measure the 3D power (y3d is a ComplexField)
+            y3d = self._compute_3d_power()
 
-        # measure the 3D correlation (y3d is a RealField)
-        y3d = y3d.c2r(out=Ellipsis)
+            # measure the 3D correlation (y3d is a RealField)
+            y3d = y3d.c2r(out=Ellipsis)
+        else:
+            # re-use the 3D power (leaving it untouched)
+            attrs = getattr(y3d, 'attrs', {})
+            for name in ['N1', 'N2', 'shotnoise']:
+                self.attrs[name] = attrs.get(name, 0)
+            y3d = y3d.c2r()
 
         # correlation is dimensionless
         # Note that L^3 cancels with dk^3.
@@ -1,8 +1,9 @@
 import os
 import numpy
 import logging
+from collections import OrderedDict
 
-from nbodykit import CurrentMPIComm
+from nbodykit import CurrentMPIComm, _global_options
 from nbodykit.binned_statistic import BinnedStatistic
 from nbodykit.meshtools import SlabIterator
 from nbodykit.base.catalog import CatalogSourceBase
@@ -24,6 +25,9 @@ class FFTBase(object):
     BoxSize : 3-vector
         the size of the box
     """
+    # the 3D power, if kept by the algorithm
+    y3d = None
+
     def __init__(self, first, second, Nmesh, BoxSize):
         from pmesh.pm import ParticleMesh
 
@@ -121,6 +125,15 @@ class FFTBase(object):
         # ref to http://icc.dur.ac.uk/~tt/Lectures/UA/L4/cosmology.pdf
         p3d[...] *= self.attrs['BoxSize'].prod()
 
+        self._store_field_attrs(c1, c2)
+
+        return p3d
+
+    def _store_field_attrs(self, c1, c2):
+        """
+        Store the number of objects and the shot noise of the painted
+        fields ``c1`` and ``c2`` in :attr:`attrs`.
+        """
         # get the number of objects (in a safe manner)
         N1 = c1.attrs.get('N', 0)
         N2 = c2.attrs.get('N', 0)
@@ -138,8 +151,6 @@ class FFTBase(object):
                 Pshot = c1.attrs['shotnoise']
         self.attrs['shotnoise'] = Pshot
 
-        return p3d
-
 class FFTPower(FFTBase):
     """
     Algorithm to compute the 1d or 2d power spectrum and/or multipoles
@@ -170,7 +181,9 @@ class FFTPower(FFTBase):
     second : CatalogSource, MeshSource, optional
         the second source for cross-correlations
     los : array_like , optional
-        the direction to use as the line-of-sight; must be a unit vector
+        the direction to use as the line-of-sight; must be a unit vector;
+        if a list of vectors is provided, the results are averaged over
+        these lines-of-sight
     Nmu : int, optional
         the number of mu bins to use from :math:`\mu=[0,1]`;
         if `mode = 1d`, then ``Nmu`` is set to 1
@@ -182,12 +195,62 @@ class FFTPower(FFTBase):
     poles : list of int, optional
         a list of multipole numbers ``ell`` to compute :math:`P_\ell(k)`
         from :math:`P(k,\mu)`
+    los_offset : str, optional
+        the name of a column of the catalog sources (e.g., ``VelocityOffset``)
+        such that, for each line-of-sight ``los``, the sources are painted
+        at ``Position + (los_offset . los) * los``; this is useful to average
+        redshift-space spectra over several lines-of-sight; it cannot be
+        used with ``folds``
+    folds : list of int, optional
+        fold factors ``F`` (e.g., ``[2, 4, 8]``) to extend the measurement
+        to high ``k`` at a fixed ``Nmesh``: for each factor, the catalog
+        sources are painted at their positions modulo ``BoxSize/F`` in a box
+        of size ``BoxSize/F``; see :func:`~FFTPower.run` for details
+    keep_y3d : bool, optional
+        if ``True``, keep the 3D power (a ComplexField) in :attr:`y3d`,
+        e.g., to compute the correlation function with :func:`to_corr`
+        without painting the sources again; this is ignored with
+        ``los_offset`` or ``folds``
+    keep_sums : bool, optional
+        if ``True``, keep the sums of ``k``, ``mu``, the power and its
+        multipole projections, and the number of modes in each (`k`, `mu`)
+        bin in :attr:`sums`; measured on fine bins (small ``dk``, large
+        ``Nmu``), the results can then be computed exactly on any coarser
+        binning with :func:`rebin`
     """
     logger = logging.getLogger('FFTPower')
 
+    # the sums in each (k, mu) bin, if kept
+    sums = None
+
     def __init__(self, first, mode, Nmesh=None, BoxSize=None, second=None,
-                    los=[0, 0, 1], Nmu=5, dk=None, kmin=0., poles=[]):
+                    los=[0, 0, 1], Nmu=5, dk=None, kmin=0., poles=[], los_offset=None,
+                    folds=None, keep_y3d=False, keep_sums=False):
+
+        FFTBase.__init__(self, first, second, Nmesh, BoxSize)
+        self._set_binning(mode, los, Nmu, dk, kmin, poles)
+        self.attrs['los_offset'] = los_offset
+        self.keep_y3d = keep_y3d
+        self.keep_sums = keep_sums
+
+        if keep_sums and (numpy.ndim(los) != 1 or folds):
+            raise ValueError("``keep_sums`` can only be used with a single line-of-sight ``los`` and no ``folds``")
+
+        if folds:
+            if numpy.ndim(los) != 1:
+                raise ValueError("``folds`` can only be used with a single line-of-sight ``los``")
+            if los_offset is not None:
+                raise ValueError("``folds`` cannot be used with ``los_offset``")
+            if any(int(F) != F or F < 2 for F in folds):
+                raise ValueError("fold factors ``folds`` must be integers larger than 1")
+        self.attrs['folds'] = sorted(folds) if folds else []
 
+        self.run()
+
+    def _set_binning(self, mode, los, Nmu, dk, kmin, poles):
+        """
+        Check the binning parameters and save them in :attr:`attrs`.
+        """
         # mode is either '1d' or '2d'
         if mode not in ['1d', '2d']:
             raise ValueError("`mode` should be either '1d' or '2d'")
@@ -196,13 +259,11 @@ class FFTPower(FFTBase):
             poles = []
 
         # check los
-        if numpy.isscalar(los) or len(los) != 3:
+        if numpy.ndim(los) not in [1, 2] or numpy.shape(los)[-1] != 3:
             raise ValueError("line-of-sight ``los`` should be vector with length 3")
-        if not numpy.allclose(numpy.einsum('i,i', los, los), 1.0, rtol=1e-5):
+        if not numpy.allclose(numpy.einsum('...i,...i', los, los), 1.0, rtol=1e-5):
             raise ValueError("line-of-sight ``los`` must be a unit vector")
 
-        FFTBase.__init__(self, first, second, Nmesh, BoxSize)
-
         # save meta-data
         self.attrs['mode'] = mode
         self.attrs['los'] = los
@@ -215,8 +276,6 @@ class FFTPower(FFTBase):
         self.attrs['dk'] = dk
         self.attrs['kmin'] = kmin
 
-        self.run()
-
     def run(self):
         """
         Compute the power spectrum in a periodic box, using FFTs. This
@@ -271,32 +330,242 @@ class FFTPower(FFTBase):
                 the total number of objects in the first source
             - N2 : int
                 the total number of objects in the second source
+
+        los_power, los_poles : list
+            if several lines-of-sight are provided, the :attr:`power` and
+            :attr:`poles` results for each line-of-sight; :attr:`power`
+            and :attr:`poles` then hold the average over the lines-of-sight
+
+        sums : :class:`~nbodykit.binned_statistic.BinnedStatistic`
+            if ``keep_sums`` is ``True``, the sums in each (`k`, `mu`) bin
+            (a single `mu` bin if ``mode = 1d``) of:
+
+            - k :
+                the ``k`` values
+            - mu :
+                the ``mu`` values
+            - power :
+                the power
+            - power_L :
+                the power weighted by :math:`(2L+1) L_L(\mu)`, for the
+                :math:`\ell=L` multipole
+            - modes :
+                the number of Fourier modes
+
+        Notes
+        -----
+        If fold factors ``folds`` are provided, the power of the folded
+        field, painted at positions modulo ``BoxSize/F``, is measured on
+        the modes that are multiples of ``F`` times the fundamental mode of
+        the box, and multiplied by :math:`F^3`. The unfolded measurement
+        and each folded measurement, but the last, are used up to half
+        their Nyquist frequency; the results are stitched together on
+        ``k`` bins of width ``max(dk, F * 2 pi / BoxSize)``, and ``modes``
+        is the number of modes of the folded meshes.
         """
+        if self.attrs['folds']:
+            self.edges, (self.power, self.poles) = self._measure_folds()
+            self._make_datasets()
+            return
 
-        # only need one mu bin if 1d case is requested
-        if self.attrs['mode'] == "1d": self.attrs['Nmu'] = 1
+        edges = self._get_edges()
 
-        # measure the 3D power (y3d is a ComplexField)
-        y3d = self._compute_3d_power()
+        los = self.attrs['los']
+        if numpy.ndim(los) == 1 and self.attrs['los_offset'] is None:
+            results = [self._measure(edges, los)]
+        else:
+            # a single line-of-sight is offset too
+            results = self._measure_los(edges, numpy.reshape(los, (-1, 3)))
 
-        # binning in k out to the minimum nyquist frequency
-        # (accounting for possibly anisotropic box)
-        dk = self.attrs['dk']
+        results = [self._format(edges, *result) for result in results]
+        if len(results) > 1:
+            self.los_power = [power for power, poles in results]
+            self.los_poles = [poles for power, poles in results]
+            results.append(_average_los(self.los_power, self.los_poles))
+
+        # set all the necessary results
+        self.edges = edges[0] if self.attrs['mode'] == "1d" else edges
+        self.power, self.poles = results[-1]
+
+        self._make_datasets()
+
+    def _measure(self, edges, los):
+        """
+        Measure the power on the (`k`, `mu`) bins given by ``edges``,
+        for the line-of-sight ``los``.
+
+        Returns
+        -------
+        result, pole_result :
+            see :func:`project_to_basis`
+        """
+        if self._can_fuse():
+            # paint, filter, multiply and bin in a single pass
+            results = self._project_fused(edges, los)
+        else:
+            # measure the 3D power (y3d is a ComplexField)
+            y3d = self._compute_3d_power()
+            self._keep(y3d)
+            results = project_to_basis(y3d, edges, poles=self.attrs['poles'], los=los,
+                                       return_sums=self.keep_sums)
+
+        if self.keep_sums:
+            self.sums_edges = edges
+            self.sums = self._format_sums(*results[2])
+        return results[:2]
+
+    def _measure_los(self, edges, los):
+        """
+        Measure the power on the (`k`, `mu`) bins given by ``edges``,
+        for each of the lines-of-sight ``los``.
+
+        If no ``los_offset`` column is specified, the 3D power is
+        computed only once, and projected for each line-of-sight;
+        otherwise the sources are painted at the offset positions for
+        each line-of-sight.
+
+        Returns
+        -------
+        results : list
+            the ``(result, pole_result)`` for each line-of-sight, see
+            :func:`project_to_basis`
+        """
+        offset = self.attrs['los_offset']
+        if offset is None:
+            # the same 3D power is projected along each line-of-sight
+            y3d = self._compute_3d_power()
+            self._keep(y3d)
+            return [project_to_basis(y3d, edges, poles=self.attrs['poles'], los=l) for l in los]
+
+        first, second = self.first, self.second
+        results = []
+        try:
+            for l in los:
+                if self.comm.rank == 0:
+                    self.logger.info("measuring the power along the line-of-sight %s" % str(l))
+                self.first = _offset_mesh(first, offset, l)
+                self.second = self.first if second is first else _offset_mesh(second, offset, l)
+                results.append(self._measure(edges, l))
+        finally:
+            self.first, self.second = first, second
+
+        return results
+
+    def _measure_folds(self):
+        """
+        Measure the power with the fold factors ``folds``, and stitch the
+        results together.
+
+        Returns
+        -------
+        edges, (power, poles) :
+            the stitched bin edges, and structured arrays
+        """
+        factors = [1] + self.attrs['folds']
+        kfun = 2 * numpy.pi / self.attrs['BoxSize'].min()
         kmin = self.attrs['kmin']
-        kedges = numpy.arange(kmin, numpy.pi*y3d.Nmesh.min()/y3d.BoxSize.max() + dk/2, dk)
 
-        # project on to the desired basis
-        muedges = numpy.linspace(0, 1, self.attrs['Nmu']+1, endpoint=True)
-        edges = [kedges, muedges]
-        result, pole_result = project_to_basis(y3d, edges,
-                                               poles=self.attrs['poles'],
-                                               los=self.attrs['los'])
+        kedges, powers, poles = [], [], []
+        for F in factors:
+            if F == 1:
+                first, second = self.first, self.second
+            else:
+                first = _fold_mesh(self.first, F)
+                second = first if self.second is self.first else _fold_mesh(self.second, F)
+
+            if self.comm.rank == 0:
+                self.logger.info("measuring the power with fold factor %d" % F)
+
+            r = FFTPower(first, second=second, mode=self.attrs['mode'],
+                         los=self.attrs['los'], Nmu=self.attrs['Nmu'],
+                         dk=max(self.attrs['dk'], F * kfun), kmin=kmin,
+                         poles=self.attrs['poles'])
+
+            if F == 1:
+                for name in ['shotnoise', 'N1', 'N2']:
+                    self.attrs[name] = r.attrs[name]
+                muedges = r.power.edges.get('mu', None)
+
+            # use the measurement up to half its Nyquist frequency, but the last one
+            edges = r.power.edges['k']
+            nbins = len(edges) - 1
+            if F != factors[-1]:
+                knyq = numpy.pi * F * self.attrs['Nmesh'].min() / self.attrs['BoxSize'].max()
+                nbins = (edges[1:] <= 0.5 * knyq).sum()
+            if nbins == 0: continue
+
+            # the folded power is for a volume F^3 smaller
+            power = r.power.data[:nbins].copy()
+            power['power'] *= F**3
+            powers.append(power)
+            if r.poles is not None:
+                pole = r.poles.data[:nbins].copy()
+                for ell in self.attrs['poles']:
+                    pole['power_%d' % ell] *= F**3
+                poles.append(pole)
+
+            # the next measurement starts at the last edge
+            kedges.append(edges[:nbins])
+            kmin = edges[nbins]
+
+        # stitch the edges and the results
+        kedges = numpy.append(numpy.concatenate(kedges), kmin)
+        edges = kedges if self.attrs['mode'] == '1d' else [kedges, muedges]
+        power = numpy.concatenate(powers)
+        poles = numpy.concatenate(poles) if poles else None
+
+        return edges, (power, poles)
+
+    def _keep(self, y3d):
+        """
+        Keep the 3D power ``y3d`` in :attr:`y3d` if requested, along
+        with the number of objects and shot noise in its ``attrs``.
+        """
+        if self.keep_y3d and not self.attrs['folds'] and self.attrs['los_offset'] is None:
+            y3d.attrs = dict(y3d.attrs)
+            for name in ['N1', 'N2', 'shotnoise']:
+                y3d.attrs[name] = self.attrs[name]
+            self.y3d = y3d
+
+    def to_corr(self, mode=None, Nmu=None, dr=None, rmin=0., poles=None, los=None):
+        """
+        Compute the correlation function from the 3D power kept in
+        :attr:`y3d`, without painting the sources again.
+
+        The parameters are those of
+        :class:`~nbodykit.algorithms.fftcorr.FFTCorr`; ``mode``, ``Nmu``,
+        ``poles`` and ``los`` default to those of this power spectrum.
 
+        Returns
+        -------
+        FFTCorr :
+            the correlation function
+        """
+        from .fftcorr import FFTCorr
+
+        if self.y3d is None:
+            raise ValueError("the 3D power is not available; use ``keep_y3d=True`` in FFTPower")
+
+        if mode is None: mode = self.attrs['mode']
+        if Nmu is None: Nmu = self.attrs['Nmu']
+        if poles is None: poles = self.attrs['poles']
+        if los is None:
+            los = self.attrs['los']
+            if numpy.ndim(los) != 1: los = [0, 0, 1]
+
+        second = None if self.second is self.first else self.second
+        return FFTCorr(self.first, mode=mode, second=second, los=los, Nmu=Nmu,
+                       dr=dr, rmin=rmin, poles=poles, y3d=self.y3d)
+
+    def _format(self, edges, result, pole_result):
+        """
+        Format the results of :func:`project_to_basis` as the
+        structured arrays :attr:`power` and :attr:`poles`.
+        """
         # format the power results into structured array
         if self.attrs['mode'] == "1d":
             cols = ['k', 'power', 'modes']
             icols = [0, 2, 3]
-            edges = edges[0]
         else:
             cols = ['k', 'mu', 'power', 'modes']
             icols = [0, 1, 2, 3]
@@ -319,12 +588,109 @@ class FFTPower(FFTBase):
             for icol, col in enumerate(cols):
                 poles[col][:] = result[icol]
 
-        # set all the necessary results
-        self.edges = edges
-        self.poles = poles
-        self.power = power
+        return power, poles
 
-        self._make_datasets()
+    def _format_sums(self, xsum, musum, ysum, Nsum):
+        """
+        Format the sums returned by :func:`project_to_basis` as the
+        structured array :attr:`sums`.
+        """
+        cols = ['k', 'mu', 'power'] + ['power_%d' %l for l in self.attrs['poles']] + ['modes']
+        result = [xsum, musum] + list(ysum) + [Nsum]
+
+        dtype = numpy.dtype([(name, result[icol].dtype.str) for icol,name in enumerate(cols)])
+        sums = numpy.empty(result[0].shape, dtype=dtype)
+        for icol, col in enumerate(cols):
+            sums[col][:] = result[icol]
+
+        return sums
+
+    def rebin(self, dk=None, Nmu=None, mode=None):
+        """
+        Compute the results on a coarser binning from the sums kept in
+        :attr:`sums`, without painting the sources again.
+
+        The new bins are unions of the bins of :attr:`sums`, such that
+        the results are exactly those that would be measured on these bins.
+
+        Parameters
+        ----------
+        dk : float, optional
+            the spacing of the new ``k`` bins; the closest integer multiple
+            of the current spacing is used; default is the current spacing
+        Nmu : int, optional
+            the number of new ``mu`` bins, which must divide the current
+            number of ``mu`` bins; default is the current number of ``mu`` bins
+        mode : {'1d', '2d'}, optional
+            compute either 1d or 2d power spectra; default is the current mode
+
+        Returns
+        -------
+        FFTPower :
+            the power spectrum on the new bins, with the :attr:`sums` on
+            these bins
+        """
+        if self.sums is None:
+            raise ValueError("the sums are not available; use ``keep_sums=True`` in FFTPower")
+
+        if mode is None: mode = self.attrs['mode']
+        if mode not in ['1d', '2d']:
+            raise ValueError("`mode` should be either '1d' or '2d'")
+        if mode == '1d': Nmu = 1
+
+        sums = self.sums
+        kedges, muedges = sums.edges['k'], sums.edges['mu']
+        if dk is not None and int(round(dk / numpy.diff(kedges)[0])) != 1:
+            sums = sums.reindex('k', dk, fields_to_sum=sums.variables)
+        if Nmu is not None and Nmu != len(muedges) - 1:
+            if (len(muedges) - 1) % Nmu:
+                raise ValueError("the number of ``mu`` bins must divide the current number %d" % (len(muedges) - 1))
+            sums = sums.reindex('mu', 1. / Nmu, force=False, fields_to_sum=sums.variables)
+
+        data = sums.data
+        N_2d = data['modes']
+        N_1d = N_2d.sum(axis=-1)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            xmean_2d = data['k'] / N_2d
+            mumean_2d = data['mu'] / N_2d
+            y2d = data['power'] / N_2d
+            xmean_1d = data['k'].sum(axis=-1) / N_1d
+            poles = [data['power_%d' % ell].sum(axis=-1) / N_1d for ell in self.attrs['poles']]
+
+        toret = object.__new__(FFTPower)
+        toret.comm = self.comm
+        toret.attrs = self.attrs.copy()
+        toret.attrs['mode'] = mode
+        toret.attrs['Nmu'] = sums.shape[1]
+        toret.attrs['dk'] = numpy.diff(sums.edges['k'])[0]
+        toret.attrs['kmin'] = sums.edges['k'][0]
+
+        edges = [sums.edges['k'], sums.edges['mu']]
+        result = (xmean_2d, mumean_2d, y2d, N_2d)
+        pole_result = (xmean_1d, numpy.array(poles), N_1d) if poles else None
+        toret.power, toret.poles = toret._format(edges, result, pole_result)
+        toret.edges = edges[0] if mode == '1d' else edges
+        toret.sums, toret.sums_edges = data, edges
+        toret._make_datasets()
+
+        return toret
+
+    def _get_edges(self):
+        """
+        Return the edges of the (`k`, `mu`) bins.
+        """
+        # only need one mu bin if 1d case is requested
+        if self.attrs['mode'] == "1d": self.attrs['Nmu'] = 1
+
+        # binning in k out to the minimum nyquist frequency
+        # (accounting for possibly anisotropic box)
+        dk = self.attrs['dk']
+        kmin = self.attrs['kmin']
+        kedges = numpy.arange(kmin, numpy.pi*self.attrs['Nmesh'].min()/self.attrs['BoxSize'].max() + dk/2, dk)
+
+        # project on to the desired basis
+        muedges = numpy.linspace(0, 1, self.attrs['Nmu']+1, endpoint=True)
+        return [kedges, muedges]
 
     def __getstate__(self):
         state = dict(
@@ -332,6 +698,12 @@ class FFTPower(FFTBase):
                      power=self.power.data,
                      poles=getattr(self.poles, 'data', None),
                      attrs=self.attrs)
+        if hasattr(self, 'los_power'):
+            state['los_power'] = [power.data for power in self.los_power]
+            state['los_poles'] = [getattr(poles, 'data', None) for poles in self.los_poles]
+        if self.sums is not None:
+            state['sums'] = self.sums.data
+            state['sums_edges'] = self.sums_edges
         return state
 
     def __setstate__(self, state):
@@ -340,12 +712,24 @@ class FFTPower(FFTBase):
 
     def _make_datasets(self):
 
+        self.power, self.poles = self._make_dataset(self.power, self.poles)
+        if hasattr(self, 'los_power'):
+            results = [self._make_dataset(power, poles) for power, poles in zip(self.los_power, self.los_poles)]
+            self.los_power = [power for power, poles in results]
+            self.los_poles = [poles for power, poles in results]
+        if self.sums is not None:
+            self.sums = BinnedStatistic(['k', 'mu'], self.sums_edges, self.sums,
+                                        fields_to_sum=list(self.sums.dtype.names), **self.attrs)
+
+    def _make_dataset(self, power, poles):
+
         if self.attrs['mode'] == '1d':
-            self.power = BinnedStatistic(['k'], [self.edges], self.power, fields_to_sum=['modes'], **self.attrs)
+            power = BinnedStatistic(['k'], [self.edges], power, fields_to_sum=['modes'], **self.attrs)
         else:
-            self.power = BinnedStatistic(['k', 'mu'], self.edges, self.power, fields_to_sum=['modes'], **self.attrs)
-        if self.poles is not None:
-            self.poles = BinnedStatistic(['k'], [self.power.edges['k']], self.poles, fields_to_sum=['modes'], **self.attrs)
+            power = BinnedStatistic(['k', 'mu'], self.edges, power, fields_to_sum=['modes'], **self.attrs)
+        if poles is not None:
+            poles = BinnedStatistic(['k'], [power.edges['k']], poles, fields_to_sum=['modes'], **self.attrs)
+        return power, poles
 
     def _compute_3d_power(self):
         """
@@ -380,24 +764,640 @@ class FFTPower(FFTBase):
         # ref to http://icc.dur.ac.uk/~tt/Lectures/UA/L4/cosmology.pdf
         p3d[...] *= self.attrs['BoxSize'].prod()
 
-        # get the number of objects (in a safe manner)
-        N1 = c1.attrs.get('N', 0)
-        N2 = c2.attrs.get('N', 0)
-        self.attrs.update({'N1':N1, 'N2':N2})
+        self._store_field_attrs(c1, c2)
 
-        # add shotnoise (nonzero only for auto-spectra)
-        Pshot = 0
+        return p3d
+
+    def _can_fuse(self):
+        """
+        Whether the power can be measured with :func:`_project_fused`: this
+        requires the fields to be painted at their intrinsic resolution,
+        with only Fourier-space filters in their actions (e.g., the
+        window compensation), and no cache of painted fields.
+        """
+        from nbodykit import _global_options
+
+        # the 3D power is never formed in the fused binning
+        if self.keep_y3d:
+            return False
+
+        if _global_options['paint_cache_size'] > 0 or _global_options['paint_cache_dir'] is not None:
+            return False
+
+        for source in [self.first, self.second]:
+            if not numpy.array_equal(source.pm.Nmesh, self.attrs['Nmesh']):
+                return False
+            for action in source.actions:
+                if action[0] != 'complex' or action[2] not in [None, 'wavenumber', 'circular']:
+                    return False
+        return True
+
+    def _project_fused(self, edges, los):
+        """
+        Measure the power on the (`k`, `mu`) bins and multipoles given by
+        ``edges``, for the line-of-sight ``los``, in a single sweep over
+        the complex meshes.
+
+        The raw fields are painted, then the Fourier-space filters in
+        :attr:`actions` (e.g., the window compensation), the
+        cross-multiplication, the removal of the zero mode and the binning
+        are done slab by slab.
+
+        Returns
+        -------
+        result, pole_result :
+            see :func:`project_to_basis`
+        """
+        c1 = self.first.to_field(mode='complex')
+
+        # compute the auto power of single supplied field
         if self.first is self.second:
-            if 'shotnoise' not in c1.attrs:
-                if isinstance(self.first, CatalogMesh):
-                    import warnings
-                    warnings.warn(("no 'shotnoise' found for auto power spectrum "
-                                   "of discrete data in FFTPower"))
+            c2 = c1
+        else:
+            c2 = self.second.to_field(mode='complex')
+
+        if self.comm.rank == 0:
+            self.logger.info('computing the power with fused filtering and binning')
+
+        projector, slabs = _get_projector(c1, edges, los=los, poles=self.attrs['poles'])
+
+        H = c1.BoxSize / c1.Nmesh
+        volume = self.attrs['BoxSize'].prod()
+
+        for slab, binned in slabs:
+
+            # the wavenumber and circular frequency on the slab
+            k = [slab.coords(i) for i in range(slab.ndim)]
+            w = [k[i] * H[i] for i in range(slab.ndim)]
+
+            # apply the filters
+            index = tuple(slab.index)
+            s1 = _apply_slab_actions(self.first.actions, k, w, c1[index])
+            if self.first is self.second:
+                s2 = s1
             else:
-                Pshot = c1.attrs['shotnoise']
-        self.attrs['shotnoise'] = Pshot
+                s2 = _apply_slab_actions(self.second.actions, k, w, c2[index])
 
-        return p3d
+            # the complex field is dimensionless; power is L^3
+            p3d = numpy.asarray(s1 * s2.conj() * volume, dtype=c1.dtype)
+
+            # clear the zero mode
+            p3d[slab.norm2() == 0.] = 0
+
+            projector.add(binned, p3d)
+
+        self._store_field_attrs(c1, c2)
+
+        return projector.finalize(self.comm, return_sums=self.keep_sums)
+
+class FFTPowerMatrix(FFTPower):
+    """
+    Algorithm to compute all the auto and cross power spectra of a list
+    of sources in a periodic box, using a Fast Fourier Transform (FFT).
+
+    Each source is painted and Fourier transformed only once; the power
+    spectra of all pairs of sources are then binned in a single sweep over
+    the complex meshes.
+
+    Results are computed when the object is inititalized. See the documenation
+    of :func:`~FFTPowerMatrix.run` for the attributes storing the results.
+
+    Parameters
+    ----------
+    sources : list of CatalogSource, MeshSource
+        the sources; if a CatalogSource is provided, it is automatically
+        converted to MeshSource using the default painting parameters
+        (via :func:`~nbodykit.base.catalogmesh.CatalogMesh.to_mesh`)
+    mode : {'1d', '2d'}
+        compute either 1d or 2d power spectra
+    Nmesh : int, optional
+        the number of cells per side in the particle mesh used to paint the sources
+    BoxSize : int, 3-vector, optional
+        the size of the box
+    los : array_like , optional
+        the direction to use as the line-of-sight; must be a unit vector
+    Nmu : int, optional
+        the number of mu bins to use from :math:`\mu=[0,1]`;
+        if `mode = 1d`, then ``Nmu`` is set to 1
+    dk : float, optional
+        the linear spacing of ``k`` bins to use; if not provided, the
+        fundamental mode  of the box is used
+    kmin : float, optional
+        the lower edge of the first ``k`` bin to use
+    poles : list of int, optional
+        a list of multipole numbers ``ell`` to compute :math:`P_\ell(k)`
+        from :math:`P(k,\mu)`
+    spill_dir : str, optional
+        if provided, the complex fields of all but the first source are
+        written to this (local scratch) directory once painted, and read
+        back slab by slab, rather than kept in memory
+    """
+    logger = logging.getLogger('FFTPowerMatrix')
+
+    def __init__(self, sources, mode, Nmesh=None, BoxSize=None,
+                    los=[0, 0, 1], Nmu=5, dk=None, kmin=0., poles=[], spill_dir=None):
+
+        if len(sources) < 1:
+            raise ValueError("at least one source is required in FFTPowerMatrix")
+
+        FFTBase.__init__(self, sources[0], None, Nmesh, BoxSize)
+        self.sources = [self.first]
+        for source in sources[1:]:
+            source = _cast_source(source, Nmesh=Nmesh, BoxSize=BoxSize)
+            assert source.comm is self.comm, "communicator mismatch between input sources"
+            if not numpy.array_equal(source.attrs['BoxSize'], self.attrs['BoxSize']):
+                raise ValueError("'BoxSize' mismatch between sources in FFTPowerMatrix")
+            self.sources.append(source)
+
+        self._set_binning(mode, los, Nmu, dk, kmin, poles)
+        if numpy.ndim(los) != 1:
+            raise ValueError("FFTPowerMatrix supports a single line-of-sight ``los``")
+        self.attrs['nsources'] = len(self.sources)
+        self.spill_dir = spill_dir
+
+        self.run()
+
+    @property
+    def pairs(self):
+        """
+        The list of pairs of source indices ``(i, j)``, with ``i <= j``.
+        """
+        N = self.attrs['nsources']
+        return [(i, j) for i in range(N) for j in range(i, N)]
+
+    def run(self):
+        """
+        Compute the power spectra of all pairs of sources in a periodic box,
+        using FFTs. This function returns nothing, but attaches several
+        attributes to the class:
+
+        - :attr:`edges`
+        - :attr:`power`
+        - :attr:`poles`
+
+        Attributes
+        ----------
+        edges : array_like
+            the edges of the wavenumber bins
+        power : :class:`~nbodykit.binned_statistic.BinnedStatistic`
+            a BinnedStatistic object that holds the measured :math:`P(k)` or
+            :math:`P(k,\mu)` of all pairs of sources. It stores the following
+            variables:
+
+            - k :
+                the mean value for each ``k`` bin
+            - mu : ``mode=2d`` only
+                the mean value for each ``mu`` bin
+            - power_i_j :
+                complex array storing the real and imaginary components of the
+                cross power of sources ``i`` and ``j``, with ``i <= j``
+            - modes :
+                the number of Fourier modes averaged together in each bin
+
+        poles : :class:`~nbodykit.binned_statistic.BinnedStatistic` or ``None``
+            a BinnedStatistic object to hold the multipole results
+            :math:`P_\ell(k)`; if no multipoles were requested by the user,
+            this is ``None``. It stores the following variables:
+
+            - k :
+                the mean value for each ``k`` bin
+            - power_i_j_L :
+                complex array storing the real and imaginary components for
+                the :math:`\ell=L` multipole of the cross power of sources
+                ``i`` and ``j``
+            - modes :
+                the number of Fourier modes averaged together in each bin
+
+        attrs : dict
+            dictionary of meta-data; in addition to storing the input parameters,
+            it includes the following fields computed during the algorithm
+            execution:
+
+            - shotnoise_i_j : float
+                the power Poisson shot noise of the pair of sources ``i`` and
+                ``j``; this is non-zero only for auto spectra (``i == j``)
+            - N_i : int
+                the total number of objects in source ``i``
+        """
+        edges = self._get_edges()
+        fields = self._paint_fields()
+
+        # the first field holds the mesh geometry
+        c0 = fields[0]
+        los, poles = self.attrs['los'], self.attrs['poles']
+        projector, slabs = _get_projector(c0, edges, los=los, poles=poles)
+
+        # one projector per pair of sources; the bins are shared
+        pairs = self.pairs
+        projectors = [projector] + [_Projector(edges, los=los, poles=poles,
+                                    dtype=c0.dtype, hermitian_symmetric=True) for pair in pairs[1:]]
+
+        volume = self.attrs['BoxSize'].prod()
+
+        for slab, binned in slabs:
+            index = tuple(slab.index)
+            values = [field[index] for field in fields]
+            zero = slab.norm2() == 0.
+
+            for (i, j), projector in zip(pairs, projectors):
+
+                # the complex field is dimensionless; power is L^3
+                p3d = numpy.asarray(values[i] * values[j].conj() * volume, dtype=c0.dtype)
+
+                # clear the zero mode
+                p3d[zero] = 0
+
+                projector.add(binned, p3d)
+
+        # the sums of coordinates and modes are the same for all pairs
+        for projector in projectors[1:]:
+            projector.xsum[...] = projectors[0].xsum
+            projector.musum[...] = projectors[0].musum
+            projector.Nsum[...] = projectors[0].Nsum
+
+        results = [projector.finalize(self.comm) for projector in projectors]
+        self._store_matrix_attrs()
+
+        # format the power results into structured array
+        result = results[0][0]
+        if self.attrs['mode'] == "1d":
+            cols, icols = ['k'], [0]
+            edges = edges[0]
+        else:
+            cols, icols = ['k', 'mu'], [0, 1]
+        data = [result[icol] for icol in icols]
+        for (i, j), (result, pole_result) in zip(pairs, results):
+            cols.append('power_%d_%d' % (i, j))
+            data.append(result[2])
+        cols.append('modes')
+        data.append(results[0][0][3])
+
+        dtype = numpy.dtype([(name, d.dtype.str) for name, d in zip(cols, data)])
+        power = numpy.squeeze(numpy.empty(data[0].shape, dtype=dtype))
+        for col, d in zip(cols, data):
+            power[col][:] = numpy.squeeze(d)
+
+        # multipole results as a structured array
+        poles = None
+        if results[0][1] is not None:
+            k, _, N = results[0][1]
+            cols, data = ['k'], [k]
+            for (i, j), (result, pole_result) in zip(pairs, results):
+                for ell, pole in zip(self.attrs['poles'], pole_result[1]):
+                    cols.append('power_%d_%d_%d' % (i, j, ell))
+                    data.append(pole)
+            cols.append('modes')
+            data.append(N)
+
+            dtype = numpy.dtype([(name, d.dtype.str) for name, d in zip(cols, data)])
+            poles = numpy.empty(data[0].shape, dtype=dtype)
+            for col, d in zip(cols, data):
+                poles[col][:] = d
+
+        # set all the necessary results
+        self.edges = edges
+        self.poles = poles
+        self.power = power
+
+        self._make_datasets()
+
+    def _paint_fields(self):
+        """
+        Paint the complex field of each source. If :attr:`spill_dir` is
+        set, the values of all but the first field are written to disk,
+        and memory-mapped.
+        """
+        fields = []
+        self._field_attrs = []
+        for isource, source in enumerate(self.sources):
+            if self.comm.rank == 0:
+                self.logger.info('painting source %d of %d' % (isource + 1, len(self.sources)))
+
+            field = source.paint(mode='complex', Nmesh=self.attrs['Nmesh'])
+            self._field_attrs.append(dict(field.attrs))
+
+            if isource > 0 and self.spill_dir is not None:
+                filename = os.path.join(self.spill_dir, 'FFTPowerMatrix-%d-%d-%d.npy'
+                                        % (id(self), isource, self.comm.rank))
+                numpy.save(filename, field.value)
+                del field
+                field = numpy.load(filename, mmap_mode='r')
+                # the data is read through the memory map
+                os.remove(filename)
+
+            fields.append(field)
+
+        return fields
+
+    def _store_matrix_attrs(self):
+        """
+        Store the number of objects of each source, and the shot noise
+        of each pair of sources in :attr:`attrs`.
+        """
+        for i, attrs in enumerate(self._field_attrs):
+            self.attrs['N_%d' % i] = attrs.get('N', 0)
+
+        for (i, j) in self.pairs:
+            # add shotnoise (nonzero only for auto-spectra)
+            Pshot = 0
+            if i == j:
+                if 'shotnoise' not in self._field_attrs[i]:
+                    if isinstance(self.sources[i], CatalogMesh):
+                        import warnings
+                        warnings.warn(("no 'shotnoise' found for auto power spectrum "
+                                       "of discrete data %d in FFTPowerMatrix" % i))
+                else:
+                    Pshot = self._field_attrs[i]['shotnoise']
+            self.attrs['shotnoise_%d_%d' % (i, j)] = Pshot
+
+class SubvolumeFFTPower(FFTPower):
+    """
+    Algorithm to compute the power spectra of the subvolumes of a periodic
+    box, e.g. for covariance estimation with subsamples or jackknife.
+
+    The box is split into ``Nsub`` cubic subvolumes per side. The objects
+    are read and distributed to the ranks owning their subvolume once;
+    each rank then paints and Fourier transforms its subvolumes one after
+    the other on a small mesh, treating each subvolume as a periodic box
+    of size ``BoxSize/Nsub``.
+
+    Results are computed when the object is inititalized. See the documenation
+    of :func:`~SubvolumeFFTPower.run` for the attributes storing the results.
+
+    Parameters
+    ----------
+    source : CatalogSource
+        the source catalog
+    Nsub : int
+        the number of subvolumes per side of the box
+    Nmesh : int, 3-vector
+        the number of cells per side of the mesh of each subvolume
+    mode : {'1d', '2d'}
+        compute either 1d or 2d power spectra
+    BoxSize : int, 3-vector, optional
+        the size of the box; default is the ``BoxSize`` attribute of ``source``
+    los : array_like , optional
+        the direction to use as the line-of-sight; must be a unit vector
+    Nmu : int, optional
+        the number of mu bins to use from :math:`\mu=[0,1]`;
+        if `mode = 1d`, then ``Nmu`` is set to 1
+    dk : float, optional
+        the linear spacing of ``k`` bins to use; if not provided, the
+        fundamental mode of the subvolumes is used
+    kmin : float, optional
+        the lower edge of the first ``k`` bin to use
+    poles : list of int, optional
+        a list of multipole numbers ``ell`` to compute :math:`P_\ell(k)`
+        from :math:`P(k,\mu)`
+    jackknife : bool, optional
+        whether to also compute the jackknife realizations, i.e., the power
+        of the stacked fields of all subvolumes but one
+    position, weight, value, selection : str, optional
+        the names of the columns of ``source`` holding the positions,
+        the weights, the values and the selection of the objects
+    window : str, optional
+        the string specifying which window interpolation scheme to use
+    interlaced : bool, optional
+        whether to use interlacing to reduce aliasing
+    compensated : bool, optional
+        whether to correct for the window introduced by the grid
+        interpolation scheme
+    """
+    logger = logging.getLogger('SubvolumeFFTPower')
+
+    def __init__(self, source, Nsub, Nmesh, mode='1d', BoxSize=None,
+                    los=[0, 0, 1], Nmu=5, dk=None, kmin=0., poles=[], jackknife=False,
+                    position='Position', weight='Weight', value='Value', selection='Selection',
+                    window='cic', interlaced=False, compensated=True):
+
+        if not isinstance(source, CatalogSourceBase) or isinstance(source, MeshSource):
+            raise TypeError("the source of SubvolumeFFTPower should be a CatalogSource")
+
+        if BoxSize is None:
+            if 'BoxSize' not in source.attrs:
+                raise ValueError("``BoxSize`` must be specified if not in the ``source`` attributes")
+            BoxSize = source.attrs['BoxSize']
+
+        self.source = source
+        self.comm = source.comm
+
+        # save meta-data
+        self.attrs = {}
+        self.attrs['Nsub'] = Nsub
+        self.attrs['Nmesh'] = numpy.ones(3, dtype='i8') * Nmesh
+        self.attrs['BoxSize'] = numpy.ones(3, dtype='f8') * BoxSize
+        self.attrs['SubBoxSize'] = self.attrs['BoxSize'] / Nsub
+        self.attrs['jackknife'] = jackknife
+        self.attrs.update(position=position, weight=weight, value=value, selection=selection,
+                          window=window, interlaced=interlaced, compensated=compensated)
+
+        if dk is None:
+            dk = 2 * numpy.pi / self.attrs['SubBoxSize'].min()
+        self._set_binning(mode, los, Nmu, dk, kmin, poles)
+        if numpy.ndim(los) != 1:
+            raise ValueError("SubvolumeFFTPower supports a single line-of-sight ``los``")
+
+        self.run()
+
+    def run(self):
+        """
+        Compute the power spectrum of each subvolume. This function returns
+        nothing, but attaches several attributes to the class:
+
+        - :attr:`edges`
+        - :attr:`power`
+        - :attr:`poles`
+        - :attr:`jackknife`
+
+        Attributes
+        ----------
+        edges : array_like
+            the edges of the wavenumber bins
+        power : :class:`~nbodykit.binned_statistic.BinnedStatistic`
+            a BinnedStatistic object that holds the measured :math:`P(k)` or
+            :math:`P(k,\mu)` of each subvolume, with a first ``subvolume``
+            dimension; see :class:`FFTPower` for the variables
+        poles : :class:`~nbodykit.binned_statistic.BinnedStatistic` or ``None``
+            a BinnedStatistic object to hold the multipoles of each
+            subvolume, with a first ``subvolume`` dimension; if no
+            multipoles were requested by the user, this is ``None``
+        jackknife : tuple or ``None``
+            if ``jackknife`` is ``True``, the ``(power, poles)`` jackknife
+            realizations, with the same dimensions as :attr:`power` and
+            :attr:`poles`: the ``i``-th one is the power of the stacked
+            fields of all subvolumes but the ``i``-th
+        attrs : dict
+            dictionary of meta-data; in addition to storing the input parameters,
+            it includes the following fields computed during the algorithm
+            execution:
+
+            - shotnoise : array_like
+                the power Poisson shot noise of each subvolume
+            - N : array_like
+                the total number of objects in each subvolume
+            - jackknife_shotnoise : array_like
+                the shot noise of each jackknife realization, if computed
+
+        Notes
+        -----
+        The power of the stacked fields of several subvolumes is the sum of
+        their 3D powers, weighted by the square of their total weight
+        :math:`W`, divided by the sum of :math:`W^2`. For the jackknife
+        realizations, each rank keeps the 3D power of its subvolumes, on the
+        mesh of size ``Nmesh``, until the stacked 3D power is reduced.
+        """
+        from nbodykit.source.catalog import ArrayCatalog
+        from pmesh.pm import ParticleMesh
+        from mpi4py import MPI
+
+        comm = self.comm
+        Nsub = self.attrs['Nsub']
+        nsub = Nsub**3
+        jackknife = self.attrs['jackknife']
+
+        # read and send the objects to the rank owning their subvolume
+        data = self._exchange_objects()
+        data = data[data['isub'].argsort(kind='mergesort')]
+        bounds = numpy.searchsorted(data['isub'], numpy.arange(nsub + 1))
+
+        # the mesh of the subvolumes
+        pm = ParticleMesh(BoxSize=self.attrs['SubBoxSize'], Nmesh=self.attrs['Nmesh'],
+                          dtype='f8', comm=MPI.COMM_SELF)
+        stack = pm.create(mode='complex', zeros=True)
+
+        # measure the power of the subvolumes on this rank
+        results, y3ds = [], []
+        for isub in range(comm.rank, nsub, comm.size):
+            sub = data[bounds[isub]:bounds[isub+1]]
+            cat = ArrayCatalog({'Position':sub['Position'], 'Weight':sub['Weight'], 'Value':sub['Value']},
+                               BoxSize=pm.BoxSize, comm=MPI.COMM_SELF)
+            mesh = cat.to_mesh(Nmesh=pm.Nmesh, dtype='f8', window=self.attrs['window'],
+                               interlaced=self.attrs['interlaced'], compensated=self.attrs['compensated'])
+
+            r = FFTPower(mesh, mode=self.attrs['mode'], los=self.attrs['los'], Nmu=self.attrs['Nmu'],
+                         dk=self.attrs['dk'], kmin=self.attrs['kmin'], poles=self.attrs['poles'],
+                         keep_y3d=jackknife)
+            W = sub['Weight'].sum()
+            results.append((isub, r.edges, r.power.data, getattr(r.poles, 'data', None),
+                            r.attrs['shotnoise'], r.attrs['N1'], W))
+
+            # stack the 3D power, weighted by W^2
+            if jackknife:
+                edges = r._get_edges()
+                stack[...] += W**2 * r.y3d
+                y3ds.append(r.y3d)
+
+        if comm.rank == 0:
+            self.logger.info('measured the power of %d subvolumes' % nsub)
+
+        # gather the results of all subvolumes
+        results = sorted(sum(comm.allgather(results), []), key=lambda result: result[0])
+        self.edges = results[0][1]
+        self.power = numpy.array([result[2] for result in results])
+        self.poles = None
+        if results[0][3] is not None:
+            self.poles = numpy.array([result[3] for result in results])
+        self.attrs['shotnoise'] = numpy.array([result[4] for result in results])
+        self.attrs['N'] = numpy.array([result[5] for result in results])
+
+        self.jackknife = None
+        if jackknife:
+            W2 = numpy.array([result[6] for result in results])**2
+            comm.Allreduce(MPI.IN_PLACE, stack.value, op=MPI.SUM)
+
+            # the shot noise of the stacked fields; empty subvolumes do not contribute
+            shotnoise = numpy.where(W2 > 0, W2 * self.attrs['shotnoise'], 0.)
+            self.attrs['jackknife_shotnoise'] = (shotnoise.sum() - shotnoise) / (W2.sum() - W2)
+
+            # the power of the stacked fields, without each subvolume of this rank
+            jack = []
+            for (isub, y3d) in zip(range(comm.rank, nsub, comm.size), y3ds):
+                y3d[...] = (stack - W2[isub] * y3d) / (W2.sum() - W2[isub])
+                result = project_to_basis(y3d, edges, poles=self.attrs['poles'], los=self.attrs['los'])
+                jack.append((isub,) + self._format(edges, *result))
+
+            jack = sorted(sum(comm.allgather(jack), []), key=lambda result: result[0])
+            power = numpy.array([result[1] for result in jack])
+            poles = None
+            if jack[0][2] is not None:
+                poles = numpy.array([result[2] for result in jack])
+            self.jackknife = (power, poles)
+
+        self._make_datasets()
+
+    def _exchange_objects(self):
+        """
+        Read the selected objects by chunks of ``paint_chunk_size``, and send
+        them to the rank owning their subvolume.
+
+        Returns
+        -------
+        data : array_like
+            structured array of the objects of the subvolumes of this rank,
+            with their position in their subvolume, their weight, their value
+            and their subvolume index ``isub``
+        """
+        from mpi4py import MPI
+
+        comm = self.comm
+        Nsub = self.attrs['Nsub']
+        BoxSize, SubBoxSize = self.attrs['BoxSize'], self.attrs['SubBoxSize']
+        dtype = [('Position', ('f8', 3)), ('Weight', 'f8'), ('Value', 'f8'), ('isub', 'i8')]
+
+        source = self.source
+        columns = [self.attrs[name] for name in ['position', 'weight', 'value']]
+        Selection = source[self.attrs['selection']]
+
+        # the exchange is collective, so all ranks loop over the same number of chunks
+        chunksize = _global_options['paint_chunk_size']
+        niter = comm.allreduce((source.size + chunksize - 1) // chunksize, op=MPI.MAX)
+
+        toret = [numpy.empty(0, dtype=dtype)]
+        for ichunk in range(niter):
+            start = ichunk * chunksize
+            if start < source.size:
+                sel = source.compute(Selection[start:start + chunksize])
+                Position, Weight, Value = source.compute_selected(columns, sel, start=start)
+                Position = Position % BoxSize
+            else:
+                Position, Weight, Value = numpy.empty((0, 3)), numpy.empty(0), numpy.empty(0)
+
+            # the subvolume of each object, and its position in the subvolume
+            cell = numpy.clip(numpy.int64(Position // SubBoxSize), 0, Nsub - 1)
+            data = numpy.empty(len(Position), dtype=dtype)
+            data['Position'] = Position - cell * SubBoxSize
+            data['Weight'] = Weight
+            data['Value'] = Value
+            data['isub'] = numpy.ravel_multi_index(cell.T, (Nsub,) * 3)
+
+            toret.append(_exchange(data, data['isub'] % comm.size, comm))
+
+        return numpy.concatenate(toret)
+
+    def __getstate__(self):
+        state = FFTPower.__getstate__(self)
+        if self.jackknife is not None:
+            state['jackknife'] = [getattr(x, 'data', None) for x in self.jackknife]
+        else:
+            state['jackknife'] = None
+        return state
+
+    def _make_datasets(self):
+
+        self.power, self.poles = self._make_dataset(self.power, self.poles)
+        if self.jackknife is not None:
+            self.jackknife = self._make_dataset(*self.jackknife)
+
+    def _make_dataset(self, power, poles):
+
+        subedges = numpy.arange(self.attrs['Nsub']**3 + 1) - 0.5
+        if self.attrs['mode'] == '1d':
+            power = BinnedStatistic(['subvolume', 'k'], [subedges, self.edges], power, fields_to_sum=['modes'], **self.attrs)
+        else:
+            power = BinnedStatistic(['subvolume', 'k', 'mu'], [subedges] + list(self.edges), power, fields_to_sum=['modes'], **self.attrs)
+        if poles is not None:
+            poles = BinnedStatistic(['subvolume', 'k'], [subedges, power.edges['k']], poles, fields_to_sum=['modes'], **self.attrs)
+        return power, poles
 
 class ProjectedFFTPower(FFTBase):
     """
@@ -476,20 +1476,13 @@ class ProjectedFFTPower(FFTBase):
             - modes :
                 the number of Fourier modes averaged together in each bin
         """
-        c1 = self.first.paint(Nmesh=self.attrs['Nmesh'], mode='complex')
-        r1 = c1.preview(self.attrs['Nmesh'], axes=self.attrs['axes'])
-        # average along projected axes;
-        # part of product is the rfftn vs r2c (for axes)
-        # the rest is for the mean (Nmesh - axes)
-        c1 = numpy.fft.rfftn(r1) / self.attrs['Nmesh'].prod()
+        c1 = self._project_field(self.first)
 
         # compute the auto power of single supplied field
         if self.first is self.second:
             c2 = c1
         else:
-            c2 = self.second.paint(Nmesh=self.attrs['Nmesh'], mode='complex')
-            r2 = c2.preview(self.attrs['Nmesh'], axes=self.attrs['axes'])
-            c2 = numpy.fft.rfftn(r2) / self.attrs['Nmesh'].prod() # average along projected axes
+            c2 = self._project_field(self.second)
 
         pk = c1 * c2.conj()
         # clear the zero mode
@@ -534,6 +1527,121 @@ class ProjectedFFTPower(FFTBase):
 
         self.power = BinnedStatistic(['k'], [self.edges], self.power)
 
+    def _project_field(self, source):
+        """
+        Return the Fourier transform of the field of ``source``, averaged
+        along the projected axes.
+
+        Catalog sources whose actions are only Fourier-space filters
+        (e.g., the window compensation) are painted directly on a mesh
+        with the dimensions of :attr:`axes`; otherwise, the full 3D field
+        is painted, and projected.
+        """
+        if self._can_deposit(source):
+            return self._deposit(source)
+
+        c = source.paint(Nmesh=self.attrs['Nmesh'], mode='complex')
+        r = c.preview(self.attrs['Nmesh'], axes=self.attrs['axes'])
+        # average along projected axes;
+        # part of product is the rfftn vs r2c (for axes)
+        # the rest is for the mean (Nmesh - axes)
+        return numpy.fft.rfftn(r) / self.attrs['Nmesh'].prod()
+
+    def _can_deposit(self, source):
+        """
+        Whether the field of ``source`` can be painted directly on a mesh
+        with the dimensions of :attr:`axes`, see :func:`_deposit`.
+        """
+        if type(source) is not CatalogMesh:
+            return False
+        if not numpy.array_equal(source.pm.Nmesh, self.attrs['Nmesh']):
+            return False
+        for action in source.actions:
+            if action[0] != 'complex' or action[2] not in [None, 'wavenumber', 'circular']:
+                return False
+        return True
+
+    def _deposit(self, source):
+        """
+        Paint the CatalogMesh ``source`` directly on a mesh with the
+        dimensions of :attr:`axes`, such that the memory and FFT cost
+        scale as the number of cells of the projected mesh.
+
+        Each rank paints its objects on the full projected mesh, by chunks
+        of ``paint_chunk_size`` objects; the mesh is then summed over all ranks.
+
+        Returns
+        -------
+        array_like
+            the Fourier transform of the field averaged along the projected
+            axes, as in :func:`_project_field`
+        """
+        from pmesh.pm import ParticleMesh
+        from mpi4py import MPI
+
+        axes = list(self.attrs['axes'])
+        Nmesh = self.attrs['Nmesh'][axes]
+        BoxSize = self.attrs['BoxSize'][axes]
+        pm = ParticleMesh(Nmesh=Nmesh, BoxSize=BoxSize, comm=MPI.COMM_SELF,
+                          dtype='f8', resampler=source.window)
+
+        # interlacing needs a shifted mesh
+        shifts = [None, pm.affine.shift(0.5)] if source.interlaced else [None]
+        reals = [numpy.zeros(Nmesh, dtype='f8') for shift in shifts]
+
+        # paint the projected positions and masses of the objects on this rank
+        columns = [source[col] for col in [source.position, source.weight,
+                                           source.value, source.selection]]
+        chunksize = _global_options['paint_chunk_size']
+        W = 0.
+        for i in range(0, len(columns[0]), chunksize):
+            s = slice(i, i + chunksize)
+            Position, Weight, Value, Selection = source.compute(*[col[s] for col in columns])
+            Position = numpy.ascontiguousarray(Position[Selection][:, axes], dtype='f8')
+            Weight, Value = Weight[Selection], Value[Selection]
+            mass = numpy.asarray(Weight * Value, dtype='f8')
+            W += Weight.sum()
+
+            for real, shift in zip(reals, shifts):
+                real += pm.paint(Position, mass=mass, resampler=source.window, transform=shift).value
+
+        # sum over all ranks
+        fields = []
+        for real in reals:
+            self.comm.Allreduce(MPI.IN_PLACE, real)
+            fields.append(numpy.fft.rfftn(real) / Nmesh.prod())
+
+        # the wavenumbers, with the Nyquist frequencies on the negative halves
+        w = []
+        for i, c in enumerate(fields[0].shape):
+            wi = numpy.arange(c, dtype='f8')
+            wi[wi >= Nmesh[i] // 2] -= Nmesh[i]
+            wi *= 2 * numpy.pi / Nmesh[i]
+            w.append(wi.reshape([c if j == i else 1 for j in range(len(axes))]))
+        k = [w[i] * Nmesh[i] / BoxSize[i] for i in range(len(axes))]
+
+        c = fields[0]
+        if source.interlaced:
+            H = BoxSize / Nmesh
+            kH = sum(k[i] * H[i] for i in range(len(axes)))
+            c = c * 0.5 + fields[1] * 0.5 * numpy.exp(0.5 * 1j * kH)
+
+        # normalize to 1 + delta
+        W = self.comm.allreduce(W)
+        if W > 0:
+            c /= 1. * W / Nmesh.prod()
+
+        # apply the filters, with zero wavenumbers along the projected axes;
+        # the zeros are arrays broadcasting against c, as some filters index them
+        zeros = numpy.zeros([1] * len(axes))
+        kall, wall = [zeros] * 3, [zeros] * 3
+        for i, axis in enumerate(axes):
+            kall[axis], wall[axis] = k[i], w[i]
+        for action in source.actions:
+            c = action[1](wall if action[2] == 'circular' else kall, c)
+
+        return c
+
     def __getstate__(self):
         state = dict(
                      edges=self.edges,
@@ -545,7 +1653,7 @@ class ProjectedFFTPower(FFTBase):
         self.__dict__.update(state)
         self.power = BinnedStatistic(['k'], [self.edges], self.power)
 
-def project_to_basis(y3d, edges, los=[0, 0, 1], poles=[]):
+def project_to_basis(y3d, edges, los=[0, 0, 1], poles=[], plan=None, return_sums=False):
     """
     Project a 3D statistic on to the specified basis. The basis will be one
     of:
@@ -564,6 +1672,10 @@ def project_to_basis(y3d, edges, los=[0, 0, 1], poles=[]):
     *   the `mu` range extends from 0.0 to 1.0
     *   the `mu` bins are half-inclusive half-exclusive, except the last bin
         is inclusive on both ends (to include `mu = 1.0`)
+    *   if the ``projection_plan_cache_size`` global option is non-zero
+        (see :class:`nbodykit.set_options`), the bin indices and Legendre
+        weights are cached in a :class:`ProjectionPlan`, and re-used for
+        statistics on a mesh of the same geometry
 
     Parameters
     ----------
@@ -577,11 +1689,11 @@ def project_to_basis(y3d, edges, los=[0, 0, 1], poles=[]):
     poles : list of int, optional
         if provided, a list of integers specifying multipole numbers to
         project the 2d `(x, mu)` bins on to
-    hermitian_symmetric : bool, optional
-        Whether the input array `y3d` is Hermitian-symmetric, i.e., the negative
-        frequency terms are just the complex conjugates of the corresponding
-        positive-frequency terms; if ``True``, the positive frequency terms
-        will be explicitly double-counted to account for this symmetry
+    plan : ProjectionPlan, optional
+        a precomputed plan, created for a mesh of the same geometry and
+        the same ``edges``, ``los`` and ``poles``
+    return_sums : bool, optional
+        if ``True``, also return the sums in each 2D bin
 
     Returns
     -------
@@ -607,139 +1719,605 @@ def project_to_basis(y3d, edges, los=[0, 0, 1], poles=[]):
             the mean multipoles value in each 1D bin
         - N_1d : array_like, (Nx,)
             the number of values averaged in each 1D bin
+
+    sums : tuple, optional
+        if ``return_sums`` is ``True``, the sums in each 2D bin, from which
+        the results can be computed on any coarser binning; a tuple of
+        ``(xsum_2d, musum_2d, ysum_2d, N_2d)``, where:
+
+        - xsum_2d : array_like, (Nx, Nmu)
+            the sum of the `x` values in each 2D bin
+        - musum_2d : array_like, (Nx, Nmu)
+            the sum of the `mu` values in each 2D bin
+        - ysum_2d : array_like, (1 + Nell, Nx, Nmu)
+            the sum of the `y3d` values in each 2D bin, followed by
+            the sums of the `y3d` values weighted by :math:`(2\ell+1) L_\ell(\mu)`
+            for each multipole in ``poles``
+        - N_2d : array_like, (Nx, Nmu)
+            the number of values summed in each 2D bin
     """
     comm = y3d.pm.comm
-    x3d = y3d.x
-    hermitian_symmetric = numpy.iscomplexobj(y3d)
 
-    from scipy.special import legendre
+    projector, slabs = _get_projector(y3d, edges, los, poles, plan=plan)
+
+    # iterate over y-z planes of the coordinate mesh
+    for slab, binned in slabs:
 
-    # setup the bin edges and number of bins
-    xedges, muedges = edges
-    x2edges = xedges**2
-    Nx = len(xedges) - 1
-    Nmu = len(muedges) - 1
+        # sum up the 3D array in the bins
+        projector.add(binned, y3d[tuple(slab.index)])
 
-    # always make sure first ell value is monopole, which
-    # is just (x, mu) projection since legendre of ell=0 is 1
-    do_poles = len(poles) > 0
-    _poles = [0]+sorted(poles) if 0 not in poles else sorted(poles)
-    legpoly = [legendre(l) for l in _poles]
-    ell_idx = [_poles.index(l) for l in poles]
-    Nell = len(_poles)
+    return projector.finalize(comm, return_sums=return_sums)
 
-    # valid ell values
-    if any(ell < 0 for ell in _poles):
-        raise ValueError("in `project_to_basis`, multipole numbers must be non-negative integers")
+class ProjectionPlan(object):
+    """
+    A plan to project 3D statistics defined on a mesh on to (`x`, `mu`)
+    bins and multipoles, see :func:`project_to_basis`.
 
-    # initialize the binning arrays
-    musum = numpy.zeros((Nx+2, Nmu+2))
-    xsum = numpy.zeros((Nx+2, Nmu+2))
-    ysum = numpy.zeros((Nell, Nx+2, Nmu+2), dtype=y3d.dtype) # extra dimension for multipoles
-    Nsum = numpy.zeros((Nx+2, Nmu+2), dtype='i8')
+    The bin indices, Legendre weights and number of modes in each bin only
+    depend on the geometry of the mesh, the bin edges, the line-of-sight
+    and the multipoles. The plan computes them once, such that projecting
+    a new statistic only costs one weighted bincount per multipole.
 
+    Plans can be saved to disk with :func:`save`, and loaded with
+    :func:`load`. Plans are also cached automatically by
+    :func:`project_to_basis` if the ``projection_plan_cache_size`` global
+    option is non-zero (see :class:`nbodykit.set_options`).
+
+    Parameters
+    ----------
+    y3d : RealField or ComplexField
+        a field on the mesh; only its geometry and type are used
+    edges : list of arrays, (2,)
+        list of arrays specifying the edges of the desired `x` bins and `mu` bins
+    los : array_like,
+        the line-of-sight direction to use, which `mu` is defined with
+        respect to; default is [0, 0, 1] for z.
+    poles : list of int, optional
+        a list of integers specifying multipole numbers to project on to
+    """
+    def __init__(self, y3d, edges, los=[0, 0, 1], poles=[]):
+
+        self.comm = y3d.pm.comm
+        self.edges = [numpy.asarray(e) for e in edges]
+        self.los = list(los)
+        self.poles = list(poles)
+        self.hermitian_symmetric = numpy.iscomplexobj(y3d)
+        self.key = _projection_plan_key(y3d, edges, los, poles)
+
+        projector = _Projector(edges, los=los, poles=poles, dtype='f8',
+                               hermitian_symmetric=self.hermitian_symmetric)
+
+        # store the bin indices with the smallest integer type possible
+        nbins = projector.Nsum.size
+        itype = 'i2' if nbins <= numpy.iinfo('i2').max else 'i4'
+
+        self.binned = []
+        for slab in _iter_slabs(y3d.x, self.hermitian_symmetric):
+            binned = projector.bin_slab(slab)
+            if binned is not None:
+                multi_index, legw, nonsingular = binned
+                binned = (multi_index.astype(itype), legw, nonsingular)
+            self.binned.append(binned)
+
+        # the (local) sums of the coordinates and number of modes in each bin
+        self.xsum = projector.xsum
+        self.musum = projector.musum
+        self.Nsum = projector.Nsum
+
+    @property
+    def nbytes(self):
+        """
+        The memory used by the plan on this rank, in bytes.
+        """
+        return sum(sum(a.nbytes for a in binned if a is not None)
+                    for binned in self.binned if binned is not None)
+
+    def project(self, y3d):
+        """
+        Project the 3D statistic ``y3d`` on to the basis of the plan.
+
+        Returns
+        -------
+        result, pole_result :
+            see :func:`project_to_basis`
+        """
+        return project_to_basis(y3d, self.edges, los=self.los, poles=self.poles, plan=self)
+
+    def _get_projector(self, y3d):
+        """
+        Return a projector initialized with the precomputed sums of
+        the coordinates and number of modes, and an iterator over the
+        slabs of ``y3d`` and their bin indices and weights.
+        """
+        if _projection_plan_key(y3d, self.edges, self.los, self.poles) != self.key:
+            raise ValueError(("the projection plan does not match the mesh geometry, "
+                              "the bin edges, the line-of-sight or the multipoles"))
+
+        projector = _Projector(self.edges, los=self.los, poles=self.poles,
+                               dtype=y3d.dtype, hermitian_symmetric=self.hermitian_symmetric)
+        projector.xsum[...] = self.xsum
+        projector.musum[...] = self.musum
+        projector.Nsum[...] = self.Nsum
+
+        slabs = _iter_slabs(y3d.x, self.hermitian_symmetric)
+        slabs = ((slab, binned) for slab, binned in zip(slabs, self.binned) if binned is not None)
+        return projector, slabs
+
+    def save(self, output):
+        """
+        Save the plan to disk; each rank writes the file
+        ``output.<rank>.npz``.
+        """
+        import json
+
+        state = {}
+        state['key'] = json.dumps(self.key)
+        state['xsum'], state['musum'], state['Nsum'] = self.xsum, self.musum, self.Nsum
+        for i, binned in enumerate(self.binned):
+            if binned is None: continue
+            multi_index, legw, nonsingular = binned
+            state['multi_index_%d' % i] = multi_index
+            state['legw_%d' % i] = legw
+            if nonsingular is not None:
+                state['nonsingular_%d' % i] = nonsingular
+
+        numpy.savez('%s.%d.npz' % (output, self.comm.rank), **state)
+
+    @classmethod
+    @CurrentMPIComm.enable
+    def load(cls, output, comm=None):
+        """
+        Load a plan saved to disk with :func:`save`; the number of ranks
+        must be the same as when the plan was saved.
+        """
+        import json
+
+        filename = '%s.%d.npz' % (output, comm.rank)
+
+        key = None
+        if os.path.exists(filename):
+            with numpy.load(filename) as state:
+                key = _totuple(json.loads(str(state['key'])))
+
+        # the plan must have been saved with the same number of ranks
+        valid = key is not None and key[2] == (comm.size, comm.rank)
+        if not all(comm.allgather(valid)):
+            raise ValueError(("projection plan '%s' was not saved "
+                              "with %d ranks" % (output, comm.size)))
+
+        self = object.__new__(cls)
+        self.comm = comm
+        self.key = key
+
+        with numpy.load(filename) as state:
+            self.xsum, self.musum, self.Nsum = state['xsum'], state['musum'], state['Nsum']
+
+            # one entry per slab (None for empty slabs)
+            self.binned = []
+            for i in range(key[4][0]):
+                if 'multi_index_%d' % i not in state:
+                    self.binned.append(None)
+                    continue
+                nonsingular = state['nonsingular_%d' % i] if 'nonsingular_%d' % i in state else None
+                self.binned.append((state['multi_index_%d' % i], state['legw_%d' % i], nonsingular))
+
+        hermitian_symmetric, edges, los, poles = self.key[-4:]
+        self.hermitian_symmetric = hermitian_symmetric
+        self.edges = [numpy.array(e) for e in edges]
+        self.los = list(los)
+        self.poles = list(poles)
+
+        return self
+
+def _projection_plan_key(y3d, edges, los, poles):
+    """
+    The key identifying a :class:`ProjectionPlan` for ``y3d``.
+    """
+    return (tuple(numpy.asarray(y3d.Nmesh).tolist()),
+            tuple(numpy.asarray(y3d.BoxSize).tolist()),
+            (y3d.pm.comm.size, y3d.pm.comm.rank),
+            tuple(numpy.asarray(y3d.start).tolist()),
+            tuple(numpy.shape(y3d)),
+            bool(numpy.iscomplexobj(y3d)),
+            tuple(tuple(numpy.asarray(e).tolist()) for e in edges),
+            tuple(numpy.asarray(los).tolist()),
+            tuple(poles))
+
+def _totuple(obj):
+    """
+    Convert nested lists (e.g., loaded from JSON) to nested tuples.
+    """
+    if isinstance(obj, list):
+        return tuple(_totuple(o) for o in obj)
+    return obj
+
+_projection_plans = OrderedDict()
+
+def _get_projector(y3d, edges, los, poles, plan=None):
+    """
+    Return a projector for ``y3d`` and an iterator over the slabs of
+    ``y3d`` and their bin indices and weights.
+
+    If ``plan`` is ``None``, a cached plan is used if the
+    ``projection_plan_cache_size`` global option is non-zero; otherwise
+    the slabs are binned on-the-fly.
+    """
+    from nbodykit import _global_options
+
+    maxsize = _global_options['projection_plan_cache_size']
+
+    if plan is None and maxsize > 0:
+        key = _projection_plan_key(y3d, edges, los, poles)
+        if key in _projection_plans:
+            plan = _projection_plans.pop(key)
+        else:
+            plan = ProjectionPlan(y3d, edges, los=los, poles=poles)
+
+        # evict the least recently used plans
+        _projection_plans[key] = plan
+        while len(_projection_plans) > maxsize:
+            _projection_plans.popitem(last=False)
+
+    if plan is not None:
+        return plan._get_projector(y3d)
+
+    hermitian_symmetric = numpy.iscomplexobj(y3d)
+    projector = _Projector(edges, los=los, poles=poles, dtype=y3d.dtype,
+                           hermitian_symmetric=hermitian_symmetric)
+
+    def slabs():
+        for slab in _iter_slabs(y3d.x, hermitian_symmetric):
+            # bin the slab (empty slabs are skipped)
+            binned = projector.bin_slab(slab)
+            if binned is None: continue
+            yield slab, binned
+
+    return projector, slabs()
+
+def _legendre(mu, ells):
+    """
+    Evaluate the Legendre polynomials of orders ``ells`` at ``mu``, using
+    Bonnet's recursion formula.
+
+    Returns
+    -------
+    list of array_like
+        the Legendre polynomials, one per ``ell``
+    """
+    toret = []
+    if not len(ells):
+        return toret
+
+    Lm1, L = None, numpy.ones_like(mu)
+    for n in range(max(ells) + 1):
+        if n == 1:
+            Lm1, L = L, mu.copy()
+        elif n > 1:
+            Lm1, L = L, ((2.*n - 1.) * mu * L - (n - 1.) * Lm1) / n
+        if n in ells:
+            toret.append(L)
+    return [toret[sorted(set(ells)).index(ell)] for ell in ells]
+
+def _iter_slabs(x3d, hermitian_symmetric):
+    """
+    Iterate over the y-z planes of the coordinate mesh ``x3d``.
+    """
     # if input array is Hermitian symmetric, only half of the last
     # axis is stored in `y3d`
     symmetry_axis = -1 if hermitian_symmetric else None
+    return SlabIterator(x3d, axis=0, symmetry_axis=symmetry_axis)
 
-    # iterate over y-z planes of the coordinate mesh
-    for slab in SlabIterator(x3d, axis=0, symmetry_axis=symmetry_axis):
+class _Projector(object):
+    """
+    Internal class to project a 3D statistic on to (`x`, `mu`) bins and
+    multipoles, accumulating the statistic slab by slab.
 
+    See :func:`project_to_basis` for details.
+
+    Parameters
+    ----------
+    edges : list of arrays, (2,)
+        list of arrays specifying the edges of the desired `x` bins and `mu` bins
+    los : array_like,
+        the line-of-sight direction to use, which `mu` is defined with
+        respect to
+    poles : list of int
+        list of integers specifying multipole numbers to project on to
+    dtype : numpy.dtype
+        the data type of the statistic
+    hermitian_symmetric : bool
+        whether the statistic is Hermitian-symmetric
+    """
+    def __init__(self, edges, los, poles, dtype, hermitian_symmetric):
+
+        # setup the bin edges and number of bins
+        self.xedges, self.muedges = edges
+        self.x2edges = numpy.asarray(self.xedges)**2
+        self.Nx = Nx = len(self.xedges) - 1
+        self.Nmu = Nmu = len(self.muedges) - 1
+        self.los = los
+        self.hermitian_symmetric = hermitian_symmetric
+
+        # always make sure first ell value is monopole, which
+        # is just (x, mu) projection since legendre of ell=0 is 1
+        self.poles = poles
+        self._poles = [0]+sorted(poles) if 0 not in poles else sorted(poles)
+        self.ell_idx = [self._poles.index(l) for l in poles]
+        Nell = len(self._poles)
+
+        # valid ell values
+        if any(ell < 0 for ell in self._poles):
+            raise ValueError("in `project_to_basis`, multipole numbers must be non-negative integers")
+
+        # initialize the binning arrays
+        self.musum = numpy.zeros((Nx+2, Nmu+2))
+        self.xsum = numpy.zeros((Nx+2, Nmu+2))
+        self.ysum = numpy.zeros((Nell, Nx+2, Nmu+2), dtype=dtype) # extra dimension for multipoles
+        self.Nsum = numpy.zeros((Nx+2, Nmu+2), dtype='i8')
+
+        # the real and imaginary parts of each multipole are accumulated
+        # with a single bincount, offsetting the bin indices of each
+        self.ncomp = 2 if numpy.iscomplexobj(self.ysum) else 1
+        self.offsets = numpy.arange(self.ncomp * Nell)[:, None] * self.Nsum.size
+        self._scratch = None
+
+    def _get_scratch(self, size):
+        """
+        Return the scratch buffers for a slab of ``size`` elements; the
+        buffers are re-used across slabs.
+        """
+        nrows = self.ncomp * len(self._poles)
+        if self._scratch is None or self._scratch['index'].size < nrows * size:
+            self._scratch = {'index' : numpy.empty(nrows * size, dtype='intp'),
+                             'weights' : numpy.empty(nrows * size, dtype='f8'),
+                             'hermitian' : numpy.empty(2 * self.ncomp * size, dtype='f8')}
+        scratch = self._scratch
+        return {'index' : scratch['index'][:nrows * size].reshape(nrows, size),
+                'weights' : scratch['weights'][:nrows * size].reshape(self.ncomp, -1, size),
+                'hermitian' : scratch['hermitian'][:2 * self.ncomp * size].reshape(2, self.ncomp, size)}
+
+    def bin_slab(self, slab):
+        """
+        Compute the bin indices of a slab, and sum up the coordinates
+        and the number of modes in each bin.
+
+        Returns
+        -------
+        binned : tuple or None
+            ``(multi_index, legw, nonsingular)``, the flat bin index of each
+            element of the slab, the Legendre weights :math:`(2\ell+1) L_\ell(\mu)`
+            of the multipoles :math:`\ell > 0` and, if the slab is Hermitian
+            symmetric, the mask of the positive frequencies; ``None`` if
+            the slab is empty
+        """
         # the square of coordinate mesh norm
         # (either Fourier space k or configuraton space x)
         xslab = slab.norm2()
 
         # if empty, do nothing
-        if len(xslab.flat) == 0: continue
+        if len(xslab.flat) == 0: return None
 
         # get the bin indices for x on the slab
-        dig_x = numpy.digitize(xslab.flat, x2edges)
+        dig_x = numpy.digitize(xslab.flat, self.x2edges)
 
         # make xslab just x
         xslab **= 0.5
 
         # get the bin indices for mu on the slab
-        mu = slab.mu(los) # defined with respect to specified LOS
-        dig_mu = numpy.digitize(abs(mu).flat, muedges)
+        mu = slab.mu(self.los) # defined with respect to specified LOS
+        dig_mu = numpy.digitize(abs(mu).flat, self.muedges)
 
         # make the multi-index
-        multi_index = numpy.ravel_multi_index([dig_x, dig_mu], (Nx+2,Nmu+2))
+        multi_index = numpy.ravel_multi_index([dig_x, dig_mu], (self.Nx+2,self.Nmu+2))
 
         # sum up x in each bin (accounting for negative freqs)
         xslab[:] *= slab.hermitian_weights
-        xsum.flat += numpy.bincount(multi_index, weights=xslab.flat, minlength=xsum.size)
+        self.xsum.flat += numpy.bincount(multi_index, weights=xslab.flat, minlength=self.xsum.size)
 
         # count number of modes in each bin (accounting for negative freqs)
         Nslab = numpy.ones_like(xslab) * slab.hermitian_weights
-        Nsum.flat += numpy.bincount(multi_index, weights=Nslab.flat, minlength=Nsum.size)
-
-        # compute multipoles by weighting by Legendre(ell, mu)
-        for iell, ell in enumerate(_poles):
-
-            # weight the input 3D array by the appropriate Legendre polynomial
-            weighted_y3d = legpoly[iell](mu) * y3d[slab.index]
-
-            # add conjugate for this kx, ky, kz, corresponding to
-            # the (-kx, -ky, -kz) --> need to make mu negative for conjugate
-            # Below is identical to the sum of
-            # Leg(ell)(+mu) * y3d[:, nonsingular]    (kx, ky, kz)
-            # Leg(ell)(-mu) * y3d[:, nonsingular].conj()  (-kx, -ky, -kz)
-            # or
-            # weighted_y3d[:, nonsingular] += (-1)**ell * weighted_y3d[:, nonsingular].conj()
-            # but numerically more accurate.
-            if hermitian_symmetric:
-
-                if ell % 2: # odd, real part cancels
-                    weighted_y3d.real[slab.nonsingular] = 0.
-                    weighted_y3d.imag[slab.nonsingular] *= 2.
-                else:  # even, imag part cancels
-                    weighted_y3d.real[slab.nonsingular] *= 2.
-                    weighted_y3d.imag[slab.nonsingular] = 0.
-
-            # sum up the weighted y in each bin
-            weighted_y3d *= (2.*ell + 1.)
-            ysum[iell,...].real.flat += numpy.bincount(multi_index, weights=weighted_y3d.real.flat, minlength=Nsum.size)
-            if numpy.iscomplexobj(ysum):
-                ysum[iell,...].imag.flat += numpy.bincount(multi_index, weights=weighted_y3d.imag.flat, minlength=Nsum.size)
+        self.Nsum.flat += numpy.bincount(multi_index, weights=Nslab.flat, minlength=self.Nsum.size)
 
         # sum up the absolute mag of mu in each bin (accounting for negative freqs)
-        mu[:] *= slab.hermitian_weights
-        musum.flat += numpy.bincount(multi_index, weights=abs(mu).flat, minlength=musum.size)
-
-    # sum binning arrays across all ranks
-    xsum  = comm.allreduce(xsum)
-    musum = comm.allreduce(musum)
-    ysum  = comm.allreduce(ysum)
-    Nsum  = comm.allreduce(Nsum)
-
-    # add the last 'internal' mu bin (mu == 1) to the last visible mu bin
-    # this makes the last visible mu bin inclusive on both ends.
-    ysum[..., -2] += ysum[..., -1]
-    musum[:, -2]  += musum[:, -1]
-    xsum[:, -2]   += xsum[:, -1]
-    Nsum[:, -2]   += Nsum[:, -1]
-
-    # reshape and slice to remove out of bounds points
-    sl = slice(1, -1)
-    with numpy.errstate(invalid='ignore'):
-
-        # 2D binned results
-        y2d       = (ysum[0,...] / Nsum)[sl,sl] # ell=0 is first index
-        xmean_2d  = (xsum / Nsum)[sl,sl]
-        mumean_2d = (musum / Nsum)[sl, sl]
-        N_2d      = Nsum[sl,sl]
-
-        # 1D multipole results (summing over mu (last) axis)
-        if do_poles:
-            N_1d     = Nsum[sl,sl].sum(axis=-1)
-            xmean_1d = xsum[sl,sl].sum(axis=-1) / N_1d
-            poles    = ysum[:, sl,sl].sum(axis=-1) / N_1d
-            poles    = poles[ell_idx,...]
-
-    # return y(x,mu) + (possibly empty) multipoles
-    result = (xmean_2d, mumean_2d, y2d, N_2d)
-    pole_result = (xmean_1d, poles, N_1d) if do_poles else None
-    return result, pole_result
+        self.musum.flat += numpy.bincount(multi_index, weights=(abs(mu) * slab.hermitian_weights).flat, minlength=self.musum.size)
+
+        # the Legendre weights (the monopole weight is 1)
+        ells = [ell for ell in self._poles if ell != 0]
+        legw = numpy.empty((len(ells), mu.size), dtype='f8')
+        for i, (ell, leg) in enumerate(zip(ells, _legendre(mu.ravel(), ells))):
+            numpy.multiply(leg, 2.*ell + 1., out=legw[i])
+
+        nonsingular = None
+        if self.hermitian_symmetric:
+            nonsingular = slab.nonsingular.ravel()
+
+        return multi_index, legw, nonsingular
+
+    def add(self, binned, yslab):
+        """
+        Sum up the values ``yslab`` of the statistic on a slab in each bin,
+        for each multipole.
+
+        The weighted real and imaginary parts of all multipoles are summed
+        up with a single bincount.
+        """
+        multi_index, legw, nonsingular = binned
+        yslab = numpy.ravel(yslab)
+        scratch = self._get_scratch(yslab.size)
+
+        # the stacked bin indices, one row per (component, ell)
+        index = scratch['index']
+        numpy.add(multi_index, self.offsets, out=index)
+
+        # the components of the slab, weighted to account for Hermitian
+        # symmetry; add conjugate for this kx, ky, kz, corresponding to
+        # the (-kx, -ky, -kz) --> need to make mu negative for conjugate
+        # This is identical to the sum of
+        # Leg(ell)(+mu) * y3d[:, nonsingular]    (kx, ky, kz)
+        # Leg(ell)(-mu) * y3d[:, nonsingular].conj()  (-kx, -ky, -kz)
+        # i.e., even multipoles double the real part and cancel the
+        # imaginary part of the positive frequencies, and vice versa for
+        # odd multipoles; but numerically more accurate.
+        components = [yslab.real, yslab.imag][:self.ncomp]
+        if self.hermitian_symmetric:
+            hermitian = scratch['hermitian']
+            doubled = 1. + nonsingular
+            cancelled = ~nonsingular
+            for icomp, y in enumerate(components):
+                numpy.multiply(y, doubled, out=hermitian[0, icomp])
+                numpy.multiply(y, cancelled, out=hermitian[1, icomp])
+
+        # weight the components by the Legendre polynomials
+        weights = scratch['weights']
+        legw = iter(legw)
+        for iell, ell in enumerate(self._poles):
+            leg = 1. if ell == 0 else next(legw)
+            for icomp in range(self.ncomp):
+                if self.hermitian_symmetric:
+                    # even: real part doubled, imag part cancelled; odd: vice versa
+                    y = hermitian[(icomp + ell) % 2, icomp]
+                else:
+                    y = components[icomp]
+                numpy.multiply(y, leg, out=weights[icomp, iell])
+
+        # sum up the weighted y in each bin
+        ysum = numpy.bincount(index.ravel(), weights=weights.ravel(), minlength=index.shape[0]*self.Nsum.size)
+        ysum = ysum.reshape(self.ncomp, len(self._poles), -1)
+        for iell in range(len(self._poles)):
+            self.ysum[iell,...].real.flat += ysum[0, iell]
+            if self.ncomp == 2:
+                self.ysum[iell,...].imag.flat += ysum[1, iell]
+
+    def finalize(self, comm, return_sums=False):
+        """
+        Sum the binning arrays across all ranks and return the binned results.
+
+        Returns
+        -------
+        result, pole_result :
+            see :func:`project_to_basis`
+        sums : tuple, optional
+            if ``return_sums`` is ``True``, see :func:`project_to_basis`
+        """
+        # sum binning arrays across all ranks
+        xsum  = comm.allreduce(self.xsum)
+        musum = comm.allreduce(self.musum)
+        ysum  = comm.allreduce(self.ysum)
+        Nsum  = comm.allreduce(self.Nsum)
+
+        # add the last 'internal' mu bin (mu == 1) to the last visible mu bin
+        # this makes the last visible mu bin inclusive on both ends.
+        ysum[..., -2] += ysum[..., -1]
+        musum[:, -2]  += musum[:, -1]
+        xsum[:, -2]   += xsum[:, -1]
+        Nsum[:, -2]   += Nsum[:, -1]
+
+        # reshape and slice to remove out of bounds points
+        do_poles = len(self.poles) > 0
+        sl = slice(1, -1)
+        with numpy.errstate(invalid='ignore'):
+
+            # 2D binned results
+            y2d       = (ysum[0,...] / Nsum)[sl,sl] # ell=0 is first index
+            xmean_2d  = (xsum / Nsum)[sl,sl]
+            mumean_2d = (musum / Nsum)[sl, sl]
+            N_2d      = Nsum[sl,sl]
+
+            # 1D multipole results (summing over mu (last) axis)
+            if do_poles:
+                N_1d     = Nsum[sl,sl].sum(axis=-1)
+                xmean_1d = xsum[sl,sl].sum(axis=-1) / N_1d
+                poles    = ysum[:, sl,sl].sum(axis=-1) / N_1d
+                poles    = poles[self.ell_idx,...]
+
+        # return y(x,mu) + (possibly empty) multipoles
+        result = (xmean_2d, mumean_2d, y2d, N_2d)
+        pole_result = (xmean_1d, poles, N_1d) if do_poles else None
+        if return_sums:
+            sums = (xsum[sl,sl], musum[sl,sl], ysum[[0] + self.ell_idx][:,sl,sl], Nsum[sl,sl])
+            return result, pole_result, sums
+        return result, pole_result
+
+def _offset_mesh(mesh, offset, los):
+    """
+    Return a copy of the CatalogMesh ``mesh``, painted at the positions
+    offset by the projection of the column ``offset`` on the line-of-sight
+    ``los``.
+    """
+    if not isinstance(mesh, CatalogMesh):
+        raise ValueError("``los_offset`` can only be used with catalog sources")
+
+    mesh = mesh.copy()
+    los = numpy.asarray(los, dtype='f8')
+    mesh['_los_position'] = mesh[mesh.position] + (mesh[offset] * los).sum(axis=1)[:, None] * los
+    mesh.position = '_los_position'
+    return mesh
+
+def _fold_mesh(mesh, F):
+    """
+    Return a CatalogMesh painting the sources of the CatalogMesh ``mesh``
+    at their positions modulo ``BoxSize/F``, in a box of size ``BoxSize/F``.
+    """
+    if not isinstance(mesh, CatalogMesh):
+        raise ValueError("``folds`` can only be used with catalog sources")
+
+    BoxSize = mesh.attrs['BoxSize'] / F
+    source = mesh.base.copy()
+    source['_fold_position'] = source[mesh.position] % BoxSize
+
+    return source.to_mesh(Nmesh=mesh.attrs['Nmesh'], BoxSize=BoxSize, dtype=mesh.dtype,
+                          interlaced=mesh.interlaced, compensated=mesh.compensated,
+                          window=mesh.window, weight=mesh.weight, value=mesh.value,
+                          selection=mesh.selection, position='_fold_position')
+
+def _average_los(power, poles):
+    """
+    Average the structured arrays ``power`` and ``poles`` measured for
+    several lines-of-sight.
+    """
+    def average(data):
+        toret = numpy.empty_like(data[0])
+        for name in toret.dtype.names:
+            toret[name] = numpy.mean([d[name] for d in data], axis=0)
+        return toret
+
+    if poles[0] is None:
+        return average(power), None
+    return average(power), average(poles)
+
+def _exchange(data, dest, comm):
+    """
+    Send the elements of the array ``data`` to the ranks ``dest``,
+    returning the elements received on this rank.
+    """
+    from mpi4py import MPI
+
+    data = numpy.ascontiguousarray(data[dest.argsort(kind='mergesort')])
+    sendcounts = numpy.bincount(dest, minlength=comm.size)
+    recvcounts = numpy.array(comm.alltoall(sendcounts.tolist()), dtype='i8')
+
+    recv = numpy.empty(recvcounts.sum(), dtype=data.dtype)
+
+    # the counts and displacements in bytes
+    itemsize = data.dtype.itemsize
+    sendcounts, recvcounts = sendcounts * itemsize, recvcounts * itemsize
+    senddispls = numpy.concatenate([[0], sendcounts.cumsum()[:-1]])
+    recvdispls = numpy.concatenate([[0], recvcounts.cumsum()[:-1]])
+
+    comm.Alltoallv([data.view('u1'), sendcounts, senddispls, MPI.BYTE],
+                   [recv.view('u1'), recvcounts, recvdispls, MPI.BYTE])
+    return recv
+
+def _apply_slab_actions(actions, k, w, value):
+    """
+    Apply the Fourier-space filters in ``actions`` to the ``value`` of a
+    complex field on a slab, with wavenumbers ``k`` and circular
+    frequencies ``w``.
+    """
+    for action in actions:
+        coords = w if action[2] == 'circular' else k
+        value = action[1](coords, value)
+    return value
 
 def _cast_source(source, BoxSize, Nmesh):
     """
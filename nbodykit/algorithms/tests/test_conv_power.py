@@ -11,17 +11,17 @@ setup_logging("debug")
 NDATA = 1000
 NBAR = 1e-4
 
-def make_sources(cosmo):
+def make_sources(cosmo, ra=(110, 260), seeds=(42, 84)):
 
-    data = RandomCatalog(NDATA, seed=42)
-    randoms = RandomCatalog(NDATA*10, seed=84)
+    data = RandomCatalog(NDATA, seed=seeds[0])
+    randoms = RandomCatalog(NDATA*10, seed=seeds[1])
 
     # add the random columns
     for s in [data, randoms]:
 
         # ra, dec, z
         s['z']   = s.rng.normal(loc=0.5, scale=0.1, size=s.size)
-        s['ra']  = s.rng.uniform(low=110, high=260, size=s.size)
+        s['ra']  = s.rng.uniform(low=ra[0], high=ra[1], size=s.size)
         s['dec'] = s.rng.uniform(low=-3.6, high=60., size=s.size)
 
         # position
@@ -292,6 +292,218 @@ def test_run(comm):
     assert_allclose(S, r.attrs['shotnoise'])
 
 
+@MPITest([1, 4])
+def test_low_memory(comm):
+
+    CurrentMPIComm.set(comm)
+    cosmo = cosmology.Planck15
+
+    # make the sources
+    data, randoms = make_sources(cosmo)
+    for s in [data, randoms]:
+        s['NZ'] = NBAR
+        s['FKPWeight2'] = 1.0 / (1 + 2e4*s['NZ'])
+
+    # auto and cross power of the same FKP source
+    fkp = FKPCatalog(data, randoms)
+    mesh1 = fkp.to_mesh(Nmesh=64, dtype='f8', nbar='NZ')
+    mesh2 = fkp.to_mesh(Nmesh=64, dtype='f8', nbar='NZ', fkp_weight='FKPWeight2')
+
+    for second in [None, mesh2]:
+        r1 = ConvolvedFFTPower(mesh1, second=second, poles=[0,2,4], dk=0.005)
+        r2 = ConvolvedFFTPower(mesh1, second=second, poles=[0,2,4], dk=0.005, low_memory=True)
+
+        # same results without the coordinate grids
+        for ell in [0, 2, 4]:
+            assert_allclose(r1.poles['power_%d' %ell], r2.poles['power_%d' %ell], rtol=1e-6, atol=1e-8)
+
+@MPITest([1, 4])
+def test_checkpoint(comm):
+
+    import tempfile
+    import json
+    import os
+    from nbodykit.utils import JSONEncoder, JSONDecoder
+    CurrentMPIComm.set(comm)
+    cosmo = cosmology.Planck15
+
+    # make the sources
+    data, randoms = make_sources(cosmo)
+    for s in [data, randoms]:
+        s['NZ'] = NBAR
+
+    fkp = FKPCatalog(data, randoms)
+    mesh = fkp.to_mesh(Nmesh=32, dtype='f8', nbar='NZ')
+
+    checkpoint_dir = comm.bcast(tempfile.mkdtemp() if comm.rank == 0 else None)
+    r1 = ConvolvedFFTPower(mesh, poles=[0,2,4], dk=0.005)
+    r2 = ConvolvedFFTPower(mesh, poles=[0,2,4], dk=0.005, checkpoint_dir=checkpoint_dir)
+
+    # pretend the run stopped after 8 terms of the hexadecapole
+    if comm.rank == 0:
+        filename = os.path.join(checkpoint_dir, 'progress.json')
+        with open(filename, 'r') as ff:
+            progress = json.load(ff, cls=JSONDecoder)
+        assert progress['done'] == [2, 4]
+        progress.update(done=[2], ell=4, terms=8, Aell='Aell-0')
+        with open(filename, 'w') as ff:
+            json.dump(progress, ff, cls=JSONEncoder)
+    comm.barrier()
+
+    # resume from the checkpoint
+    r3 = ConvolvedFFTPower(mesh, poles=[0,2,4], dk=0.005, checkpoint_dir=checkpoint_dir)
+
+    # ignore the checkpoint for different inputs
+    r4 = ConvolvedFFTPower(mesh, poles=[0,2], dk=0.01, checkpoint_dir=checkpoint_dir)
+    r5 = ConvolvedFFTPower(mesh, poles=[0,2], dk=0.01)
+
+    for ell in [0, 2, 4]:
+        name = 'power_%d' %ell
+        assert_allclose(r1.poles[name], r2.poles[name], rtol=1e-6, atol=1e-8)
+        assert_allclose(r1.poles[name], r3.poles[name], rtol=1e-6, atol=1e-8)
+    assert_array_equal(r1.poles['modes'], r3.poles['modes'])
+    for ell in [0, 2]:
+        name = 'power_%d' %ell
+        assert_allclose(r4.poles[name], r5.poles[name], rtol=1e-6, atol=1e-8)
+
+    # ignore the checkpoint for different positions, with the same numbers of objects
+    r6 = ConvolvedFFTPower(mesh, poles=[0,2], dk=0.01, checkpoint_dir=checkpoint_dir)
+    data['Position'] = data['Position'] * 1.01
+    mesh = FKPCatalog(data, randoms).to_mesh(Nmesh=32, dtype='f8', nbar='NZ')
+    r7 = ConvolvedFFTPower(mesh, poles=[0,2], dk=0.01, checkpoint_dir=checkpoint_dir)
+    r8 = ConvolvedFFTPower(mesh, poles=[0,2], dk=0.01)
+    assert r7.attrs['data.N'] == r6.attrs['data.N']
+    for ell in [0, 2]:
+        name = 'power_%d' %ell
+        assert_allclose(r7.poles[name], r8.poles[name], rtol=1e-6, atol=1e-8)
+        assert not numpy.allclose(r7.poles[name], r6.poles[name], rtol=1e-6, atol=1e-8)
+
+@MPITest([1, 4])
+def test_matrix(comm):
+
+    import tempfile
+    CurrentMPIComm.set(comm)
+    cosmo = cosmology.Planck15
+
+    # make the sources
+    data, randoms = make_sources(cosmo)
+    for s in [data, randoms]:
+        s['NZ'] = NBAR
+        s['FKPWeight2'] = 1.0 / (1 + 2e4*s['NZ'])
+
+    # two FKP sources with the same catalogs; two weights for the first one
+    fkp1 = FKPCatalog(data, randoms)
+    fkp2 = FKPCatalog(data, randoms)
+    mesh1 = fkp1.to_mesh(Nmesh=64, dtype='f8', nbar='NZ')
+    mesh2 = fkp2.to_mesh(Nmesh=64, dtype='f8', nbar='NZ')
+    mesh3 = fkp1.to_mesh(Nmesh=64, dtype='f8', nbar='NZ', fkp_weight='FKPWeight2')
+
+    r = ConvolvedFFTPowerMatrix([mesh1, mesh2, mesh3], poles=[0,2,4], dk=0.005)
+    assert r.pairs == [(0, 0), (0, 1), (0, 2), (1, 1), (1, 2), (2, 2)]
+
+    # auto and cross power of the same FKP source, as in ConvolvedFFTPower
+    r00 = ConvolvedFFTPower(mesh1, poles=[0,2,4], dk=0.005)
+    r02 = ConvolvedFFTPower(mesh1, second=mesh3, poles=[0,2,4], dk=0.005)
+    for ell in [0, 2, 4]:
+        assert_allclose(r.poles['power_0_0_%d' %ell], r00.poles['power_%d' %ell], rtol=1e-6, atol=1e-8)
+        assert_allclose(r.poles['power_0_2_%d' %ell], r02.poles['power_%d' %ell], rtol=1e-6, atol=1e-8)
+    assert_allclose(r.attrs['shotnoise_0_0'], r00.attrs['shotnoise'])
+    assert_allclose(r.attrs['shotnoise_0_2'], r02.attrs['shotnoise'])
+
+    # different FKP sources: geometric mean of the normalizations, no shot noise
+    assert_allclose(r.attrs['norm_0_1'], r.attrs['norm_0_0'])
+    assert r.attrs['shotnoise_0_1'] == 0.
+    for ell in [0, 2, 4]:
+        assert_allclose(r.poles['power_0_1_%d' %ell], r.poles['power_0_0_%d' %ell], rtol=1e-6, atol=1e-8)
+
+    # same results when spilling the fields to disk
+    r2 = ConvolvedFFTPowerMatrix([mesh1, mesh2, mesh3], poles=[0,2,4], dk=0.005, spill_dir=tempfile.mkdtemp())
+    for (i, j) in r.pairs:
+        for ell in [0, 2, 4]:
+            name = 'power_%d_%d_%d' %(i, j, ell)
+            assert_allclose(r.poles[name], r2.poles[name], rtol=1e-6, atol=1e-8)
+
+@MPITest([1, 4])
+def test_matrix_footprints(comm):
+
+    CurrentMPIComm.set(comm)
+    cosmo = cosmology.Planck15
+
+    # two tracers with different footprints
+    fkps = []
+    for ra, seeds in [((110, 200), (42, 84)), ((180, 300), (43, 85))]:
+        data, randoms = make_sources(cosmo, ra=ra, seeds=seeds)
+        for s in [data, randoms]:
+            s['NZ'] = NBAR
+        fkps.append(FKPCatalog(data, randoms))
+    meshes = [fkp.to_mesh(Nmesh=32, dtype='f8', nbar='NZ') for fkp in fkps]
+
+    lo = numpy.min([m.attrs['BoxCenter'] - 0.5*m.attrs['BoxSize'] for m in meshes], axis=0)
+    hi = numpy.max([m.attrs['BoxCenter'] + 0.5*m.attrs['BoxSize'] for m in meshes], axis=0)
+
+    r = ConvolvedFFTPowerMatrix(meshes, poles=[0,2], dk=0.01)
+
+    # the joint box is the union of the boxes, and holds all objects
+    assert_allclose(r.attrs['BoxSize'], hi - lo)
+    assert_allclose(r.attrs['BoxCenter'], 0.5 * (lo + hi))
+    for mesh in meshes:
+        assert_allclose(mesh.pm.BoxSize, hi - lo)
+        assert_allclose(mesh.attrs['BoxCenter'], 0.5 * (lo + hi))
+        for name in ['data', 'randoms']:
+            pos = mesh.compute(mesh[name]['Position'])
+            assert (pos >= lo).all() and (pos <= hi).all()
+
+    # the auto power of the second tracer, painted in the joint box
+    mesh = fkps[1].to_mesh(Nmesh=32, dtype='f8', nbar='NZ', BoxSize=hi - lo)
+    mesh.recenter_box(hi - lo, 0.5 * (lo + hi))
+    r1 = ConvolvedFFTPower(mesh, poles=[0,2], dk=0.01)
+    for ell in [0, 2]:
+        assert_allclose(r.poles['power_1_1_%d' %ell], r1.poles['power_%d' %ell], rtol=1e-6, atol=1e-8)
+
+    # different catalogs: no shot noise
+    assert r.attrs['shotnoise_0_1'] == 0.
+
+@MPITest([1, 4])
+def test_window_multipoles(comm):
+
+    CurrentMPIComm.set(comm)
+    cosmo = cosmology.Planck15
+
+    # make the sources
+    data, randoms = make_sources(cosmo)
+    for s in [data, randoms]:
+        s['NZ'] = NBAR
+
+    fkp = FKPCatalog(data, randoms)
+    mesh = fkp.to_mesh(Nmesh=32, dtype='f8', nbar='NZ')
+    BoxSize = mesh.attrs['BoxSize']
+    edges = numpy.linspace(0, BoxSize.min(), 11)
+
+    # boxes must be larger than the survey
+    with pytest.raises(ValueError):
+        r = FFTWindowMultipoles(mesh, poles=[0,2,4], edges=edges, BoxSizes=[0.5*BoxSize])
+
+    # and large enough to cover all separations
+    with pytest.raises(ValueError):
+        r = FFTWindowMultipoles(mesh, poles=[0,2,4], edges=edges, BoxSizes=[1.5*BoxSize])
+
+    r1 = FFTWindowMultipoles(mesh, poles=[0,2,4], edges=edges, BoxSizes=[1.25*BoxSize, 2*BoxSize])
+    r2 = FFTWindowMultipoles(mesh, poles=[0,2,4], edges=edges)
+
+    assert_allclose(r1.attrs['smax'], [0.25*BoxSize.min(), BoxSize.min()])
+    assert r1.poles.shape == (len(edges)-1,)
+    assert (r1.poles['modes'] > 0).all()
+
+    # the large separations are measured in the largest box in both cases
+    large = edges[:-1] >= r1.attrs['smax'][0]
+    for ell in [0, 2, 4]:
+        name = 'corr_%d' %ell
+        assert_allclose(r1.poles[name][large], r2.poles[name][large], rtol=1e-6, atol=1e-12)
+
+    # the monopole is positive and decreasing at large separations
+    assert r1.poles['corr_0'][0] > 0
+    assert r1.poles['corr_0'][-1] < r1.poles['corr_0'][0]
+
 @MPITest([1, 4])
 def test_with_zhist(comm):
 
@@ -326,3 +538,22 @@ def test_with_zhist(comm):
 
     assert_allclose(r.attrs['data.norm'], 0.000388338522187, rtol=1e-5)
     assert_allclose(r.attrs['randoms.norm'], 0.000395808747269, rtol=1e-5)
+
+def test_real_ylm_grid():
+
+    from nbodykit.algorithms.convpower import get_real_Ylm, _RealYlmGrid
+
+    # random unit vectors
+    rng = numpy.random.RandomState(42)
+    xyz = rng.normal(size=(3, 8, 16))
+    xyz /= numpy.sqrt((xyz**2).sum(axis=0))
+
+    Ylm = _RealYlmGrid([1, 2, 3, 4])
+    for ell in [1, 2, 3, 4]:
+        for l, m in Ylm.harmonics(ell):
+
+            # same as the sympy harmonics
+            assert_allclose(Ylm(l, m, *xyz), get_real_Ylm(l, m)(*xyz), rtol=1e-10, atol=1e-12)
+
+            # vanishes at k = 0
+            assert_array_equal(Ylm(l, m, 0., 0., numpy.zeros(4)), 0.)
@@ -156,3 +156,305 @@ def test_projectedpower(comm):
     # FIXME: why a factor of 2?
     assert_allclose(rp1.power['power'][1:].mean() * source.attrs['BoxSize'][0] ** 2, rf.power['power'][1:].mean(), rtol=2 * (Nmesh / 2)**-0.5)
     assert_allclose(rp2.power['power'][1:].mean() * source.attrs['BoxSize'][0], rf.power['power'][1:].mean(), rtol=2 * (Nmesh ** 2 / 2)**-0.5)
+
+@MPITest([1, 4])
+def test_fftpower_fused(comm):
+
+    from nbodykit import set_options
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-4, BoxSize=512., seed=42)
+    source['Weight'] = source.rng.uniform(size=source.size)
+
+    mesh1 = source.to_mesh(window='tsc', Nmesh=32, interlaced=True, compensated=True)
+    mesh2 = source.to_mesh(window='cic', Nmesh=32, compensated=True)
+
+    for second in [None, mesh2]:
+        r1 = FFTPower(mesh1, second=second, mode='2d', Nmu=4, poles=[0,1,2,4])
+        assert r1._can_fuse()
+
+        # the field cache disables the fused binning
+        with set_options(paint_cache_size=1e9):
+            r2 = FFTPower(mesh1, second=second, mode='2d', Nmu=4, poles=[0,1,2,4])
+            assert not r2._can_fuse()
+        mesh1.clear_field_cache()
+
+        for name in ['k', 'mu', 'power', 'modes']:
+            assert_allclose(r1.power[name], r2.power[name], rtol=1e-6, atol=1e-4)
+        for name in r1.poles.variables:
+            assert_allclose(r1.poles[name], r2.poles[name], rtol=1e-6, atol=1e-4)
+        assert r1.attrs['shotnoise'] == r2.attrs['shotnoise']
+
+@MPITest([1, 4])
+def test_projection_plan(comm):
+
+    from nbodykit import set_options
+    from nbodykit.algorithms.fftpower import ProjectionPlan, project_to_basis
+    import tempfile
+    import os
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-4, BoxSize=512., seed=42)
+    mesh = source.to_mesh(window='cic', Nmesh=32, compensated=True)
+
+    r1 = FFTPower(mesh, mode='2d', Nmu=4, poles=[0,1,2,4])
+
+    # the cached plan is re-used for the second measurement
+    with set_options(projection_plan_cache_size=2):
+        r2 = FFTPower(mesh, mode='2d', Nmu=4, poles=[0,1,2,4])
+        r3 = FFTCorr(mesh, mode='2d', Nmu=4, poles=[0,2])
+        r2 = FFTPower(mesh, mode='2d', Nmu=4, poles=[0,1,2,4])
+    r4 = FFTCorr(mesh, mode='2d', Nmu=4, poles=[0,2])
+
+    for name in ['k', 'mu', 'power', 'modes']:
+        assert_allclose(r1.power[name], r2.power[name], rtol=1e-6, atol=1e-4)
+    for name in r1.poles.variables:
+        assert_allclose(r1.poles[name], r2.poles[name], rtol=1e-6, atol=1e-4)
+    for name in r3.poles.variables:
+        assert_allclose(r3.poles[name], r4.poles[name], rtol=1e-6, atol=1e-8)
+
+    # a plan saved to and loaded from disk
+    y3d = mesh.paint(mode='complex')
+    edges = [r1.power.edges['k'], r1.power.edges['mu']]
+    plan = ProjectionPlan(y3d, edges, poles=[0,2])
+
+    tmpdir = comm.bcast(tempfile.mkdtemp() if comm.rank == 0 else None)
+    plan.save(os.path.join(tmpdir, 'plan'))
+    plan = ProjectionPlan.load(os.path.join(tmpdir, 'plan'))
+
+    result, pole_result = plan.project(y3d)
+    result2, pole_result2 = project_to_basis(y3d, edges, poles=[0,2])
+    for x1, x2 in zip(result + pole_result, result2 + pole_result2):
+        assert_allclose(x1, x2, rtol=1e-6)
+
+    # the plan is specific to the binning
+    with pytest.raises(ValueError):
+        project_to_basis(y3d, edges, poles=[0,4], plan=plan)
+
+def test_legendre():
+
+    from nbodykit.algorithms.fftpower import _legendre
+    from scipy.special import legendre
+
+    mu = numpy.linspace(-1, 1, 101)
+    ells = [4, 1, 2, 7]
+    for ell, leg in zip(ells, _legendre(mu, ells)):
+        assert_allclose(leg, legendre(ell)(mu), rtol=1e-10, atol=1e-12)
+
+@MPITest([1, 4])
+def test_fftpower_matrix(comm):
+
+    import tempfile
+    CurrentMPIComm.set(comm)
+    sources = [UniformCatalog(nbar=3e-4, BoxSize=512., seed=seed) for seed in [42, 84, 21]]
+    meshes = [source.to_mesh(window='cic', Nmesh=32, compensated=True) for source in sources]
+
+    spill_dir = comm.bcast(tempfile.mkdtemp() if comm.rank == 0 else None)
+    for kws in [{}, {'spill_dir':spill_dir}]:
+        r = FFTPowerMatrix(meshes, mode='2d', Nmu=4, poles=[0,2], **kws)
+
+        for i, j in r.pairs:
+            second = None if i == j else meshes[j]
+            r2 = FFTPower(meshes[i], second=second, mode='2d', Nmu=4, poles=[0,2])
+
+            assert_allclose(r.power['power_%d_%d' % (i, j)], r2.power['power'], rtol=1e-6, atol=1e-4)
+            for ell in [0, 2]:
+                assert_allclose(r.poles['power_%d_%d_%d' % (i, j, ell)], r2.poles['power_%d' % ell], rtol=1e-6, atol=1e-4)
+            assert r.attrs['shotnoise_%d_%d' % (i, j)] == r2.attrs['shotnoise']
+
+        assert_array_equal(r.power['modes'], r2.power['modes'])
+        assert_array_equal(r.poles['k'], r2.poles['k'])
+
+@MPITest([1, 4])
+def test_fftpower_los(comm):
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-4, BoxSize=512., seed=42)
+    source['VelocityOffset'] = source.rng.uniform(-10., 10., size=(source.size, 3))
+
+    los = [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+
+    # the same field projected along each line-of-sight
+    r = FFTPower(source, mode='2d', Nmesh=32, Nmu=4, poles=[0,2], los=los)
+    for l, power, poles in zip(los, r.los_power, r.los_poles):
+        r1 = FFTPower(source, mode='2d', Nmesh=32, Nmu=4, poles=[0,2], los=l)
+        assert_allclose(power['power'], r1.power['power'], rtol=1e-6, atol=1e-4)
+        assert_allclose(poles['power_2'], r1.poles['power_2'], rtol=1e-6, atol=1e-4)
+
+    # the sources are offset along each line-of-sight, including off-axis ones
+    los = los + [[0.6, 0.8, 0.]]
+    r = FFTPower(source, mode='2d', Nmesh=32, Nmu=4, poles=[0,2], los=los, los_offset='VelocityOffset', keep_y3d=True)
+    assert r.y3d is None
+    for l, power, poles in zip(los, r.los_power, r.los_poles):
+        l = numpy.array(l)
+        offset = numpy.einsum('ij,j->i', source.compute(source['VelocityOffset']), l)
+        source['RSDPosition'] = source['Position'] + offset[:, None] * l
+        mesh = source.to_mesh(Nmesh=32, dtype='f8', position='RSDPosition', compensated=True)
+        r1 = FFTPower(mesh, mode='2d', Nmu=4, poles=[0,2], los=l)
+        assert_allclose(power['power'], r1.power['power'], rtol=1e-6, atol=1e-4)
+        assert_allclose(poles['power_2'], r1.poles['power_2'], rtol=1e-6, atol=1e-4)
+
+    # the average over the lines-of-sight
+    power = numpy.mean([p['power'] for p in r.los_power], axis=0)
+    assert_allclose(r.power['power'], power)
+    assert '_los_position' not in source
+
+    # a single line-of-sight is offset too
+    r = FFTPower(source, mode='2d', Nmesh=32, Nmu=4, poles=[0,2], los_offset='VelocityOffset')
+    offset = source.compute(source['VelocityOffset'])[:, 2]
+    source['RSDPosition'] = source['Position'] + offset[:, None] * [0, 0, 1]
+    mesh = source.to_mesh(Nmesh=32, dtype='f8', position='RSDPosition', compensated=True)
+    r1 = FFTPower(mesh, mode='2d', Nmu=4, poles=[0,2])
+    assert_allclose(r.power['power'], r1.power['power'], rtol=1e-6, atol=1e-4)
+    assert_allclose(r.poles['power_2'], r1.poles['power_2'], rtol=1e-6, atol=1e-4)
+
+    # offsets cannot be folded
+    with pytest.raises(ValueError):
+        FFTPower(source, mode='1d', Nmesh=32, los_offset='VelocityOffset', folds=[2])
+
+@MPITest([1, 4])
+def test_fftpower_folds(comm):
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-3, BoxSize=512., seed=42)
+    mesh = source.to_mesh(window='tsc', Nmesh=32, interlaced=True, compensated=True)
+
+    r = FFTPower(mesh, mode='1d', poles=[0], folds=[2, 4])
+    r1 = FFTPower(mesh, mode='1d', poles=[0])
+
+    # the unfolded measurement is used up to half the Nyquist frequency
+    knyq = numpy.pi * 32 / 512.
+    n = (r1.power.edges['k'][1:] <= 0.5 * knyq).sum()
+    assert_allclose(r.power['power'][:n], r1.power['power'][:n])
+    assert_allclose(r.poles['power_0'][:n], r1.poles['power_0'][:n])
+
+    # the folded measurements extend to the Nyquist frequency of the last fold
+    assert r.power.edges['k'][-1] > 3 * knyq
+    assert numpy.all(numpy.diff(r.power.edges['k']) > 0)
+
+    # the power of a uniform catalog is the shot noise
+    Pk = r.power['power'].real[n:]
+    assert_allclose(Pk.mean(), r.attrs['shotnoise'], rtol=0.1)
+
+@MPITest([1, 4])
+def test_subvolume_power(comm):
+
+    from nbodykit import set_options
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-3, BoxSize=512., seed=42)
+
+    r = SubvolumeFFTPower(source, Nsub=2, Nmesh=16, mode='2d', Nmu=4, poles=[0,2], jackknife=True)
+    assert r.power.shape[0] == 8
+    assert r.poles.shape[0] == 8
+
+    # the first subvolume is the octant at the origin
+    sub = source[(source['Position'] < 256.).all(axis=1)]
+    mesh = sub.to_mesh(BoxSize=256., Nmesh=16, dtype='f8', compensated=True)
+    r1 = FFTPower(mesh, mode='2d', Nmu=4, poles=[0,2])
+
+    assert_allclose(r.power['power'][0], r1.power['power'], rtol=1e-5, atol=1e-3)
+    assert_allclose(r.poles['power_2'][0], r1.poles['power_2'], rtol=1e-5, atol=1e-3)
+    assert_allclose(r.attrs['shotnoise'][0], r1.attrs['shotnoise'])
+    assert r.attrs['N'].sum() == source.csize
+
+    # the jackknife realizations are the power of the stacked fields of the
+    # other subvolumes, i.e. their power weighted by the square of their weight
+    power, poles = r.jackknife
+    P0, W2 = r.poles['power_0'], r.attrs['N'][:, None]**2
+    P0 = (numpy.delete(W2 * P0, 3, axis=0).sum(axis=0) / numpy.delete(W2, 3, axis=0).sum(axis=0))
+    assert_allclose(poles['power_0'][3], P0, rtol=1e-5, atol=1e-3)
+
+    # the objects are read by chunks, and their values are painted;
+    # the field is normalized by the weights, so its power is scaled by 2^2
+    source['Value'] = 2.
+    with set_options(paint_chunk_size=10000):
+        r2 = SubvolumeFFTPower(source, Nsub=2, Nmesh=16, mode='2d', Nmu=4, poles=[0,2])
+    assert_allclose(r2.power['power'], 4 * r.power['power'], rtol=1e-5, atol=1e-3)
+    assert_array_equal(r2.attrs['N'], r.attrs['N'])
+
+@MPITest([1, 4])
+def test_projectedpower_deposit(comm):
+
+    from nbodykit import set_options
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-3, BoxSize=512., seed=42)
+    source['Weight'] = source.rng.uniform(size=source.size)
+
+    for window, interlaced in [('tsc', False), ('tsc', True), ('cic', True)]:
+        mesh = source.to_mesh(window=window, Nmesh=32, dtype='f8', interlaced=interlaced, compensated=True)
+
+        # a configuration-space action requires the full 3D field
+        mesh3d = mesh.apply(lambda x, v: v, kind='relative', mode='real')
+
+        for axes in [[1], [0, 2]]:
+            # the objects are painted by chunks
+            with set_options(paint_chunk_size=10000):
+                r1 = ProjectedFFTPower(mesh, axes=axes)
+            assert r1._can_deposit(r1.first)
+            r2 = ProjectedFFTPower(mesh3d, axes=axes)
+            assert not r2._can_deposit(r2.first)
+
+            assert_allclose(r1.power['power'], r2.power['power'], rtol=1e-6, atol=1e-8)
+            assert_array_equal(r1.power['modes'], r2.power['modes'])
+
+@MPITest([1, 4])
+def test_fftpower_to_corr(comm):
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-3, BoxSize=512., seed=42)
+
+    r = FFTPower(source, mode='2d', Nmesh=32, Nmu=4, poles=[0,2], keep_y3d=True)
+    r1 = FFTPower(source, mode='2d', Nmesh=32, Nmu=4, poles=[0,2])
+    assert r.y3d is not None and r1.y3d is None
+    assert_allclose(r.power['power'], r1.power['power'], rtol=1e-6, atol=1e-4)
+
+    c = r.to_corr()
+    c1 = FFTCorr(source, mode='2d', Nmesh=32, Nmu=4, poles=[0,2])
+    assert_allclose(c.corr['corr'], c1.corr['corr'], rtol=1e-6, atol=1e-10)
+    assert_allclose(c.poles['corr_2'], c1.poles['corr_2'], rtol=1e-6, atol=1e-10)
+    assert c.attrs['shotnoise'] == c1.attrs['shotnoise']
+
+    # the 3D power is left untouched
+    c = r.to_corr(mode='1d')
+    assert_allclose(c.corr['corr'], FFTCorr(source, mode='1d', Nmesh=32).corr['corr'], rtol=1e-6, atol=1e-10)
+
+    with pytest.raises(ValueError):
+        r1.to_corr()
+
+    # the 3D power must be on the box of the sources
+    with pytest.raises(ValueError):
+        FFTCorr(source, mode='1d', Nmesh=32, BoxSize=1024., y3d=r.y3d)
+
+@MPITest([1, 4])
+def test_fftpower_rebin(comm):
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-3, BoxSize=512., seed=42)
+    mesh = source.to_mesh(window='cic', Nmesh=32, compensated=True)
+
+    # no mode lies on the edges of the bins
+    kf = 2 * numpy.pi / 512.
+    r = FFTPower(mesh, mode='2d', Nmu=12, dk=kf/2, kmin=kf/4, poles=[0,2,4], keep_sums=True)
+    assert_array_equal(r.sums['modes'], r.power['modes'])
+
+    # the coarser binning is exact
+    for mode, dk, Nmu in [('2d', 1.5 * kf, 4), ('1d', kf, None), ('2d', None, 2)]:
+        r1 = r.rebin(dk=dk, Nmu=Nmu, mode=mode)
+        r2 = FFTPower(mesh, mode=mode, Nmu=Nmu or 12, dk=dk or kf/2, kmin=kf/4, poles=[0,2,4])
+        n = r1.power.shape[0]
+
+        assert_allclose(r1.power.edges['k'], r2.power.edges['k'][:n+1])
+        assert_array_equal(r1.power['modes'], r2.power['modes'][:n])
+        for name in ['k', 'power']:
+            assert_allclose(r1.power[name], r2.power[name][:n], rtol=1e-6, atol=1e-4)
+        for name in r1.poles.variables:
+            assert_allclose(r1.poles[name], r2.poles[name][:n], rtol=1e-6, atol=1e-4)
+
+    # the sums are saved with the result
+    r.save('fftpower-sums-test.json')
+    r2 = FFTPower.load('fftpower-sums-test.json')
+    assert_array_equal(r.sums['power_2'], r2.sums['power_2'])
+
+    with pytest.raises(ValueError):
+        r.rebin(Nmu=5)
+    with pytest.raises(ValueError):
+        FFTPower(mesh, mode='1d').rebin(dk=2 * kf)
@@ -559,6 +559,44 @@ class CatalogSourceBase(object):
         if len(toret) == 1: toret = toret[0]
         return toret
 
+    def compute_selected(self, columns, selection, start=0):
+        """
+        Compute the requested columns over the local rows
+        ``start`` to ``start + len(selection)``, returning only the rows
+        where ``selection`` is ``True``.
+
+        Subclasses reading data from disk may override this function to
+        avoid reading the rows that are not selected.
+
+        .. note::
+            If the :attr:`base` attribute is set, ``compute_selected()``
+            will called using :attr:`base` instead of ``self``.
+
+        Parameters
+        ----------
+        columns : list of str
+            the names of the requested columns
+        selection : array_like
+            a boolean numpy array specifying which rows to return
+        start : int, optional
+            the local row index corresponding to the first element of
+            ``selection``
+
+        Returns
+        -------
+        list of :class:`numpy.ndarray` :
+            the list of the selected column data
+        """
+        # return the base compute_selected if it exists
+        if self.base is not None:
+            return self.base.compute_selected(columns, selection, start=start)
+
+        stop = start + len(selection)
+        data = self.compute(*[col[start:stop] for col in self.read(columns)])
+        if len(columns) == 1: data = [data]
+
+        return [d[selection] for d in data]
+
     def save(self, output, columns, datasets=None, header='Header'):
         """
         Save the CatalogSource to a :class:`bigfile.BigFile`.
@@ -4,11 +4,206 @@ from nbodykit import _global_options
 import numpy
 import logging
 import warnings
+from collections import OrderedDict
 
 # for converting from particle to mesh
 from pmesh import window
 from pmesh.pm import RealField, ComplexField
 
+# the number of particles per block painted by each thread; this is fixed,
+# such that threaded painting does not depend on the number of threads
+_PAINT_BLOCK_SIZE = 1024 * 256
+
+def _threaded_paint(pm, position, mass, resampler, out, transform=None, nthreads=None):
+    """
+    Paint particles to ``out``, adding to the existing values.
+
+    If ``nthreads`` is ``None``, this simply calls :func:`pmesh.pm.ParticleMesh.paint`.
+    Otherwise, particles are sorted by the x-slab of their mesh cell and split
+    in blocks of ``_PAINT_BLOCK_SIZE``, which are painted by a pool of
+    ``nthreads`` threads. Each block is painted to a private buffer, which only
+    spans the x-slabs touched by the block (plus the window support), and the
+    buffers are added to ``out`` in block order. The result is thus
+    bit-reproducible for any integer ``nthreads``; it differs from the
+    ``nthreads=None`` result by round-off only, since particles are summed
+    in a different order.
+
+    Parameters
+    ----------
+    pm : ParticleMesh
+        the particle mesh
+    position : array_like
+        the (exchanged) positions of the particles
+    mass : array_like
+        the mass of each particle
+    resampler : pmesh.window.ResampleWindow
+        the paint window
+    out : RealField
+        the field to paint to
+    transform : Affine, optional
+        the transformation from position to mesh units
+    nthreads : int, optional
+        the number of threads
+    """
+    if nthreads is None:
+        return pm.paint(position, mass=mass, resampler=resampler,
+                        transform=transform, hold=True, out=out)
+
+    from multiprocessing.pool import ThreadPool
+
+    if not len(position):
+        return out
+
+    if transform is None:
+        transform = pm.affine
+    resampler = window.FindResampler(resampler)
+
+    # the local x-slab of the cell of each particle, wrapped to the periodic mesh
+    period = transform.period[0]
+    slab = numpy.floor(position[:, 0] * transform.scale[0] + transform.translate[0]).astype('intp')
+    if period > 0:
+        slab %= period
+
+    # sort by slab, such that each block only touches a few slabs
+    order = numpy.argsort(slab, kind='mergesort')
+    slab = slab[order]
+    position = position[order]
+    mass = numpy.broadcast_to(mass, len(order))[order]
+
+    nx = out.value.shape[0]
+    starts = list(range(0, len(position), _PAINT_BLOCK_SIZE))
+
+    def paint_block(start):
+        s = slice(start, start + _PAINT_BLOCK_SIZE)
+
+        # the x-slabs touched by this block, padded by the window support
+        x0 = slab[s][0] - resampler.support
+        width = slab[s][-1] + resampler.support + 1 - x0
+        if period > 0:
+            width = min(width, period)
+
+        # paint to a buffer starting at slab x0
+        buf = numpy.zeros((width,) + out.value.shape[1:], dtype=out.value.dtype)
+        shift = numpy.zeros(len(transform.translate))
+        shift[0] = -x0
+        resampler.paint(buf, position[s], mass=mass[s], transform=transform.shift(shift))
+
+        # the local slabs of the buffer
+        rows = x0 + numpy.arange(width)
+        if period > 0:
+            rows %= period
+        valid = (rows >= 0) & (rows < nx)
+        return rows[valid], buf[valid]
+
+    nthreads = min(max(int(nthreads), 1), len(starts))
+    pool = ThreadPool(nthreads)
+    try:
+        # paint by rounds of blocks, bounding the memory of the buffers
+        for i in range(0, len(starts), nthreads):
+            blocks = starts[i:i + nthreads]
+
+            # reduce in block order
+            for rows, buf in pool.map(paint_block, blocks):
+                out.value[rows] += buf
+    finally:
+        pool.close()
+        pool.join()
+
+    return out
+
+def _get_available_memory(comm):
+    """
+    Return the memory available to each rank on the node, from the
+    ``MemAvailable`` entry of ``/proc/meminfo``, or ``None`` if unknown.
+    """
+    from mpi4py import MPI
+
+    available = None
+    try:
+        with open('/proc/meminfo', 'r') as ff:
+            for line in ff:
+                if line.startswith('MemAvailable:'):
+                    available = int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+
+    # share the memory between the ranks on the same node
+    nodes = comm.allgather(MPI.Get_processor_name())
+    if available is not None:
+        available = available // nodes.count(nodes[comm.rank])
+
+    return available
+
+def _prefetch(func, iterable, enabled=True):
+    """
+    Yield ``func(arg)`` for each ``arg`` in ``iterable``.
+
+    If ``enabled``, the next value is computed in a background thread,
+    while the current value is being used.
+    """
+    if not enabled:
+        for arg in iterable:
+            yield func(arg)
+        return
+
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(1)
+    try:
+        pending = None
+        for arg in iterable:
+            result = pool.apply_async(func, (arg,))
+            if pending is not None:
+                yield pending.get()
+            pending = result
+        if pending is not None:
+            yield pending.get()
+    finally:
+        pool.close()
+        pool.join()
+
+class _LayoutCache(object):
+    """
+    A least-recently-used cache of domain decomposition layouts and
+    exchanged particle positions, with a limit on the total memory.
+    """
+    def __init__(self):
+        self.data = OrderedDict()
+        self.nbytes = 0
+
+    def get(self, key):
+        if key is None or key not in self.data:
+            return None
+        value, nbytes = self.data.pop(key)
+        self.data[key] = (value, nbytes)
+        return value
+
+    def put(self, key, value, nbytes, maxbytes):
+        if key in self.data:
+            self.nbytes -= self.data.pop(key)[1]
+
+        # evict the least recently used entries
+        while len(self.data) and self.nbytes + nbytes > maxbytes:
+            self.nbytes -= self.data.popitem(last=False)[1][1]
+
+        if nbytes <= maxbytes:
+            self.data[key] = (value, nbytes)
+            self.nbytes += nbytes
+
+    def clear(self):
+        self.data.clear()
+        self.nbytes = 0
+
+_layout_cache = _LayoutCache()
+
+def _layout_nbytes(size, position):
+    """
+    Estimate the memory used by a cached layout of ``size`` particles,
+    with exchanged positions ``position``; the layout stores about two
+    integer indices per particle.
+    """
+    return position.nbytes + 8 * (size + 2 * len(position))
+
 class CatalogMesh(CatalogSource, MeshSource):
     """
     A view of a CatalogSource object which knows how to create a MeshSource
@@ -274,6 +469,29 @@ class CatalogMesh(CatalogSource, MeshSource):
     def compensated(self, value):
         self.attrs['compensated'] = value
 
+    def _field_cache_token(self):
+        """
+        Return a token identifying the data of this mesh, used when
+        caching painted fields: the names of the columns used for painting
+        and the dask names of all columns of the catalog.
+        """
+        columns = tuple((col, self[col].name) for col in self.columns)
+        return (self.__class__.__name__, self.position, self.weight,
+                self.value, self.selection) + columns
+
+    @staticmethod
+    def clear_layout_cache():
+        """
+        Clear the cache of domain decomposition layouts used when painting.
+
+        Layouts are cached if the ``paint_layout_cache_size`` global option
+        is non-zero (see :class:`nbodykit.set_options`); a layout is
+        re-used when painting again the same position and selection columns
+        on a mesh of the same geometry, such that only the weight and value
+        columns are exchanged between ranks.
+        """
+        _layout_cache.clear()
+
     def to_real_field(self, out=None, normalize=True):
         """
         Paint the density field, by interpolating the position column
@@ -301,11 +519,171 @@ class CatalogMesh(CatalogSource, MeshSource):
         See the :ref:`documentation <painting-mesh>` on painting for more
         details on painting catalogs to a mesh.
 
+        Parameters
+        ----------
+        out : RealField, optional
+            if provided, the painted field is added to this RealField
+        normalize : bool, optional
+            if ``True``, normalize the density field as :math:`1+\delta`
+
         Returns
         -------
         real : :class:`pmesh.pm.RealField`
             the painted real field; this has a ``attrs`` dict storing meta-data
         """
+        return self._paint(mode='real', out=out, normalize=normalize)
+
+    def to_complex_field(self):
+        """
+        Paint the density field, returning it in Fourier space as a
+        :class:`pmesh.pm.ComplexField`.
+
+        When interlacing, the two interlaced meshes are combined in
+        Fourier space, and the combined field is returned directly,
+        avoiding the ``c2r`` and ``r2c`` round trip of
+        ``to_real_field().r2c()``.
+
+        The meta-data stored in the :attr:`attrs` attribute of the returned
+        field is the same as for :func:`to_real_field`.
+
+        Returns
+        -------
+        complex : :class:`pmesh.pm.ComplexField`
+            the painted field in Fourier space, normalized as :math:`1+\delta`
+        """
+        # subclasses painting a different real field are transformed
+        if type(self).to_real_field is not CatalogMesh.to_real_field:
+            real = self.to_real_field()
+            complex = real.r2c(out=Ellipsis)
+            complex.attrs = real.attrs
+            return complex
+
+        return self._paint(mode='complex')
+
+    def paint_many(self, values=None, weights=None, mode='real', Nmesh=None):
+        """
+        Paint several fields at once, one per value (and weight) column,
+        applying the functions specified in :attr:`actions` to each of them.
+
+        This is equivalent to calling :func:`paint` for each value column,
+        but the positions are read, decomposed and exchanged only once,
+        and the masses of all fields are exchanged together between ranks.
+
+        .. note::
+
+            One mesh per field is held in memory (two with interlacing).
+
+        Parameters
+        ----------
+        values : list of str, optional
+            the value columns to paint; defaults to :attr:`value`
+            for each field
+        weights : list of str, optional
+            the weight columns to paint; defaults to :attr:`weight`
+            for each field
+        mode : 'real' or 'complex'
+            the type of the returned Field objects
+        Nmesh : int or array_like, or None
+            If given and different from the intrinsic Nmesh of the source,
+            resample the meshes to the given resolution
+
+        Returns
+        -------
+        list of :class:`~pmesh.pm.RealField` or :class:`~pmesh.pm.ComplexField` :
+            the painted fields, each with an ``attrs`` dict storing the
+            meta-data of :func:`to_real_field` (``N``, ``W``, ``shotnoise``,
+            ``num_per_cell``)
+
+        Examples
+        --------
+        Paint the density and the momentum density components:
+
+        >>> source['Momentum_x'] = source['Velocity'][:, 0]
+        >>> ...
+        >>> density, px, py, pz = mesh.paint_many(values=[None, 'Momentum_x', 'Momentum_y', 'Momentum_z'])
+        """
+        if not mode in ['real', 'complex']:
+            raise ValueError('mode must be "real" or "complex"')
+
+        if values is None and weights is None:
+            raise ValueError("specify at least one of ``values`` and ``weights``")
+
+        # broadcast the defaults
+        if values is None:
+            values = [self.value] * len(weights)
+        if weights is None:
+            weights = [self.weight] * len(values)
+
+        if len(values) != len(weights):
+            raise ValueError("``values`` and ``weights`` should have the same length")
+
+        values = [self.value if col is None else col for col in values]
+        weights = [self.weight if col is None else col for col in weights]
+
+        # if we expect complex, be smart and use complex directly.
+        actions = self.actions + [(mode, )]
+        fields = self._paint_many(weights, values, mode=actions[0][0])
+
+        return [self._apply_actions(field, mode=mode, Nmesh=Nmesh) for field in fields]
+
+    def _paint(self, mode='real', out=None, normalize=True):
+        """
+        Internal function that paints the density field to the mesh.
+
+        See :func:`_paint_many` for details.
+
+        Parameters
+        ----------
+        mode : 'real' or 'complex'
+            the type of the returned field; ``out`` is only supported
+            for ``mode='real'``
+        out : RealField, optional
+            if provided, the painted field is added to this RealField
+        normalize : bool, optional
+            if ``True``, normalize the density field as :math:`1+\delta`
+        """
+        if out is not None: out = [out]
+        return self._paint_many([self.weight], [self.value], mode=mode,
+                                out=out, normalize=normalize)[0]
+
+    def _paint_many(self, weights, values, mode='real', out=None, normalize=True):
+        """
+        Internal function that paints one density field per pair of
+        weight and value columns to the mesh.
+
+        The particles are decomposed once, and the masses of all fields
+        are exchanged together between ranks.
+
+        With interlacing, the un-shifted particles are painted straight
+        to the returned fields (unless ``out`` is given), and the shifted
+        particles are painted to one scratch mesh per field. Both meshes are
+        transformed in-place and combined in Fourier space, such that
+        at most one mesh per field is allocated in addition to the returned
+        fields.
+
+        Parameters
+        ----------
+        weights : list of str
+            the weight column of each field
+        values : list of str
+            the value column of each field
+        mode : 'real' or 'complex'
+            the type of the returned fields; ``out`` is only supported
+            for ``mode='real'``
+        out : list of RealField, optional
+            if provided, the painted fields are added to these RealFields
+        normalize : bool, optional
+            if ``True``, normalize the density fields as :math:`1+\delta`
+
+        Returns
+        -------
+        list of :class:`pmesh.pm.RealField` or :class:`pmesh.pm.ComplexField`
+            the painted fields; each has a ``attrs`` dict storing meta-data
+        """
+        assert mode in ['real', 'complex'], "``mode`` should be 'real' or 'complex'"
+        assert len(weights) == len(values), "need as many weight as value columns"
+        nfields = len(weights)
+
         # check for 'Position' column
         if self.position not in self:
             msg = "in order to paint a CatalogSource to a RealField, add a "
@@ -314,99 +692,174 @@ class CatalogMesh(CatalogSource, MeshSource):
 
         pm = self.pm
         Nlocal = 0 # (unweighted) number of particles read on local rank
-        Wlocal = 0 # (weighted) number of particles read on local rank
+        Wlocal = numpy.zeros(nfields) # (weighted) number of particles read on local rank
 
         # the paint brush window
         paintbrush = window.methods[self.window]
 
-        # initialize the RealField to return
+        # initialize the RealFields to return
         if out is not None:
-            assert isinstance(out, RealField), "output of to_real_field must be a RealField"
-            numpy.testing.assert_array_equal(out.pm.Nmesh, pm.Nmesh)
-            toret = out
+            assert mode == 'real', "``out`` is only supported when painting a RealField"
+            assert len(out) == nfields, "need one ``out`` field per painted field"
+            for real in out:
+                assert isinstance(real, RealField), "output of to_real_field must be a RealField"
+                numpy.testing.assert_array_equal(real.pm.Nmesh, pm.Nmesh)
+            toret = list(out)
         else:
-            toret = RealField(pm)
-            toret[:] = 0
-
-        # for interlacing, we need two empty meshes if out was provided
-        # since out may have non-zero elements, messing up our interlacing sum
+            toret = []
+            for ifield in range(nfields):
+                real = RealField(pm)
+                real[:] = 0
+                toret.append(real)
+
+        # for interlacing, we need two meshes; the un-shifted mesh is
+        # the returned field itself, unless out was provided, since out
+        # may have non-zero elements, messing up our interlacing sum
         if self.interlaced:
 
-            real1 = RealField(pm)
-            real1[:] = 0
-
-            # the second, shifted mesh (always needed)
-            real2 = RealField(pm)
-            real2[:] = 0
+            if out is None:
+                real1 = list(toret)
+            else:
+                real1 = []
+                for ifield in range(nfields):
+                    real = RealField(pm)
+                    real[:] = 0
+                    real1.append(real)
+
+            # the second, shifted meshes (always needed)
+            real2 = []
+            for ifield in range(nfields):
+                real = RealField(pm)
+                real[:] = 0
+                real2.append(real)
+
+        # the weight and value columns to read, without duplicates
+        masscolumns = []
+        for col in list(weights) + list(values):
+            if col not in masscolumns:
+                masscolumns.append(col)
 
         # read the necessary data (as dask arrays)
-        columns = [self.position, self.weight, self.value, self.selection]
+        Position, Selection = self.read([self.position, self.selection])
 
-        Position, Weight, Value, Selection = self.read(columns)
+        # default columns are constant; do not compute them
+        Mass = self.read(masscolumns)
+        masscolumns = [col for col, c in zip(masscolumns, Mass) if not c.is_default]
+        Mass = [c for c in Mass if not c.is_default]
 
-        # ensure the slices are synced, since decomposition is collective
-        Nlocalmax = max(pm.comm.allgather(len(Position)))
+        # number of threads used for painting
+        nthreads = _global_options['paint_threads']
+
+        # the smoothing of the domain decomposition; interlacing needs
+        # to account for the shifted mesh
+        if not self.interlaced:
+            smoothing = 0.5 * paintbrush.support
+        else:
+            smoothing = 1.0 * paintbrush.support
+
+        # in mesh units
+        shifted = pm.affine.shift(0.5)
 
         # paint data in chunks on each rank;
         # we do this by chunk 8 million is pretty big anyways.
-        chunksize = _global_options['paint_chunk_size']
-        for i in range(0, Nlocalmax, chunksize):
+        chunksize, niter = self._get_paint_chunksize(Position, Mass, nfields, smoothing)
+
+        # ensure the slices are synced, since decomposition is collective
+        chunks = [ichunk * chunksize for ichunk in range(niter)]
+
+        # try to re-use the layouts and the exchanged positions
+        cached = []
+        for i in chunks:
+            key = None
+            if _global_options['paint_layout_cache_size'] > 0:
+                key = (Position.name, Selection.name, i, chunksize,
+                        tuple(pm.Nmesh), tuple(pm.BoxSize), smoothing, pm.comm.size)
+            layout = _layout_cache.get(key)
+
+            # decomposition is collective, so all ranks must hit the cache
+            if not all(pm.comm.allgather(layout is not None)):
+                layout = None
+            cached.append((key, layout))
+
+        def read_chunk(ichunk):
+            """
+            Read the selected data of the ``ichunk``-th chunk; positions are
+            not needed if the layout is cached.
+            """
+            i = chunks[ichunk]
             s = slice(i, i + chunksize)
+            hit = cached[ichunk][1] is not None
 
             if len(Position) != 0:
 
                 # selection has to be computed many times when data is `large`.
-                sel = self.base.compute(Selection[s])
-
-                # be sure to use the source to compute
-                position, weight, value = \
-                    self.base.compute(Position[s], Weight[s], Value[s])
-
-                # FIXME: investigate if move selection before compute
-                # speeds up IO.
-                position = position[sel]
-                weight = weight[sel]
-                value = value[sel]
+                if Selection.is_default:
+                    sel = numpy.ones(len(range(len(Position))[s]), dtype='?')
+                else:
+                    sel = self.base.compute(Selection[s])
+
+                # be sure to use the source to compute; only the
+                # selected rows are computed (and read, for file columns)
+                columns = masscolumns if hit else [self.position] + masscolumns
+                data = self.base.compute_selected(columns, sel, start=i) if len(columns) else []
+                data = dict(zip(columns, data))
+                position = data.get(self.position, None)
+                return sel.sum(), position, data
             else:
                 # workaround a potential dask issue on empty dask arrays
                 position = numpy.empty((0, 3), dtype=Position.dtype)
-                weight = None
-                value = None
-                selection = None
+                return 0, position, {}
 
-            if weight is None:
-                weight = numpy.ones(len(position))
+        # read the next chunk while painting the current one
+        prefetch = _global_options['paint_prefetch']
 
-            if value is None:
-                value = numpy.ones(len(position))
+        for ichunk, (Nsel, position, data) in enumerate(_prefetch(read_chunk, range(len(chunks)), enabled=prefetch)):
 
-            # track total (selected) number and sum of weights
-            Nlocal += len(position)
-            Wlocal += weight.sum()
+            # the masses of all fields, packed to be exchanged at once
+            mass = numpy.empty((Nsel, nfields), dtype='f8')
+            for ifield, (weight, value) in enumerate(zip(weights, values)):
+                weight = data.get(weight, None)
+                value = data.get(value, None)
 
-            # no interlacing
-            if not self.interlaced:
-                lay = pm.decompose(position, smoothing=0.5 * paintbrush.support)
-                p = lay.exchange(position)
-                w = lay.exchange(weight)
-                v = lay.exchange(value)
-                pm.paint(p, mass=w * v, resampler=paintbrush, hold=True, out=toret)
+                if weight is None:
+                    weight = numpy.ones(Nsel)
+
+                if value is None:
+                    value = numpy.ones(Nsel)
+
+                # track sum of weights
+                Wlocal[ifield] += weight.sum()
+                mass[:, ifield] = weight * value
+
+            # track total (selected) number
+            Nlocal += Nsel
 
-            # interlacing: use 2 meshes separated by 1/2 cell size
+            key, layout = cached[ichunk]
+            if layout is not None:
+                lay, p = layout
+                if pm.comm.rank == 0:
+                    self.logger.debug("re-using cached domain decomposition layout")
             else:
-                lay = pm.decompose(position, smoothing=1.0 * paintbrush.support)
+                lay = pm.decompose(position, smoothing=smoothing)
                 p = lay.exchange(position)
-                w = lay.exchange(weight)
-                v = lay.exchange(value)
+                if key is not None:
+                    _layout_cache.put(key, (lay, p), _layout_nbytes(len(position), p),
+                                        _global_options['paint_layout_cache_size'])
 
-                H = pm.BoxSize / pm.Nmesh
+            mass = lay.exchange(mass)
 
-                # in mesh units
-                shifted = pm.affine.shift(0.5)
+            for ifield in range(nfields):
+                m = numpy.ascontiguousarray(mass[:, ifield])
 
-                # paint to two shifted meshes
-                pm.paint(p, mass=w * v, resampler=paintbrush, hold=True, out=real1)
-                pm.paint(p, mass=w * v, resampler=paintbrush, transform=shifted, hold=True, out=real2)
+                # no interlacing
+                if not self.interlaced:
+                    _threaded_paint(pm, p, m, paintbrush, toret[ifield], nthreads=nthreads)
+
+                # interlacing: use 2 meshes separated by 1/2 cell size
+                else:
+                    # paint to two shifted meshes
+                    _threaded_paint(pm, p, m, paintbrush, real1[ifield], nthreads=nthreads)
+                    _threaded_paint(pm, p, m, paintbrush, real2[ifield], transform=shifted, nthreads=nthreads)
 
             Nglobal = pm.comm.allreduce(Nlocal)
 
@@ -420,32 +873,35 @@ class CatalogMesh(CatalogSource, MeshSource):
             # nothing to do, toret is already filled.
             pass
         else:
-            # compose the two interlaced fields into the final result.
-            c1 = real1.r2c()
-            c2 = real2.r2c()
+            H = pm.BoxSize / pm.Nmesh
+
+            for ifield in range(nfields):
 
-            # and then combine
-            for k, s1, s2 in zip(c1.slabs.x, c1.slabs, c2.slabs):
-                kH = sum(k[i] * H[i] for i in range(3))
-                s1[...] = s1[...] * 0.5 + s2[...] * 0.5 * numpy.exp(0.5 * 1j * kH)
+                # compose the two interlaced fields into the final result;
+                # the FFTs are in-place, so real1 and real2 are invalid after this
+                c1 = real1[ifield].r2c(out=Ellipsis)
+                c2 = real2[ifield].r2c(out=Ellipsis)
 
-            # FFT back to real-space
-            # NOTE: cannot use "toret" here in case user supplied "out"
-            c1.c2r(real1)
+                # and then combine
+                for k, s1, s2 in zip(c1.slabs.x, c1.slabs, c2.slabs):
+                    kH = sum(k[i] * H[i] for i in range(3))
+                    s1[...] = s1[...] * 0.5 + s2[...] * 0.5 * numpy.exp(0.5 * 1j * kH)
 
-            # need to add to the returned mesh if user supplied "out"
-            toret[:] += real1[:]
+                # release the scratch mesh
+                real1[ifield] = real2[ifield] = None
+                del c2
 
+                if out is None:
+                    # the combined field is the result; only FFT back to
+                    # real-space if a RealField is requested
+                    toret[ifield] = c1 if mode == 'complex' else c1.c2r(out=Ellipsis)
+                else:
+                    # need to add to the returned mesh if user supplied "out"
+                    toret[ifield][:] += c1.c2r(out=Ellipsis)[:]
 
         # unweighted number of objects
         N = pm.comm.allreduce(Nlocal)
 
-        # weighted number of objects
-        W = pm.comm.allreduce(Wlocal)
-
-        # weighted number density (objs/cell)
-        nbar = 1. * W / numpy.prod(pm.Nmesh)
-
         # make sure we painted something or nbar is nan; in which case
         # we set the density to uniform everywhere.
         if N == 0:
@@ -457,28 +913,114 @@ class CatalogMesh(CatalogSource, MeshSource):
         # shot noise is volume / un-weighted number
         shotnoise = numpy.prod(pm.BoxSize) / N
 
-        # save some meta-data
-        toret.attrs = {}
-        toret.attrs['shotnoise'] = shotnoise
-        toret.attrs['N'] = N
-        toret.attrs['W'] = W
-        toret.attrs['num_per_cell'] = nbar
-
-        csum = toret.csum()
         if pm.comm.rank == 0:
             self.logger.info("painted %d out of %d objects to mesh" %(N,self.base.csize))
-            self.logger.info("mean particles per cell is %g", nbar)
-            self.logger.info("sum is %g ", csum)
-            self.logger.info("normalized the convention to 1 + delta")
 
-        if normalize:
-            if nbar > 0:
-                toret[...] /= nbar
-            else:
-                toret[...] = 1
+        for ifield in range(nfields):
+
+            # weighted number of objects
+            W = pm.comm.allreduce(Wlocal[ifield])
+
+            # weighted number density (objs/cell)
+            nbar = 1. * W / numpy.prod(pm.Nmesh)
+
+            if pm.comm.rank == 0:
+                self.logger.info("mean particles per cell is %g", nbar)
+
+            field = toret[ifield]
+
+            # the sum is only meaningful in configuration space
+            if isinstance(field, RealField):
+                csum = field.csum()
+                if pm.comm.rank == 0:
+                    self.logger.info("sum is %g ", csum)
+
+            if normalize:
+                if pm.comm.rank == 0:
+                    self.logger.info("normalized the convention to 1 + delta")
+                if nbar > 0:
+                    field[...] /= nbar
+                else:
+                    if isinstance(field, ComplexField):
+                        field = field.c2r(out=Ellipsis)
+                    field[...] = 1
+
+            # return the requested type of field
+            if mode == 'complex' and not isinstance(field, ComplexField):
+                field = field.r2c(out=Ellipsis)
+
+            # save some meta-data
+            field.attrs = {}
+            field.attrs['shotnoise'] = shotnoise
+            field.attrs['N'] = N
+            field.attrs['W'] = W
+            field.attrs['num_per_cell'] = nbar
+
+            toret[ifield] = field
 
         return toret
 
+    def _get_paint_chunksize(self, Position, Mass, nfields, smoothing):
+        """
+        Return the number of objects painted at once on this rank, and
+        the number of chunks painted, which is the same on all ranks.
+
+        If the ``paint_memory_budget`` global option is ``None``, the
+        chunk size is ``paint_chunk_size``. Otherwise, the chunk size is
+        derived from the budget (capped by the memory available on the
+        node), the size of the columns read and the expected fraction of
+        ghost particles exchanged by the domain decomposition.
+
+        Parameters
+        ----------
+        Position : dask array
+            the position column
+        Mass : list of dask array
+            the (non-default) weight and value columns that are read
+        nfields : int
+            the number of fields painted
+        smoothing : float
+            the smoothing of the domain decomposition, in cells
+        """
+        pm = self.pm
+        Nlocal = len(Position)
+        budget = _global_options['paint_memory_budget']
+
+        if budget is None:
+            chunksize = _global_options['paint_chunk_size']
+            Nlocalmax = max(pm.comm.allgather(Nlocal))
+            return chunksize, (Nlocalmax + chunksize - 1) // chunksize
+
+        available = _get_available_memory(pm.comm)
+        if available is not None:
+            budget = min(budget, available)
+
+        # bytes per position
+        psize = Position.dtype.itemsize * numpy.prod(Position.shape[1:], dtype='i8')
+
+        # the fraction of ghosts sent to neighboring domains
+        localshape = 1. * pm.Nmesh[:len(pm.np)] / pm.np
+        ghost = numpy.prod(1. + 2. * smoothing / localshape)
+
+        # bytes per object: the columns read, the selection, the packed
+        # mass array, and the exchanged positions, masses and layout indices
+        nbytes = psize + sum(c.dtype.itemsize * numpy.prod(c.shape[1:], dtype='i8') for c in Mass)
+        nbytes += 1 + 8 * nfields
+        nbytes += ghost * (psize + 8 * nfields + 16)
+
+        chunksize = max(int(budget // nbytes), 1)
+
+        # the number of chunks must agree across ranks
+        niter = max(pm.comm.allgather((Nlocal + chunksize - 1) // chunksize))
+        if niter > 0:
+            chunksize = max((Nlocal + niter - 1) // niter, 1)
+
+        if pm.comm.rank == 0:
+            self.logger.info("painting in %d chunk(s) of about %d objects per rank "
+                             "(%g bytes per object, budget of %g bytes)" % (niter, chunksize, nbytes, budget))
+
+        return chunksize, niter
+
     @property
     def actions(self):
         """
@@ -1,6 +1,91 @@
 import numpy
 import logging
+import os
+from collections import OrderedDict
 from pmesh.pm import ParticleMesh, RealField, ComplexField
+from nbodykit import _global_options
+
+class _FieldCache(object):
+    """
+    A least-recently-used cache of painted fields, with a limit on the
+    total memory; evicted fields are optionally written to disk.
+
+    Each rank holds its own cache, storing its local part of the fields.
+    """
+    def __init__(self):
+        self.data = OrderedDict()
+        self.spilled = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.data or key in self.spilled
+
+    def get(self, key):
+        """
+        Return a copy of the field stored as ``key``.
+        """
+        if key in self.spilled:
+            # load back to memory
+            filename, cls, pm, attrs = self.spilled.pop(key)
+            field = cls(pm)
+            field[...] = numpy.load(filename)
+            field.attrs = attrs
+            os.remove(filename)
+            self.put(key, field)
+        else:
+            field = self.data.pop(key)
+            self.data[key] = field
+
+        toret = field.copy()
+        toret.attrs = dict(field.attrs)
+        return toret
+
+    def put(self, key, field):
+        """
+        Store a copy of ``field`` as ``key``.
+        """
+        maxbytes = _global_options['paint_cache_size']
+        nbytes = field.value.nbytes
+
+        if key in self.data:
+            self.nbytes -= self.data.pop(key).value.nbytes
+
+        # evict the least recently used fields
+        while len(self.data) and self.nbytes + nbytes > maxbytes:
+            oldkey, oldfield = self.data.popitem(last=False)
+            self.nbytes -= oldfield.value.nbytes
+            self.spill(oldkey, oldfield)
+
+        if nbytes <= maxbytes:
+            self.data[key] = field.copy()
+            self.data[key].attrs = dict(field.attrs)
+            self.nbytes += nbytes
+        else:
+            self.spill(key, field)
+
+    def spill(self, key, field):
+        """
+        Write ``field`` to the ``paint_cache_dir`` directory, if set.
+        """
+        cachedir = _global_options['paint_cache_dir']
+        if cachedir is None:
+            return
+
+        import uuid
+        filename = os.path.join(cachedir, 'field-%s-%d.npy' %(uuid.uuid4().hex, field.pm.comm.rank))
+        numpy.save(filename, field.value)
+        self.spilled[key] = (filename, field.__class__, field.pm, dict(field.attrs))
+
+    def clear(self):
+        self.data.clear()
+        self.nbytes = 0
+        for key in self.spilled:
+            os.remove(self.spilled[key][0])
+        self.spilled.clear()
+
+_field_cache = _FieldCache()
 
 class MeshSource(object):
     """
@@ -258,9 +343,97 @@ class MeshSource(object):
         # add a dummy action to ensure the right mode of return value
         actions = self.actions + [(mode, )]
 
+        # the cache of painted fields is optional
+        key = None
+        if _global_options['paint_cache_size'] > 0 or _global_options['paint_cache_dir'] is not None:
+            key = self._field_cache_key(mode, Nmesh)
+
+        # painting is collective, so all ranks must hit the cache
+        if key is not None and all(self.comm.allgather(key in _field_cache)):
+            _field_cache.hits += 1
+            if self.comm.rank == 0:
+                self.logger.info('field: %s retrieved from the field cache (hits: %d, misses: %d)'
+                                    % (str(self), _field_cache.hits, _field_cache.misses))
+            return _field_cache.get(key)
+
         # if we expect complex, be smart and use complex directly.
         var = self.to_field(mode=actions[0][0])
 
+        var = self._apply_actions(var, mode=mode, Nmesh=Nmesh)
+
+        if key is not None:
+            _field_cache.misses += 1
+            _field_cache.put(key, var)
+            if self.comm.rank == 0:
+                self.logger.info('field: %s added to the field cache (hits: %d, misses: %d)'
+                                    % (str(self), _field_cache.hits, _field_cache.misses))
+
+        return var
+
+    @staticmethod
+    def clear_field_cache():
+        """
+        Clear the cache of painted fields, removing any field written
+        to disk.
+
+        Painted fields are cached if the ``paint_cache_size`` or
+        ``paint_cache_dir`` global options are set (see
+        :class:`nbodykit.set_options`).
+        """
+        _field_cache.clear()
+
+    def _field_cache_token(self):
+        """
+        Return a token identifying the data of this mesh, which is used
+        when caching painted fields; :attr:`attrs` and :attr:`actions` are
+        accounted for separately.
+
+        Subclasses should extend this if the painted field depends on
+        any other data.
+        """
+        if self.base is not None:
+            return self.base._field_cache_token()
+
+        # a unique identifier of this mesh
+        token = self.__dict__.get('_cache_token', None)
+        if token is None:
+            import uuid
+            token = self._cache_token = uuid.uuid4().hex
+        return token
+
+    def _field_cache_key(self, mode, Nmesh):
+        """
+        The key of the field painted with ``mode`` and ``Nmesh``
+        in the field cache.
+        """
+        import hashlib
+
+        # digest the values, since the repr of large arrays is truncated
+        attrs = []
+        for name in sorted(self.attrs):
+            value = numpy.asarray(self.attrs[name])
+            if value.dtype.hasobject:
+                data = repr(self.attrs[name]).encode()
+            else:
+                data = numpy.ascontiguousarray(value).tobytes()
+            attrs.append((name, str(value.dtype), value.shape, hashlib.sha1(data).hexdigest()))
+        attrs = tuple(attrs)
+        actions = tuple(tuple(action) for action in self.actions)
+        # normalize Nmesh without building a resized ParticleMesh
+        if Nmesh is None:
+            Nmesh = self.pm.Nmesh
+        Nmesh = tuple(int(n) for n in numpy.ones(3, dtype='i8') * Nmesh)
+        return (self._field_cache_token(), attrs, actions, mode, Nmesh, str(self.dtype))
+
+    def _apply_actions(self, var, mode="real", Nmesh=None):
+        """
+        Apply the functions specified in :attr:`actions` to the field
+        ``var``, as returned by :func:`to_field`, and resample it
+        to ``Nmesh``; see :func:`paint`.
+        """
+        # add a dummy action to ensure the right mode of return value
+        actions = self.actions + [(mode, )]
+
         if not hasattr(var, 'attrs'):
             attrs = {}
         else:
@@ -254,3 +254,159 @@ def test_apply(comm):
     # check meta-data
     for k in mesh.attrs:
         assert k in view.attrs
+
+@MPITest([1, 4])
+def test_to_complex_field(comm):
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-4, BoxSize=512., seed=42)
+
+    for interlaced in [False, True]:
+        mesh = source.to_mesh(window='tsc', Nmesh=32, interlaced=interlaced)
+
+        # painting directly to Fourier space matches the real field
+        real = mesh.to_real_field()
+        complex = mesh.to_complex_field()
+        assert_allclose(real.r2c(), complex, atol=1e-9)
+
+        # same meta-data
+        for k in ['N', 'W', 'shotnoise', 'num_per_cell']:
+            assert real.attrs[k] == complex.attrs[k]
+
+@MPITest([1, 4])
+def test_to_complex_field_subclass(comm):
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-4, BoxSize=512., seed=42)
+
+    class DoubledMesh(CatalogMesh):
+        def to_real_field(self, out=None, normalize=True):
+            real = CatalogMesh.to_real_field(self, out=out, normalize=normalize)
+            real[...] *= 2
+            return real
+
+    mesh = source.to_mesh(window='tsc', Nmesh=32, interlaced=True)
+    doubled = DoubledMesh(source, BoxSize=512., Nmesh=32, dtype='f4', weight='Weight',
+                          value='Value', selection='Selection', window='tsc', interlaced=True)
+
+    # the overridden real field is used in Fourier space
+    assert_allclose(doubled.paint(mode='complex'), 2 * mesh.paint(mode='complex'), atol=1e-9)
+
+@MPITest([1, 4])
+def test_paint_interlaced_out(comm):
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-4, BoxSize=512., seed=42)
+    mesh = source.to_mesh(window='cic', Nmesh=32, interlaced=True)
+
+    r1 = mesh.to_real_field(normalize=False)
+
+    # painting is added to the input field
+    out = mesh.pm.create(mode='real', zeros=True)
+    out[...] = 1.0
+    r2 = mesh.to_real_field(out=out, normalize=False)
+    assert r2 is out
+    assert_allclose(r2, r1 + 1.0)
+
+@MPITest([1, 4])
+def test_paint_threads(comm):
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-2, BoxSize=512., seed=42)
+    mesh = source.to_mesh(window='tsc', Nmesh=64, interlaced=True)
+
+    r0 = mesh.to_real_field()
+
+    with set_options(paint_threads=1):
+        r1 = mesh.to_real_field()
+
+    with set_options(paint_threads=4):
+        r2 = mesh.to_real_field()
+
+    # bit-reproducible regardless of the (integer) number of threads
+    assert_array_equal(r1, r2)
+
+    # serial painting sums in a different order: equal up to round-off only
+    assert_allclose(r0, r1, rtol=1e-5)
+    assert any(comm.allgather((r0.value != r1.value).any()))
+
+@MPITest([1, 4])
+def test_paint_layout_cache(comm):
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-4, BoxSize=512., seed=42)
+    source['Weight'] = source.rng.uniform(size=source.size)
+    source['Selection'] = source['Weight'] > 0.2
+    mesh = source.to_mesh(window='cic', Nmesh=32, interlaced=True)
+
+    r1 = mesh.to_real_field()
+
+    with set_options(paint_layout_cache_size=1e9):
+        mesh.to_real_field()
+        r2 = mesh.to_real_field() # from the cache
+
+        # painting a different weight re-uses the layout
+        source['Weight2'] = source['Weight'] ** 2
+        mesh2 = source.to_mesh(window='cic', Nmesh=32, interlaced=True, weight='Weight2')
+        r3 = mesh2.to_real_field()
+        mesh2.clear_layout_cache()
+        r4 = mesh2.to_real_field()
+
+    assert_allclose(r1, r2)
+    assert_allclose(r3, r4)
+    mesh.clear_layout_cache()
+
+@MPITest([1, 4])
+def test_paint_many(comm):
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-4, BoxSize=512., seed=42)
+    source['Vx'] = source['Velocity'][:, 0]
+    source['Mass'] = source.rng.uniform(size=source.size)
+
+    for interlaced in [False, True]:
+        mesh = source.to_mesh(window='tsc', Nmesh=32, interlaced=interlaced, compensated=True)
+
+        fields = mesh.paint_many(values=[None, 'Vx', 'Vx'], weights=[None, None, 'Mass'], mode='complex')
+        assert len(fields) == 3
+
+        for field, (weight, value) in zip(fields, [('Weight', 'Value'), ('Weight', 'Vx'), ('Mass', 'Vx')]):
+            mesh.weight, mesh.value = weight, value
+            ref = mesh.paint(mode='complex')
+            assert_allclose(field, ref, rtol=1e-5, atol=1e-7)
+            for k in ['N', 'W', 'shotnoise', 'num_per_cell']:
+                assert_allclose(field.attrs[k], ref.attrs[k])
+
+@MPITest([1, 4])
+def test_paint_prefetch(comm):
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-2, BoxSize=512., seed=42)
+    source['Selection'] = source['Velocity'][:, 0] > 0.2
+    mesh = source.to_mesh(window='cic', Nmesh=64)
+
+    with set_options(paint_chunk_size=source.csize // 8):
+        r1 = mesh.paint()
+
+        with set_options(paint_prefetch=True):
+            r2 = mesh.paint()
+
+    assert_allclose(r1, r2)
+
+@MPITest([1, 4])
+def test_paint_memory_budget(comm):
+
+    CurrentMPIComm.set(comm)
+    source = UniformCatalog(nbar=3e-2, BoxSize=512., seed=42)
+    mesh = source.to_mesh(window='tsc', Nmesh=64, interlaced=True)
+
+    r1 = mesh.paint()
+
+    # a small budget to paint in several chunks
+    with set_options(paint_memory_budget=2e7):
+        chunksize, niter = mesh._get_paint_chunksize(mesh['Position'], [], 1, 1.5)
+        assert niter > 1
+        assert chunksize * niter >= mesh.size
+        r2 = mesh.paint()
+
+    assert_allclose(r1, r2)
@@ -194,3 +194,59 @@ def test_view(comm):
     # check meta-data
     for k in source.attrs:
         assert k in view.attrs
+
+@MPITest([1,4])
+def test_field_cache(comm):
+
+    from nbodykit import set_options
+    from nbodykit.base.mesh import _field_cache
+    CurrentMPIComm.set(comm)
+
+    source = UniformCatalog(nbar=3e-4, BoxSize=512., seed=42)
+    mesh = source.to_mesh(Nmesh=32, compensated=True)
+
+    r1 = mesh.paint(mode='complex')
+
+    # initialize a scratch directory
+    if comm.rank == 0:
+        tmpdir = tempfile.mkdtemp()
+    else:
+        tmpdir = None
+    tmpdir = comm.bcast(tmpdir)
+
+    with set_options(paint_cache_size=1e8, paint_cache_dir=tmpdir):
+        mesh.paint(mode='complex')
+        hits = _field_cache.hits
+        r2 = mesh.paint(mode='complex')
+        assert _field_cache.hits == hits + 1
+        assert_allclose(r1, r2)
+
+        # the cached field is a copy
+        r2[...] = 0
+        assert_allclose(r1, mesh.paint(mode='complex'))
+
+        # changing a column changes the field
+        source['Weight'] = 2.
+        r3 = mesh.paint(mode='real')
+        assert_allclose(r3.attrs['W'], 2 * r1.attrs['W'])
+
+        # large array attributes are hashed in full
+        mesh.attrs['table'] = numpy.zeros(10000)
+        key = mesh._field_cache_key('real', None)
+        mesh.attrs['table'][5000] = 1.
+        assert mesh._field_cache_key('real', None) != key
+        mesh.attrs.pop('table')
+
+        # evicted fields are written to disk
+        with set_options(paint_cache_size=1):
+            mesh.paint(mode='complex')
+            assert len(_field_cache.data) == 0
+            hits = _field_cache.hits
+            r4 = mesh.paint(mode='real')
+            assert _field_cache.hits == hits + 1
+            assert_allclose(r3, r4)
+
+        mesh.clear_field_cache()
+
+    if comm.rank == 0:
+        shutil.rmtree(tmpdir)
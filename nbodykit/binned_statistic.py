@@ -37,7 +37,7 @@ def bin_ndarray(ndarray, new_shape, weights=None, operation=numpy.mean):
         raise ValueError("why are we re-binning if the new shape equals the old shape?")
     if ndarray.ndim != len(new_shape):
         raise ValueError("Shape mismatch: {} -> {}".format(ndarray.shape, new_shape))
-    if numpy.sometrue(numpy.mod(ndarray.shape, new_shape)):
+    if numpy.any(numpy.mod(ndarray.shape, new_shape)):
         args = (str(new_shape), str(ndarray.shape))
         msg = "desired shape of %s must be integer factor smaller than the old shape %s" %args
         raise ValueError(msg)
@@ -778,7 +778,7 @@ class BinnedStatistic(object):
             will be returned
         """
         i = self.dims.index(dim)
-        fields_to_sum += self._fields_to_sum
+        fields_to_sum = list(fields_to_sum) + list(self._fields_to_sum)
 
         # determine the new binning
         old_spacings = numpy.diff(self.coords[dim])
@@ -814,8 +814,8 @@ class BinnedStatistic(object):
         if leftover:
             sl = [slice(None, None)]*len(self.dims)
             sl[i] = slice(None, -leftover)
-            data = data[sl]
-            if weights is not None: weights = weights[sl]
+            data = data[tuple(sl)]
+            if weights is not None: weights = weights[tuple(sl)]
             edges = edges[:-leftover]
             new_shape[i] = new_shape[i] - leftover
 
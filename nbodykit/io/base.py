@@ -339,6 +339,77 @@ class FileType(object):
 
         return obj
 
+    def __dask_tokenize__(self):
+        """
+        A token identifying this file object in :mod:`dask`, such that the
+        arrays returned by :func:`get_dask` have a stable name for the
+        lifetime of the file object.
+
+        Objects reading files on disk are identified by the path, size and
+        modification time of their files (see :func:`_file_identity`), such
+        that the names are also the same across runs reading unchanged files.
+        """
+        if getattr(self, 'base', None) is None:
+            memown = self
+        else:
+            memown = self.base
+
+        # a unique identifier of the owner of the memory
+        token = getattr(memown, '_token', None)
+        if token is None:
+            identity = memown._file_identity()
+            if identity is not None:
+                import hashlib
+                token = hashlib.sha1(repr(identity).encode()).hexdigest()
+            else:
+                import uuid
+                token = uuid.uuid4().hex
+            memown._token = token
+
+        return (token, tuple(self.columns), str(self.dtype), self.shape)
+
+    def _file_identity(self):
+        """
+        Return the type and the parameters of this file object, along with
+        the path, size and modification time of the files it reads, or
+        ``None`` if it does not read files on disk.
+        """
+        import os
+
+        # a stack of files
+        files = getattr(self, 'files', None)
+        if files is not None:
+            identities = [f._file_identity() for f in files]
+            if any(identity is None for identity in identities):
+                return None
+            return (type(self).__name__, tuple(identities))
+
+        path = getattr(self, 'path', None)
+        if not isinstance(path, string_types) or not os.path.exists(path):
+            return None
+
+        # a directory (e.g. BigFile) is identified by the files it holds
+        paths = [path]
+        if os.path.isdir(path):
+            paths = sorted(os.path.join(root, name)
+                           for root, dirs, names in os.walk(path) for name in names)
+        stats = []
+        for fn in paths:
+            stat = os.stat(fn)
+            stats.append((os.path.abspath(fn), stat.st_size, stat.st_mtime))
+
+        # the plain parameters of the object, e.g. the dataset of the file
+        def isplain(value):
+            if isinstance(value, (list, tuple)):
+                return all(isplain(v) for v in value)
+            if isinstance(value, dict):
+                return all(isplain(k) and isplain(v) for k, v in value.items())
+            return value is None or isinstance(value, string_types + (int, float, bool, numpy.generic, numpy.dtype))
+
+        params = sorted((key, repr(value)) for key, value in vars(self).items()
+                        if not key.startswith('_') and isplain(value))
+        return (type(self).__name__, tuple(stats), tuple(params))
+
     def get_dask(self, column, blocksize=None):
         """
         Return the specified column as a dask array, which
@@ -370,8 +441,63 @@ class FileType(object):
         import dask.array as da
         return da.from_array(self[column], chunks=blocksize)
 
+    def read_selection(self, columns, start, stop, selection, max_gap=1024):
+        """
+        Read the specified column(s) over the given range, returning
+        only the rows for which ``selection`` is ``True``.
+
+        Only the selected row ranges are read from the file; ranges
+        separated by at most ``max_gap`` unselected rows are coalesced
+        into a single call to :func:`read`.
+
+        Parameters
+        ----------
+        columns : str, list of str
+            the name of the column(s) to return
+        start : int
+            the row integer to start reading at
+        stop : int
+            the row integer to stop reading at
+        selection : array_like
+            boolean array of length ``stop - start``, specifying which
+            rows to return
+        max_gap : int, optional
+            the maximum number of unselected rows between two ranges that
+            are read at once
+
+        Returns
+        -------
+        data : array_like
+            a numpy structured array holding the selected rows
+        """
+        if isinstance(columns, string_types):
+            columns = [columns]
 
-def find_slice_chunks(index):
+        selection = numpy.asarray(selection, dtype='?')
+        if len(selection) != stop - start:
+            raise ValueError("selection has length %d; should be %d" %(len(selection), stop - start))
+
+        # if we don't own memory, read from 'base' attribute
+        if getattr(self, 'base', None) is None:
+            memown = self
+        else:
+            memown = self.base
+
+        dtype = numpy.dtype([(col, memown.dtype[col]) for col in columns])
+        toret = numpy.empty(selection.sum(), dtype=dtype)
+
+        offset = 0
+        for (ilow, ihigh, step) in find_slice_chunks(selection, max_gap=max_gap):
+            data = memown.read(columns, start + ilow, start + ihigh)
+            mask = selection[ilow:ihigh]
+            size = mask.sum()
+            toret[offset:offset + size] = data[mask]
+            offset += size
+
+        return toret
+
+
+def find_slice_chunks(index, max_gap=0):
     """
     A generator to yield (start, stop, step) tuples
     which will correspond to the input selection index
@@ -384,6 +510,10 @@ def find_slice_chunks(index):
     index : array_like
         either a boolean array, indicating which rows to select,
         or integers specifying which rows to include
+    max_gap : int, optional
+        consecutive chunks separated by at most ``max_gap`` rows are
+        merged into a single chunk, which then also includes rows that
+        are not selected; the default (0) yields the exact selection
 
     Yields
     ------
@@ -391,30 +521,23 @@ def find_slice_chunks(index):
         the slice integers to read, corresponding to a valid spart of the
         selection index
     """
-    from itertools import groupby
-    from operator import itemgetter
-
     if isinstance(index, list):
         index = numpy.array(index)
 
     # handle boolean index
     if index.dtype == '?':
-        vals, N = zip(*[(k, sum(1 for i in g)) for k,g in groupby(index)])
-        N = numpy.cumsum(N)
+        index = numpy.flatnonzero(index)
 
-        for i, v in enumerate(vals):
-            if v:
-                ilow = i-1
-                if ilow < 0: Nlow = 0
-                else: Nlow = N[ilow]
+    index = numpy.asarray(index, dtype='i8')
+    if not len(index):
+        return
 
-                yield (Nlow, N[i], 1)
+    # a new chunk starts where the index is not increasing by 1 (+ max_gap)
+    diff = numpy.diff(index)
+    breaks = numpy.flatnonzero((diff < 1) | (diff > max_gap + 1)) + 1
 
-    # handle integer index
-    else:
-        N = []
-        for k,g in groupby(enumerate(index), lambda x: x[0]-x[1]):
-            N.append(list(map(itemgetter(1), g)))
+    starts = index[numpy.concatenate([[0], breaks])]
+    stops = index[numpy.concatenate([breaks - 1, [len(index) - 1]])] + 1
 
-        for xx in N:
-            yield (xx[0], xx[-1]+1, 1)
+    for start, stop in zip(starts, stops):
+        yield (int(start), int(stop), 1)
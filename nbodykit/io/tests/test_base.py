@@ -94,3 +94,40 @@ def test_asarray(comm):
         # cannot do view with different dtypes
         with pytest.raises(ValueError):
             f2 = f.asarray()
+
+@MPITest([1])
+def test_read_selection(comm):
+
+    with tempfile.NamedTemporaryFile() as ff:
+
+        # generate data
+        data = numpy.random.random(size=(100,5))
+        numpy.savetxt(ff, data, fmt='%.7e'); ff.seek(0)
+
+        # read
+        names =['a', 'b', 'c', 'd', 'e']
+        f = CSVFile(path=ff.name, names=names, blocksize=100)
+
+        sel = numpy.random.random(size=50) < 0.3
+        for max_gap in [0, 4, 1024]:
+            d = f.read_selection(['a', 'c'], 20, 70, sel, max_gap=max_gap)
+            numpy.testing.assert_almost_equal(d['a'], data[20:70,0][sel])
+            numpy.testing.assert_almost_equal(d['c'], data[20:70,2][sel])
+
+        # empty selection
+        d = f.read_selection(['a'], 20, 70, numpy.zeros(50, dtype='?'))
+        assert len(d) == 0
+
+        # wrong size
+        with pytest.raises(ValueError):
+            d = f.read_selection(['a'], 20, 70, sel[:10])
+
+@MPITest([1])
+def test_find_slice_chunks(comm):
+
+    from nbodykit.io.base import find_slice_chunks
+
+    index = numpy.array([0, 1, 1, 0, 0, 1, 0, 1, 1, 1], dtype='?')
+    assert list(find_slice_chunks(index)) == [(1, 3, 1), (5, 6, 1), (7, 10, 1)]
+    assert list(find_slice_chunks(index, max_gap=1)) == [(1, 3, 1), (5, 10, 1)]
+    assert list(find_slice_chunks([3, 4, 5, 1, 2, 9])) == [(3, 6, 1), (1, 3, 1), (9, 10, 1)]
@@ -148,4 +148,23 @@ def test_pickle(comm):
         numpy.testing.assert_almost_equal(f['Position'][:], f2['Position'][:])
     
     # cleanup
-    os.remove(tmpfile)
\ No newline at end of file
+    os.remove(tmpfile)
+
+@MPITest([1])
+def test_dask_token(comm):
+
+    tmpfile = tempfile.mktemp()
+    pos = numpy.random.random(size=(1024, 3))
+    pos.tofile(tmpfile)
+
+    # the same unchanged file has the same dask names
+    f1 = BinaryFile(tmpfile, [('Position', ('f8', 3))], size=1024)
+    f2 = BinaryFile(tmpfile, [('Position', ('f8', 3))], size=1024)
+    assert f1.get_dask('Position').name == f2.get_dask('Position').name
+
+    # a modified file does not
+    os.utime(tmpfile, (0, 0))
+    f3 = BinaryFile(tmpfile, [('Position', ('f8', 3))], size=1024)
+    assert f3.get_dask('Position').name != f1.get_dask('Position').name
+
+    os.remove(tmpfile)
@@ -91,6 +91,39 @@ class FileCatalogBase(CatalogSource):
         else:
             return CatalogSource.get_hardcolumn(self, col)
 
+    def compute_selected(self, columns, selection, start=0):
+        """
+        Compute the requested columns over the local rows
+        ``start`` to ``start + len(selection)``, returning only the rows
+        where ``selection`` is ``True``.
+
+        Columns read directly from the file (and not overriden by the user)
+        are read via :func:`~nbodykit.io.base.FileType.read_selection`, such
+        that only the selected row ranges are read from disk. Other
+        columns are computed as in :func:`CatalogSource.compute_selected`.
+        """
+        if self.base is not None:
+            return self.base.compute_selected(columns, selection, start=start)
+
+        filecols = [col for col in columns if col in self._source.dtype.names
+                    and col not in self._overrides]
+        othercols = [col for col in columns if col not in filecols]
+
+        toret = {}
+        if len(filecols):
+            # the global offset of the local rows
+            offset = self.comm.rank * self._source.size // self.comm.size
+            data = self._source.read_selection(filecols, offset + start,
+                        offset + start + len(selection), selection)
+            for col in filecols:
+                toret[col] = data[col]
+
+        if len(othercols):
+            data = CatalogSource.compute_selected(self, othercols, selection, start=start)
+            toret.update(zip(othercols, data))
+
+        return [toret[col] for col in columns]
+
 
 def _make_docstring(filetype, examples):
     """
@@ -1,8 +1,10 @@
 from nbodykit.source.catalog.species import MultipleSpeciesCatalog
 from nbodykit.transform import ConstantArray
+from nbodykit import _global_options
 
 import numpy
 import logging
+from collections import OrderedDict
 
 
 class FKPCatalog(MultipleSpeciesCatalog):
@@ -62,7 +64,96 @@ class FKPCatalog(MultipleSpeciesCatalog):
             BoxPad = numpy.ones(3)*BoxPad
         self.attrs['BoxPad'] = BoxPad
 
-    def _define_cartesian_box(self, position, selection):
+        # the cache of the sums computed by _weighted_sums()
+        self._sums_cache = {}
+
+    def _weighted_sums(self, name, selection, comp_weight, nbar, fkp_weights, position=None):
+        r"""
+        Internal function to compute the sums over the selected objects of
+        the ``name`` species that are needed to normalize the FKP density
+        field and its power spectrum, in a single pass over the catalog.
+
+        The columns are read by chunks of ``paint_chunk_size`` objects,
+        reading only the selected rows. The results are cached, and
+        re-used as long as the dask names of the columns do not change.
+
+        Parameters
+        ----------
+        name : 'data', 'randoms'
+            the species to compute the sums for
+        selection, comp_weight, nbar : str
+            the names of the selection, completeness weight, and
+            n(z) columns
+        fkp_weights : tuple of str
+            the names of the FKP weight columns of the two fields
+            whose power spectrum is computed
+        position : str, optional
+            if provided, also compute the bounds of this column
+
+        Returns
+        -------
+        sums : dict
+            ``N``, the number of selected objects; ``W``, the sum of
+            :math:`w_\mathrm{comp}`; ``norm``, the sum of
+            :math:`\bar{n} w_\mathrm{comp} w_{\mathrm{fkp},1} w_{\mathrm{fkp},2}`;
+            ``shotnoise``, the sum of
+            :math:`w_\mathrm{comp}^2 w_{\mathrm{fkp},1} w_{\mathrm{fkp},2}`;
+            and, if ``position`` is provided, ``min`` and ``max``,
+            the bounds of the ``position`` column
+        """
+        cat = self[name]
+
+        # the columns to read, without duplicates
+        fkp_weights = tuple(fkp_weights)
+        columns = [comp_weight, nbar] + list(fkp_weights)
+        if position is not None:
+            columns.append(position)
+        columns = list(OrderedDict.fromkeys(columns))
+
+        # the sums are re-used while the columns do not change
+        key = (name, comp_weight, nbar, fkp_weights, position)
+        key += tuple((col, cat[col].name) for col in [selection] + columns)
+        cache = self.__dict__.setdefault('_sums_cache', {})
+
+        # the sums are reduced across ranks, so all ranks must hit the cache
+        if all(self.comm.allgather(key in cache)):
+            return dict(cache[key])
+
+        Selection = cat[selection]
+        sums = numpy.zeros(4) # N, W, norm, shotnoise
+        pos_min = numpy.ones(3) * numpy.inf
+        pos_max = -pos_min
+
+        chunksize = _global_options['paint_chunk_size']
+        for i in range(0, len(cat), chunksize):
+
+            # only the selected rows are read
+            if Selection.is_default:
+                sel = numpy.ones(len(range(len(cat))[i:i+chunksize]), dtype='?')
+            else:
+                sel = cat.compute(Selection[i:i+chunksize])
+            data = dict(zip(columns, cat.compute_selected(columns, sel, start=i)))
+
+            comp = data[comp_weight]
+            fkp = data[fkp_weights[0]] * data[fkp_weights[-1]]
+            sums += [sel.sum(), comp.sum(), (data[nbar]*comp*fkp).sum(), (comp**2*fkp).sum()]
+
+            if position is not None and len(data[position]):
+                pos_min = numpy.minimum(pos_min, data[position].min(axis=0))
+                pos_max = numpy.maximum(pos_max, data[position].max(axis=0))
+
+        # reduce across all ranks
+        sums = self.comm.allreduce(sums)
+        toret = dict(zip(['N', 'W', 'norm', 'shotnoise'], sums))
+        toret['N'] = int(toret['N'])
+        if position is not None:
+            toret['min'] = numpy.asarray(self.comm.allgather(pos_min)).min(axis=0)
+            toret['max'] = numpy.asarray(self.comm.allgather(pos_max)).max(axis=0)
+
+        cache[key] = toret
+        return dict(toret)
+
+    def _define_cartesian_box(self, position, selection, comp_weight=None, nbar=None, fkp_weight=None):
         """
         Internal function to put the :attr:`randoms` CatalogSource in a
         Cartesian box.
@@ -77,12 +168,21 @@ class FKPCatalog(MultipleSpeciesCatalog):
             the mean coordinate value in each direction; this is used to re-center
             the Cartesian coordinates of the :attr:`data` and :attr:`randoms`
             to the range of ``[-BoxSize/2, BoxSize/2]``
+
+        If the completeness weight, n(z) and FKP weight columns are provided,
+        the weighted sums of the :attr:`randoms` are computed in the same pass
+        over the catalog as the bounds; see :func:`_weighted_sums`.
         """
         from nbodykit.utils import get_data_bounds
 
         # compute the min/max of the position data
-        pos, sel = self['randoms'].read([position, selection])
-        pos_min, pos_max = get_data_bounds(pos, self.comm, selection=sel)
+        if comp_weight is not None:
+            sums = self._weighted_sums('randoms', selection, comp_weight, nbar,
+                                       (fkp_weight, fkp_weight), position=position)
+            pos_min, pos_max = sums['min'], sums['max']
+        else:
+            pos, sel = self['randoms'].read([position, selection])
+            pos_min, pos_max = get_data_bounds(pos, self.comm, selection=sel)
 
         # used to center the data in the first cartesian quadrant
         delta = abs(pos_max - pos_min)
@@ -165,7 +265,8 @@ class FKPCatalog(MultipleSpeciesCatalog):
                                  "supplied and the FKP source does not define one in 'attrs'.")
 
         # first, define the Cartesian box
-        self._define_cartesian_box(position, selection)
+        self._define_cartesian_box(position, selection, comp_weight=comp_weight,
+                                   nbar=nbar, fkp_weight=fkp_weight)
 
         if BoxSize is None:
             BoxSize = self.attrs['BoxSize']
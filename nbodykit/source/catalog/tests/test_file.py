@@ -113,3 +113,24 @@ def test_stack_list(comm):
 
     os.unlink(tmpfile1)
     os.unlink(tmpfile2)
+
+@MPITest([1, 4])
+def test_compute_selected(comm):
+
+    CurrentMPIComm.set(comm)
+
+    with tempfile.NamedTemporaryFile() as ff:
+
+        # generate data
+        data = numpy.random.random(size=(100,5))
+        numpy.savetxt(ff, data, fmt='%.7e'); ff.seek(0)
+
+        names =['a', 'b', 'c', 'd', 'e']
+        f = CSVCatalog(ff.name, names, blocksize=100)
+        f['b'] = 2 * f['b'] # an override column is computed from dask
+
+        sel = f.compute(f['a'] > 0.5)
+        a, b, c = f.compute_selected(['a', 'b', 'c'], sel[10:], start=10)
+        assert_allclose(a, f['a'].compute()[10:][sel[10:]])
+        assert_allclose(b, f['b'].compute()[10:][sel[10:]])
+        assert_allclose(c, f['c'].compute()[10:][sel[10:]])
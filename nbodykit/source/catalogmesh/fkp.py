@@ -1,7 +1,137 @@
 from nbodykit.source.catalogmesh.species import MultipleSpeciesCatalogMesh
 from nbodykit.utils import attrs_to_dict
+from nbodykit import _global_options
+from collections import OrderedDict
 import logging
 import numpy
+import os
+
+class _RandomsCache(object):
+    """
+    A least-recently-used cache of the randoms fields painted by
+    :class:`FKPCatalogMesh`, with a limit on the total memory; fields are
+    optionally written to (and read from) BigFile files, such that they
+    can be re-used across processes.
+
+    Each rank holds its own cache, storing its local part of the fields,
+    along with the weighted total of randoms.
+    """
+    logger = logging.getLogger('RandomsCache')
+
+    def __init__(self):
+        self.data = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key):
+        """
+        Return a copy of the field stored as ``key``, and the
+        weighted total of randoms.
+        """
+        field, W = self.data.pop(key)
+        self.data[key] = (field, W)
+
+        toret = field.copy()
+        toret.attrs = dict(field.attrs)
+        return toret, W
+
+    def put(self, key, field, W):
+        """
+        Store a copy of ``field`` and the weighted total ``W`` as ``key``.
+        """
+        maxbytes = _global_options['randoms_cache_size']
+        nbytes = field.value.nbytes
+
+        if key in self.data:
+            self.nbytes -= self.data.pop(key)[0].value.nbytes
+
+        # evict the least recently used fields
+        while len(self.data) and self.nbytes + nbytes > maxbytes:
+            self.nbytes -= self.data.popitem(last=False)[1][0].value.nbytes
+
+        if nbytes <= maxbytes:
+            copy = field.copy()
+            copy.attrs = dict(field.attrs)
+            self.data[key] = (copy, W)
+            self.nbytes += nbytes
+
+    def save(self, filename, field, W, params):
+        """
+        Save ``field`` and the weighted total ``W`` to the BigFile
+        ``filename``, along with the parameters ``params`` it was painted with.
+        """
+        from nbodykit.source.mesh.field import FieldMesh
+
+        mesh = FieldMesh(field)
+        mesh.attrs.update(field.attrs)
+        mesh.attrs['randoms_cache.W'] = W
+        mesh.attrs['randoms_cache.params'] = params
+        mesh.save(filename, dataset='Field', mode='real')
+
+    def load(self, filename, params, comm):
+        """
+        Load the field and the weighted total of randoms stored in the
+        BigFile ``filename``, returning ``None`` if the file does not exist
+        or was painted with different parameters.
+        """
+        from nbodykit.source.mesh.bigfile import BigFileMesh
+
+        exists = comm.bcast(os.path.exists(filename) if comm.rank == 0 else None)
+        if not exists:
+            return None
+
+        mesh = BigFileMesh(filename, 'Field', comm=comm)
+        if str(mesh.attrs.get('randoms_cache.params', '')) != params:
+            if comm.rank == 0:
+                self.logger.warning("randoms field in %s painted with different parameters; ignoring" %filename)
+            return None
+
+        field = mesh.to_real_field()
+        field.attrs = {}
+        for key in mesh.attrs:
+            if key.startswith('randoms.') or key in ['N', 'W', 'shotnoise', 'num_per_cell']:
+                value = numpy.asarray(mesh.attrs[key])
+                field.attrs[key] = value.item() if value.ndim == 0 else value
+        return field, float(mesh.attrs['randoms_cache.W'])
+
+    def clear(self):
+        self.data.clear()
+        self.nbytes = 0
+
+_randoms_cache = _RandomsCache()
+
+def _mix64(x):
+    """
+    The finalizer of the splitmix64 generator, mixing the bits of the
+    unsigned 64-bit integers ``x``.
+    """
+    with numpy.errstate(over='ignore'):
+        x = (x ^ (x >> numpy.uint64(30))) * numpy.uint64(0xbf58476d1ce4e5b9)
+        x = (x ^ (x >> numpy.uint64(27))) * numpy.uint64(0x94d049bb133111eb)
+    return x ^ (x >> numpy.uint64(31))
+
+def _object_hashes(arrays, seed):
+    """
+    Return a 64-bit hash of each row of the arrays ``arrays``, combining
+    the bytes of the row of each array in turn.
+    """
+    h = numpy.full(len(arrays[0]), seed, dtype='u8')
+    for array in arrays:
+        array = numpy.ascontiguousarray(array)
+        rowbytes = array.dtype.itemsize * int(numpy.prod(array.shape[1:]))
+        data = array.view('u1').reshape(len(array), rowbytes)
+
+        # pad the bytes of each row to 64-bit words
+        pad = -data.shape[1] % 8
+        if pad:
+            data = numpy.concatenate([data, numpy.zeros((len(data), pad), dtype='u1')], axis=1)
+        for word in numpy.ascontiguousarray(data).view('u8').T:
+            h = _mix64(h ^ word)
+    return h
 
 class FKPCatalogMesh(MultipleSpeciesCatalogMesh):
     """
@@ -84,6 +214,32 @@ class FKPCatalogMesh(MultipleSpeciesCatalogMesh):
             self.attrs[name] = val
             self.base.attrs[name] = val
 
+        # paint on a mesh with the new size
+        if not numpy.array_equal(self.pm.BoxSize, BoxSize):
+            from pmesh.pm import ParticleMesh
+            self.pm = ParticleMesh(BoxSize=BoxSize, Nmesh=self.pm.Nmesh,
+                                    dtype=self.dtype, comm=self.comm)
+
+
+    @staticmethod
+    def clear_randoms_cache():
+        """
+        Clear the in-memory cache of painted randoms fields; files written
+        to the ``randoms_cache_dir`` directory are left untouched.
+
+        Randoms fields are cached if the ``randoms_cache_size`` or
+        ``randoms_cache_dir`` global options are set (see
+        :class:`nbodykit.set_options`).
+        """
+        _randoms_cache.clear()
+
+    def _field_cache_token(self):
+        """
+        Return a token identifying the data of this mesh, used when
+        caching painted fields.
+        """
+        token = super(FKPCatalogMesh, self)._field_cache_token()
+        return token + (self._uncentered_position, self.comp_weight, self.fkp_weight, self.nbar)
 
     def to_real_field(self):
         r"""
@@ -121,6 +277,10 @@ class FKPCatalogMesh(MultipleSpeciesCatalogMesh):
         For further details on the meta-data, see
         :ref:`the documentation <fkp-meta-data>`.
 
+        As the FKP density field is linear in the randoms, the (un-normalized)
+        randoms field can be painted once and re-used when painting other
+        ``data`` catalogs with the same ``randoms``; see :func:`paint_randoms`.
+
         Returns
         -------
         :class:`~pmesh.pm.RealField` :
@@ -137,15 +297,14 @@ class FKPCatalogMesh(MultipleSpeciesCatalogMesh):
 
         attrs = {}
 
+        # paint the randoms (possibly retrieved from the cache),
+        # along with their weighted total
+        real, attrs['randoms.W'] = self.paint_randoms()
+
         # determine alpha, the weighted number ratio
-        for name in self.base.species:
-            attrs[name+'.W'] = self.weighted_total(name)
+        attrs['data.W'] = self.weighted_total('data')
         attrs['alpha'] = attrs['data.W'] / attrs['randoms.W']
 
-        # paint the randoms
-        real = self['randoms'].to_real_field(normalize=False)
-        real.attrs.update(attrs_to_dict(real, 'randoms.'))
-
         # normalize the randoms by alpha
         real[:] *= -1. * attrs['alpha']
 
@@ -170,6 +329,158 @@ class FKPCatalogMesh(MultipleSpeciesCatalogMesh):
 
         return real
 
+    def paint_randoms(self):
+        """
+        Paint the un-normalized density field of the ``randoms``, and
+        compute their weighted total (see :func:`weighted_total`).
+
+        If the ``randoms_cache_size`` global option is non-zero, the randoms
+        field is cached in memory and re-used when painting again the same
+        randoms columns on a mesh with the same parameters (``Nmesh``,
+        ``BoxSize``, ``BoxCenter``, window, interlacing, data type,
+        and weight columns), such that only the ``data`` catalog is painted.
+
+        If the ``randoms_cache_dir`` global option is set, the randoms field
+        is also written to a BigFile in this directory, and read back by
+        later runs. Files are named after a content hash of the randoms
+        columns and the mesh parameters, which does not depend on the
+        distribution of the randoms between ranks. The hash is recorded
+        under the :mod:`dask` names of the randoms columns, such that later
+        runs with the same names (e.g., reading the same unchanged files
+        with the same number of ranks) do not read the randoms again.
+
+        Returns
+        -------
+        real : :class:`~pmesh.pm.RealField`
+            the randoms field, with the meta-data of the randoms prefixed
+            by ``randoms.`` in its :attr:`attrs`
+        W : float
+            the weighted total of randoms
+        """
+        cachedir = _global_options['randoms_cache_dir']
+        if _global_options['randoms_cache_size'] <= 0 and cachedir is None:
+            return self._paint_randoms()
+
+        randoms = self['randoms']
+        columns = [self._uncentered_position, self.comp_weight, self.fkp_weight,
+                   self.selection, self.value]
+        params = repr((tuple(self.pm.Nmesh), tuple(self.pm.BoxSize),
+                       tuple(numpy.asarray(self.attrs['BoxCenter'], dtype='f8')),
+                       self.window, self.interlaced, str(self.dtype)))
+
+        # painting is collective, so all ranks must hit the cache
+        key = (params,) + tuple((col, randoms[col].name) for col in columns)
+        if all(self.comm.allgather(key in _randoms_cache)):
+            _randoms_cache.hits += 1
+            if self.comm.rank == 0:
+                self.logger.info("randoms field retrieved from the randoms cache (hits: %d, misses: %d)"
+                                    % (_randoms_cache.hits, _randoms_cache.misses))
+            return _randoms_cache.get(key)
+
+        # try to load the field from disk
+        toret = filename = None
+        if cachedir is not None:
+            filename = self._randoms_filename(cachedir, columns, params)
+            toret = _randoms_cache.load(filename, params, self.comm)
+            if toret is not None and self.comm.rank == 0:
+                self.logger.info("randoms field read from %s" %filename)
+
+        if toret is None:
+            _randoms_cache.misses += 1
+            toret = self._paint_randoms()
+            if filename is not None:
+                _randoms_cache.save(filename, toret[0], toret[1], params)
+                if self.comm.rank == 0:
+                    self.logger.info("randoms field written to %s" %filename)
+
+        _randoms_cache.put(key, *toret)
+        return toret
+
+    def _paint_randoms(self):
+        """
+        Paint the un-normalized randoms field, and compute the weighted
+        total of randoms; see :func:`paint_randoms`.
+        """
+        # add necessary FKP columns for INTERNAL use, if needed
+        internal = '_TotalWeight' not in self['randoms']
+        if internal:
+            self['randoms']['_TotalWeight'] = self.TotalWeight('randoms')
+            self['randoms']['_RecenteredPosition'] = self.RecenteredPosition('randoms')
+
+        real = self['randoms'].to_real_field(normalize=False)
+        real.attrs.update(attrs_to_dict(real, 'randoms.'))
+
+        if internal:
+            del self['randoms/_RecenteredPosition']
+            del self['randoms/_TotalWeight']
+
+        return real, self.weighted_total('randoms')
+
+    def _randoms_filename(self, cachedir, columns, params):
+        """
+        Return the name of the file of the randoms field painted from the
+        randoms ``columns`` with the parameters ``params``.
+
+        The name is a content hash of the columns, see :func:`_randoms_hash`;
+        it is recorded in a file named after the :mod:`dask` names of the
+        columns on all ranks, and read from it by later runs, if any.
+        """
+        import hashlib
+
+        randoms = self['randoms']
+        names = self.comm.allgather([randoms[col].name for col in columns])
+        token = hashlib.sha1(repr((names, params)).encode()).hexdigest()
+        tokenfile = os.path.join(cachedir, 'randoms-token-%s' %token)
+
+        digest = None
+        if self.comm.rank == 0 and os.path.exists(tokenfile):
+            with open(tokenfile, 'r') as ff:
+                digest = ff.read().strip()
+        digest = self.comm.bcast(digest)
+
+        if not digest:
+            digest = hashlib.sha1((self._randoms_hash(columns) + params).encode()).hexdigest()
+            if self.comm.rank == 0:
+                with open(tokenfile + '.tmp', 'w') as ff:
+                    ff.write(digest)
+                os.rename(tokenfile + '.tmp', tokenfile)
+
+        return os.path.join(cachedir, 'randoms-%s' %digest)
+
+    def _randoms_hash(self, columns):
+        """
+        Return a hash of the content of the randoms ``columns``;
+        see :func:`_content_hash`.
+        """
+        return self._content_hash('randoms', columns)
+
+    def _content_hash(self, name, columns):
+        """
+        Return a hash of the content of the ``columns`` of the ``data``
+        or ``randoms`` source, read by chunks of ``paint_chunk_size`` objects.
+
+        The hash is the sum of the hashes of the objects, such that it does
+        not depend on the distribution of the objects between ranks, nor on
+        their order (as the painted field).
+        """
+        assert name in ['data', 'randoms']
+
+        source = self[name]
+        arrays = source.read(columns)
+        chunksize = _global_options['paint_chunk_size']
+
+        # two 64-bit sums, with differently seeded object hashes
+        seeds = [0x9e3779b97f4a7c15, 0x632be59bd9b4e019]
+        sums = [0, 0]
+        for i in range(0, len(source), chunksize):
+            data = self.compute(*[array[i:i+chunksize] for array in arrays])
+            for j, seed in enumerate(seeds):
+                sums[j] += int(_object_hashes(data, seed).sum(dtype='u8'))
+
+        # sum over all ranks
+        sums = [sum(rank_sums) % 2**64 for rank_sums in zip(*self.comm.allgather(sums))]
+        return '%016x%016x-%d' % (sums[0], sums[1], source.csize)
+
     def RecenteredPosition(self, name):
         """
         The Position of the objects, re-centered on the mesh to
@@ -199,13 +510,45 @@ class FKPCatalogMesh(MultipleSpeciesCatalogMesh):
         .. math::
 
             W = \sum w_\mathrm{comp}
+
+        This is computed along with the other sums of :func:`weighted_sums`.
         """
-        # the selection
-        sel = self.compute(self[name][self.selection])
+        return self.weighted_sums(name)['W']
+
+    def weighted_sums(self, name, fkp_weight2=None):
+        r"""
+        Compute the sums over the selected objects of the ``data`` or
+        ``randoms`` source needed to normalize the FKP density field and
+        its power spectrum, in a single pass over the catalog:
 
-        # the selected mesh for "name"
-        mesh = self[name][sel]
+        .. math::
+
+            W = \sum w_\mathrm{comp},
+
+            A = \sum \bar{n} w_\mathrm{comp} w_{\mathrm{fkp},1} w_{\mathrm{fkp},2},
+
+            S = \sum w_\mathrm{comp}^2 w_{\mathrm{fkp},1} w_{\mathrm{fkp},2}.
+
+        The sums are cached by the :class:`~nbodykit.source.catalog.fkp.FKPCatalog`,
+        and computed again only if the columns change.
+
+        Parameters
+        ----------
+        name : 'data', 'randoms'
+            the source to compute the sums for
+        fkp_weight2 : str, optional
+            the name of the FKP weight column of the second field, when
+            computing cross power spectra; default is :attr:`fkp_weight`
+
+        Returns
+        -------
+        sums : dict
+            the number of selected objects ``N``, and the sums ``W``,
+            ``norm`` (:math:`A`) and ``shotnoise`` (:math:`S`)
+        """
+        assert name in ['data', 'randoms']
+        if fkp_weight2 is None:
+            fkp_weight2 = self.fkp_weight
 
-        # sum up completeness weights
-        wsum = self.compute(mesh[self.comp_weight].sum())
-        return self.comm.allreduce(wsum)
+        return self.base._weighted_sums(name, self.selection, self.comp_weight,
+                                        self.nbar, (self.fkp_weight, fkp_weight2))
@@ -77,3 +77,107 @@ def test_paint(comm):
 
     # must be the same
     assert_allclose(combined.value, fkp_density, atol=1e-5)
+
+@MPITest([1, 4])
+def test_randoms_cache(comm):
+
+    import tempfile, shutil
+    from nbodykit import set_options
+    from nbodykit.source.catalogmesh.fkp import _randoms_cache
+    CurrentMPIComm.set(comm)
+
+    data = UniformCatalog(nbar=3e-5, BoxSize=512., seed=42)
+    randoms = UniformCatalog(nbar=3e-4, BoxSize=512., seed=84)
+    for s in [data, randoms]:
+        s['NZ'] = 3e-5
+
+    cat = FKPCatalog(data, randoms, BoxSize=512.)
+    mesh = cat.to_mesh(Nmesh=32)
+    r1 = mesh.to_real_field()
+
+    # initialize a scratch directory
+    if comm.rank == 0:
+        tmpdir = tempfile.mkdtemp()
+    else:
+        tmpdir = None
+    tmpdir = comm.bcast(tmpdir)
+
+    with set_options(randoms_cache_size=1e8, randoms_cache_dir=tmpdir):
+        mesh.to_real_field()
+        hits = _randoms_cache.hits
+
+        # a new data catalog only re-paints the data
+        mesh['data']['Weight'] = 2.
+        r2 = mesh.to_real_field()
+        assert _randoms_cache.hits == hits + 1
+        assert_allclose(r2.attrs['alpha'], 2 * r1.attrs['alpha'])
+        assert_allclose(r2.attrs['randoms.N'], r1.attrs['randoms.N'])
+
+        # the randoms field is read from disk when not in memory
+        mesh.clear_randoms_cache()
+        r3 = mesh.to_real_field()
+        assert _randoms_cache.hits == hits + 1
+        assert_allclose(r2, r3)
+        assert_allclose(r3.attrs['randoms.W'], r1.attrs['randoms.W'])
+
+        # the content hash is recorded under the names of the randoms
+        # columns, so the randoms are not read again
+        mesh.clear_randoms_cache()
+        def _randoms_hash(columns):
+            raise AssertionError("the randoms should not be read")
+        mesh._randoms_hash = _randoms_hash
+        r4 = mesh.to_real_field()
+        assert_allclose(r2, r4)
+        del mesh._randoms_hash
+
+        # the content hash does not depend on how the randoms are read
+        columns = ['Position', 'Weight']
+        digest = mesh._randoms_hash(columns)
+        with set_options(paint_chunk_size=1000):
+            assert mesh._randoms_hash(columns) == digest
+
+        mesh.clear_randoms_cache()
+
+    if comm.rank == 0:
+        shutil.rmtree(tmpdir)
+
+@MPITest([1, 4])
+def test_weighted_sums(comm):
+
+    CurrentMPIComm.set(comm)
+
+    data = UniformCatalog(nbar=3e-5, BoxSize=512., seed=42)
+    randoms = UniformCatalog(nbar=3e-4, BoxSize=512., seed=84)
+    for s in [data, randoms]:
+        s['NZ'] = s.rng.uniform(low=1e-5, high=1e-4, size=s.size)
+        s['Weight'] = s.rng.uniform(low=0.5, high=1.5, size=s.size)
+        s['FKPWeight'] = 1.0 / (1 + 2e4*s['NZ'])
+        s['FKPWeight2'] = 1.0 / (1 + 1e4*s['NZ'])
+        s['Selection'] = s['Position'][:,0] < 256.
+
+    cat = FKPCatalog(data, randoms)
+    mesh = cat.to_mesh(Nmesh=32)
+
+    # the bounds of the selected randoms are computed with their sums
+    pos = randoms['Position'].compute()[randoms['Selection'].compute()]
+    pos_min = numpy.min(comm.allgather(pos.min(axis=0)), axis=0)
+    pos_max = numpy.max(comm.allgather(pos.max(axis=0)), axis=0)
+    assert_allclose(mesh.attrs['BoxCenter'], 0.5*(pos_min + pos_max))
+
+    for name, s in zip(['data', 'randoms'], [data, randoms]):
+        sel = s['Selection'].compute()
+        comp = s['Weight'].compute()[sel]
+        nbar = s['NZ'].compute()[sel]
+        fkp1 = s['FKPWeight'].compute()[sel]
+        fkp2 = s['FKPWeight2'].compute()[sel]
+
+        sums = mesh.weighted_sums(name, fkp_weight2='FKPWeight2')
+        assert sums['N'] == comm.allreduce(sel.sum())
+        assert_allclose(sums['W'], comm.allreduce(comp.sum()))
+        assert_allclose(sums['norm'], comm.allreduce((nbar*comp*fkp1*fkp2).sum()))
+        assert_allclose(sums['shotnoise'], comm.allreduce((comp**2*fkp1*fkp2).sum()))
+        assert_allclose(mesh.weighted_total(name), sums['W'])
+
+        # the sums are computed again when a column changes
+        mesh[name]['Weight'] = 2 * s['Weight']
+        assert_allclose(mesh.weighted_total(name), 2 * sums['W'])